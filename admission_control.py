@@ -0,0 +1,276 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qs
+from xml.sax.saxutils import escape
+
+import asyncio
+import os
+import re
+import time
+import uuid
+
+from loguru import logger
+from starlette.responses import Response
+
+# the media websocket of a call, see vocode's CallsRouter
+CONNECT_CALL_PATH_PREFIX = '/connect_call/'
+# where the connection TwiML of an admitted call points its media stream
+_CONNECT_CALL_URL = re.compile(rb'/connect_call/([^"<\s/?]+)')
+# an admitted call holds its place this long, waiting for Twilio to open its websocket
+PENDING_CONVERSATION_TIMEOUT_SECONDS = 10.0
+DEFAULT_MAX_EVENT_LOOP_LAG_SECONDS = 0.0
+DEFAULT_MAX_OVERFLOW_ATTEMPTS = 3
+OVERFLOW_ATTEMPT_PARAM = 'overflow_attempt'
+# weight of each lag sample, a single slow callback shouldn't turn calls away
+_LAG_SMOOTHING = 0.25
+
+REJECTED_CONVERSATIONS = 'conversations'
+REJECTED_EVENT_LOOP_LAG = 'event_loop_lag'
+
+HOLD_MESSAGE = "All of our lines are busy. Please hold, we'll be with you shortly."
+BUSY_MESSAGE = "All of our lines are still busy. Please call again later. Goodbye."
+
+
+class AdmissionController:
+    """Decides whether this worker takes a new inbound call, so the calls it has keep their latency.
+
+    A call is turned away when the worker already has max_conversations (calls with an open media
+    websocket, plus admitted calls whose websocket hasn't connected yet), or when its event loop
+    lags more than max_event_loop_lag_seconds behind. 0 turns a limit off, and both are off by
+    default, when the app doesn't install the controller at all (see enabled). Per worker, like
+    span_metrics, and only touched from the event loop.
+
+    An admitted call holds its place under its CallSid, then under the conversation id its
+    connection TwiML gives it, until the websocket of that conversation connects or
+    PENDING_CONVERSATION_TIMEOUT_SECONDS pass.
+
+    A call turned away gets overflow TwiML instead of a conversation: it is redirected to
+    overflow_redirect_url (another node's /inbound_call) if that's set, otherwise it hears hold
+    music (overflow_hold_music_url) or a hold message, and is redirected back to try again. After
+    max_overflow_attempts the caller is asked to call again later.
+    """
+
+    def __init__(
+        self,
+        max_conversations: int = 0,
+        max_event_loop_lag_seconds: float = DEFAULT_MAX_EVENT_LOOP_LAG_SECONDS,
+        overflow_redirect_url: Optional[str] = None,
+        overflow_hold_music_url: Optional[str] = None,
+        max_overflow_attempts: int = DEFAULT_MAX_OVERFLOW_ATTEMPTS,
+        lag_sample_interval_seconds: float = 0.05,
+    ):
+        self.max_conversations = max_conversations
+        self.max_event_loop_lag_seconds = max_event_loop_lag_seconds
+        self.overflow_redirect_url = overflow_redirect_url
+        self.overflow_hold_music_url = overflow_hold_music_url
+        self.max_overflow_attempts = max_overflow_attempts
+        self.lag_sample_interval_seconds = lag_sample_interval_seconds
+        # the urls of the inbound call configs, set when the app starts
+        self.inbound_call_urls: Set[str] = set()
+        self.active_conversations = 0
+        self.event_loop_lag_seconds = 0.0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {REJECTED_CONVERSATIONS: 0, REJECTED_EVENT_LOOP_LAG: 0}
+        # when each admitted call that hasn't connected yet was admitted, by its CallSid until
+        # its conversation id is known, then by that
+        self._pending: Dict[str, float] = {}
+        self._lag_monitor: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        # with no limit every call is admitted, there's nothing to track
+        return bool(self.max_conversations or self.max_event_loop_lag_seconds)
+
+    @property
+    def pending_conversations(self) -> int:
+        # a call that never connects (the caller hung up while it rang) stops holding its place
+        expired_before = time.monotonic() - PENDING_CONVERSATION_TIMEOUT_SECONDS
+        for key in [key for key, admitted_at in self._pending.items() if admitted_at < expired_before]:
+            del self._pending[key]
+        return len(self._pending)
+
+    def try_admit(self, call_sid: str) -> Optional[str]:
+        """Admits a new call, or returns why it wasn't (REJECTED_CONVERSATIONS or REJECTED_EVENT_LOOP_LAG)."""
+        if call_sid in self._pending:
+            # Twilio retrying the same call, it already has its place
+            return None
+        reason = None
+        if self.max_conversations and self.active_conversations + self.pending_conversations >= self.max_conversations:
+            reason = REJECTED_CONVERSATIONS
+        elif self.max_event_loop_lag_seconds and self.event_loop_lag_seconds > self.max_event_loop_lag_seconds:
+            reason = REJECTED_EVENT_LOOP_LAG
+        if reason is not None:
+            self.rejected[reason] += 1
+            return reason
+        self.admitted += 1
+        self._pending[call_sid] = time.monotonic()
+        return None
+
+    def conversation_connecting(self, call_sid: str, conversation_id: Optional[str]):
+        """The admitted call call_sid was answered with the websocket of conversation_id, or
+        without one (None) and won't connect."""
+        admitted_at = self._pending.pop(call_sid, None)
+        if admitted_at is not None and conversation_id is not None:
+            self._pending[conversation_id] = admitted_at
+
+    def conversation_started(self, conversation_id: str):
+        self._pending.pop(conversation_id, None)
+        self.active_conversations += 1
+
+    def conversation_ended(self):
+        self.active_conversations -= 1
+
+    def overflow_twiml(self, inbound_call_url: str, attempt: int) -> str:
+        """TwiML for a call turned away on its attempt'th try, counting from 0."""
+        if attempt >= self.max_overflow_attempts:
+            verbs = f'<Say>{escape(BUSY_MESSAGE)}</Say><Hangup/>'
+        elif self.overflow_redirect_url:
+            # Twilio posts the call's parameters to the other node, as it did here
+            verbs = f'<Redirect method="POST">{escape(_with_overflow_attempt(self.overflow_redirect_url, attempt + 1))}</Redirect>'
+        else:
+            if self.overflow_hold_music_url:
+                hold = f'<Play>{escape(self.overflow_hold_music_url)}</Play>'
+            else:
+                hold = f'<Say>{escape(HOLD_MESSAGE)}</Say><Pause length="10"/>'
+            # relative, so it comes back through the load balancer, to whichever worker has room
+            verbs = hold + f'<Redirect method="POST">{escape(_with_overflow_attempt(inbound_call_url, attempt + 1))}</Redirect>'
+        return f'<?xml version="1.0" encoding="UTF-8"?><Response>{verbs}</Response>'
+
+    def start(self):
+        self._lag_monitor = asyncio.create_task(self._monitor_event_loop_lag())
+
+    async def stop(self):
+        if self._lag_monitor is not None:
+            self._lag_monitor.cancel()
+            try:
+                await self._lag_monitor
+            except asyncio.CancelledError:
+                pass
+            self._lag_monitor = None
+
+    async def _monitor_event_loop_lag(self):
+        # how late a sleep wakes up is how long every other callback waits to run
+        interval = self.lag_sample_interval_seconds
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - start - interval)
+            self.event_loop_lag_seconds += _LAG_SMOOTHING * (lag - self.event_loop_lag_seconds)
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = [
+            '# HELP telephony_active_conversations Calls with an open media websocket on this worker.',
+            '# TYPE telephony_active_conversations gauge',
+            f'telephony_active_conversations {self.active_conversations}',
+            '# HELP telephony_pending_conversations Calls admitted whose media websocket has not connected yet.',
+            '# TYPE telephony_pending_conversations gauge',
+            f'telephony_pending_conversations {self.pending_conversations}',
+            '# HELP telephony_max_conversations Calls this worker admits at once, 0 is no limit.',
+            '# TYPE telephony_max_conversations gauge',
+            f'telephony_max_conversations {self.max_conversations}',
+            '# HELP telephony_event_loop_lag_seconds Smoothed event loop lag of this worker.',
+            '# TYPE telephony_event_loop_lag_seconds gauge',
+            f'telephony_event_loop_lag_seconds {self.event_loop_lag_seconds}',
+            '# HELP telephony_max_event_loop_lag_seconds Event loop lag past which calls are turned away, 0 is no limit.',
+            '# TYPE telephony_max_event_loop_lag_seconds gauge',
+            f'telephony_max_event_loop_lag_seconds {self.max_event_loop_lag_seconds}',
+            '# HELP telephony_calls_admitted_total Inbound calls admitted.',
+            '# TYPE telephony_calls_admitted_total counter',
+            f'telephony_calls_admitted_total {self.admitted}',
+            '# HELP telephony_calls_rejected_total Inbound calls answered with overflow TwiML, by the limit they hit.',
+            '# TYPE telephony_calls_rejected_total counter',
+        ]
+        for reason, count in sorted(self.rejected.items()):
+            lines.append(f'telephony_calls_rejected_total{{reason="{reason}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _with_overflow_attempt(url: str, attempt: int) -> str:
+    return f'{url}{"&" if "?" in url else "?"}{OVERFLOW_ATTEMPT_PARAM}={attempt}'
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware in front of the telephony routes: answers an inbound call with the
+    controller's overflow TwiML when it turns the call away, and counts the open media websockets
+    as the worker's active conversations.
+
+    The CallSid is read from the inbound call's form, which is then replayed to the route, and
+    the conversation id from the connection TwiML the route answers with."""
+
+    def __init__(self, app, admission_controller: AdmissionController):
+        self.app = app
+        self.admission_controller = admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'websocket' and scope['path'].startswith(CONNECT_CALL_PATH_PREFIX):
+            self.admission_controller.conversation_started(scope['path'][len(CONNECT_CALL_PATH_PREFIX):])
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.admission_controller.conversation_ended()
+            return
+        if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in self.admission_controller.inbound_call_urls:
+            await self._inbound_call(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def _inbound_call(self, scope, receive, send):
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] != 'http.request':
+                return
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        # without one the route rejects the request, its place is given back below
+        call_sid = parse_qs(body.decode('latin-1')).get('CallSid', [''])[0] or f'unknown-{uuid.uuid4()}'
+        reason = self.admission_controller.try_admit(call_sid)
+        if reason is not None:
+            attempt = _overflow_attempt(scope.get('query_string', b''))
+            logger.warning(f'turned away inbound call {call_sid} ({reason} limit), overflow attempt {attempt}')
+            response = Response(self.admission_controller.overflow_twiml(scope['path'], attempt), media_type='application/xml')
+            await response(scope, receive, send)
+            return
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            return await receive()
+
+        response_body = b''
+
+        async def capture_send(message):
+            nonlocal response_body
+            if message['type'] == 'http.response.body':
+                response_body += message.get('body', b'')
+            await send(message)
+
+        conversation_id = None
+        try:
+            await self.app(scope, replay_receive, capture_send)
+            match = _CONNECT_CALL_URL.search(response_body)
+            conversation_id = match.group(1).decode() if match else None
+        finally:
+            self.admission_controller.conversation_connecting(call_sid, conversation_id)
+
+
+def _overflow_attempt(query_string: bytes) -> int:
+    try:
+        return int(parse_qs(query_string.decode()).get(OVERFLOW_ATTEMPT_PARAM, ['0'])[0])
+    except ValueError:
+        return 0
+
+
+def admission_controller_from_env() -> AdmissionController:
+    return AdmissionController(
+        max_conversations=int(os.getenv("MAX_ACTIVE_CONVERSATIONS", "0")),
+        max_event_loop_lag_seconds=float(os.getenv("MAX_EVENT_LOOP_LAG_MS", "0")) / 1000,
+        overflow_redirect_url=os.getenv("OVERFLOW_REDIRECT_URL") or None,
+        overflow_hold_music_url=os.getenv("OVERFLOW_HOLD_MUSIC_URL") or None,
+        max_overflow_attempts=int(os.getenv("MAX_OVERFLOW_ATTEMPTS", str(DEFAULT_MAX_OVERFLOW_ATTEMPTS))),
+    )
@@ -0,0 +1,264 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import bisect
+import heapq
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from datetime import datetime
+
+from loguru import logger
+from pydantic.v1 import BaseModel
+
+
+class AppointmentSlot(BaseModel):
+    appointment_number: str
+    appointment_id: str
+    appointment_physician_id: str
+    appointment_physician_name: str
+    # how the time is said to the caller
+    appointment_time: str
+    appointment_start: datetime
+    appointment_address: str
+
+    def to_form_fields(self) -> Dict[str, str]:
+        """The slot's values for the matching HealthAppointmentInfoContainer fields."""
+        return {
+            'appointment_number': self.appointment_number,
+            'appointment_id': self.appointment_id,
+            'appointment_physician_id': self.appointment_physician_id,
+            'appointment_physician_name': self.appointment_physician_name,
+            'appointment_time': self.appointment_time,
+            'appointment_address': self.appointment_address,
+        }
+
+
+# used when APPOINTMENT_SLOTS_PATH isn't set
+DEFAULT_APPOINTMENT_SLOTS = [
+    AppointmentSlot(
+        appointment_number='1',
+        appointment_id='appt_id_155121',
+        appointment_physician_id='phys_id_124512',
+        appointment_physician_name='Dr. Nickel Baker',
+        appointment_time='2:00 PM Saturday July 20',
+        appointment_start=datetime(2024, 7, 20, 14),
+        appointment_address='123 St Clinic, 123 123 St',
+    ),
+    AppointmentSlot(
+        appointment_number='2',
+        appointment_id='appt_id_128841',
+        appointment_physician_id='phys_id_124512',
+        appointment_physician_name='Dr. Nickel Baker',
+        appointment_time='3:00 PM Saturday July 20',
+        appointment_start=datetime(2024, 7, 20, 15),
+        appointment_address='123 St Clinic, 123 123 St',
+    ),
+    AppointmentSlot(
+        appointment_number='3',
+        appointment_id='appt_id_166341',
+        appointment_physician_id='phys_id_124512',
+        appointment_physician_name='Dr. Nickel Baker',
+        appointment_time='4:00 PM Saturday July 20',
+        appointment_start=datetime(2024, 7, 20, 16),
+        appointment_address='123 St Clinic, 123 123 St',
+    ),
+]
+
+
+class _TimeIndex:
+    """Slot ids sorted by start time, for range queries with bisect."""
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.appointment_ids: List[str] = []
+
+    def extend(self, slots: List[AppointmentSlot]):
+        # one sort per batch instead of an insort per slot
+        entries = sorted(
+            [*zip(self.starts, self.appointment_ids), *((slot.appointment_start, slot.appointment_id) for slot in slots)],
+            key=lambda entry: entry[0],
+        )
+        self.starts = [start for start, _ in entries]
+        self.appointment_ids = [appointment_id for _, appointment_id in entries]
+
+    def range(self, start: Optional[datetime], end: Optional[datetime]) -> Iterator[str]:
+        starts, appointment_ids = self.starts, self.appointment_ids
+        low = 0 if start is None else bisect.bisect_left(starts, start)
+        high = len(starts) if end is None else bisect.bisect_left(starts, end)
+        return (appointment_ids[index] for index in range(low, high))
+
+
+def format_appointment_slots(slots: List[AppointmentSlot]) -> str:
+    """Renders slots for the LLM in few tokens: grouped by physician and address, one 'id time' entry per slot.
+
+    e.g. Dr. Nickel Baker (phys_id_124512), 123 St Clinic: appt_id_155121 2:00 PM Saturday July 20; appt_id_128841 3:00 PM Saturday July 20
+    """
+    slots_by_location: Dict[Tuple[str, str, str], List[AppointmentSlot]] = {}
+    for slot in slots:
+        slots_by_location.setdefault((slot.appointment_physician_name, slot.appointment_physician_id, slot.appointment_address), []).append(slot)
+    return ' | '.join(
+        f'{physician_name} ({physician_id}), {address}: ' + '; '.join(f'{slot.appointment_id} {slot.appointment_time}' for slot in location_slots)
+        for (physician_name, physician_id, address), location_slots in slots_by_location.items()
+    )
+
+
+_NAME_SEPARATORS = re.compile(r'[\s.,]+')
+_NAME_TITLES = {'dr', 'doctor'}
+
+
+class AppointmentAvailabilityStore:
+    """In-memory index of appointment slots.
+
+    Slots are looked up by id in O(1), and searched by physician (id or name) and start time
+    range with sorted indexes. reserve() is atomic, so two callers can't book the same slot.
+    """
+
+    def __init__(self, slots: Iterable[AppointmentSlot] = ()):
+        self._slots_by_id: Dict[str, AppointmentSlot] = {}
+        self._all_slots = _TimeIndex()
+        self._slots_by_physician: Dict[str, _TimeIndex] = {}
+        # lowercase physician name -> physician ids
+        self._physician_ids_by_name: Dict[str, Set[str]] = {}
+        self._reserved_by: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.add_slots(slots)
+
+    @classmethod
+    def load(cls, path: str) -> AppointmentAvailabilityStore:
+        """Loads slots from a .json file (a list of slots) or a sqlite database."""
+        if path.endswith('.json'):
+            return cls.from_json_file(path)
+        return cls.from_sqlite(path)
+
+    @classmethod
+    def from_json_file(cls, path: str) -> AppointmentAvailabilityStore:
+        with open(path) as f:
+            return cls(AppointmentSlot.parse_obj(slot) for slot in json.load(f))
+
+    @classmethod
+    def from_sqlite(cls, path: str, table: str = 'appointment_slots') -> AppointmentAvailabilityStore:
+        connection = sqlite3.connect(path)
+        connection.row_factory = sqlite3.Row
+        try:
+            rows = connection.execute(f'SELECT * FROM {table}').fetchall()
+        finally:
+            connection.close()
+        return cls(AppointmentSlot.parse_obj(dict(row)) for row in rows)
+
+    def add_slots(self, slots: Iterable[AppointmentSlot]):
+        with self._lock:
+            new_slots: List[AppointmentSlot] = []
+            new_slots_by_physician: Dict[str, List[AppointmentSlot]] = {}
+            for slot in slots:
+                if slot.appointment_id in self._slots_by_id:
+                    raise ValueError(f'duplicate appointment id {slot.appointment_id}')
+                self._slots_by_id[slot.appointment_id] = slot
+                new_slots.append(slot)
+                new_slots_by_physician.setdefault(slot.appointment_physician_id, []).append(slot)
+                self._physician_ids_by_name.setdefault(slot.appointment_physician_name.lower(), set()).add(slot.appointment_physician_id)
+            self._all_slots.extend(new_slots)
+            for physician_id, physician_slots in new_slots_by_physician.items():
+                self._slots_by_physician.setdefault(physician_id, _TimeIndex()).extend(physician_slots)
+
+    def get(self, appointment_id: str) -> Optional[AppointmentSlot]:
+        return self._slots_by_id.get(appointment_id)
+
+    def search(
+        self,
+        physician: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        include_reserved: bool = False,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[AppointmentSlot]:
+        """Slots starting in [start, end), sorted by start time, optionally for one physician.
+
+        physician can be an id, a full name, or part of a name ('Baker', 'Dr Baker').
+        offset and limit page through the matching slots.
+        """
+        if physician is None:
+            appointment_ids = self._all_slots.range(start, end)
+        else:
+            time_indexes = [self._slots_by_physician[physician_id] for physician_id in self.match_physician_ids(physician)]
+            if not time_indexes:
+                return []
+            if len(time_indexes) == 1:
+                appointment_ids = time_indexes[0].range(start, end)
+            else:
+                slots_by_id = self._slots_by_id
+                appointment_ids = heapq.merge(
+                    *(time_index.range(start, end) for time_index in time_indexes),
+                    key=lambda appointment_id: slots_by_id[appointment_id].appointment_start,
+                )
+        if not include_reserved:
+            reserved_by = self._reserved_by
+            appointment_ids = (appointment_id for appointment_id in appointment_ids if appointment_id not in reserved_by)
+        stop = None if limit is None else offset + limit
+        return [self._slots_by_id[appointment_id] for appointment_id in itertools.islice(appointment_ids, offset, stop)]
+
+    def match_physician_ids(self, physician: str) -> List[str]:
+        """Physician ids for an id, a full name, or the words of a name in any case, e.g. 'dr baker'."""
+        if physician in self._slots_by_physician:
+            return [physician]
+        physician_ids = self._physician_ids_by_name.get(physician.lower())
+        if physician_ids is not None:
+            return sorted(physician_ids)
+        words = [word for word in _NAME_SEPARATORS.split(physician.lower()) if word and word not in _NAME_TITLES]
+        if not words:
+            return []
+        return sorted({
+            physician_id
+            for name, physician_ids in self._physician_ids_by_name.items()
+            if all(word in _NAME_SEPARATORS.split(name) for word in words)
+            for physician_id in physician_ids
+        })
+
+    def physicians(self) -> List[Tuple[str, str]]:
+        """(physician id, physician name) for every physician with slots."""
+        return sorted({(slot.appointment_physician_id, slot.appointment_physician_name) for slot in self._slots_by_id.values()})
+
+    def is_available(self, appointment_id: str) -> bool:
+        return appointment_id in self._slots_by_id and appointment_id not in self._reserved_by
+
+    def reserve(self, appointment_id: str, holder: str) -> bool:
+        """Reserves the slot for holder. Returns False if the slot doesn't exist or someone else has it."""
+        with self._lock:
+            if appointment_id not in self._slots_by_id:
+                return False
+            current_holder = self._reserved_by.setdefault(appointment_id, holder)
+            return current_holder == holder
+
+    def release(self, appointment_id: str, holder: str):
+        with self._lock:
+            if self._reserved_by.get(appointment_id) == holder:
+                del self._reserved_by[appointment_id]
+
+    def __len__(self) -> int:
+        return len(self._slots_by_id)
+
+
+_appointment_availability_store: Optional[AppointmentAvailabilityStore] = None
+
+
+def get_appointment_availability_store() -> AppointmentAvailabilityStore:
+    """The process-wide slot store, loaded on first use from APPOINTMENT_SLOTS_PATH if it is set."""
+    global _appointment_availability_store
+    if _appointment_availability_store is None:
+        path = os.environ.get('APPOINTMENT_SLOTS_PATH')
+        if path:
+            _appointment_availability_store = AppointmentAvailabilityStore.load(path)
+            logger.info(f'loaded {len(_appointment_availability_store)} appointment slots from {path}')
+        else:
+            _appointment_availability_store = AppointmentAvailabilityStore(DEFAULT_APPOINTMENT_SLOTS)
+    return _appointment_availability_store
+
+
+def set_appointment_availability_store(store: AppointmentAvailabilityStore):
+    global _appointment_availability_store
+    _appointment_availability_store = store
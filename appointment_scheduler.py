@@ -0,0 +1,244 @@
+from __future__ import annotations
+from collections import OrderedDict
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Tuple
+
+import time
+
+from loguru import logger
+
+from appointment_availability import get_appointment_availability_store
+
+# submissions and slot claims are kept this long, then expire
+DEFAULT_SCHEDULER_TTL_SECONDS = 60 * 60 * 24 * 30
+# a submission that crashed half way through stops blocking retries after this
+SUBMISSION_LOCK_SECONDS = 60
+
+SUBMITTING = 'submitting'
+SCHEDULED = 'scheduled'
+
+
+class AppointmentSchedulerBackend(ABC):
+    """Where submitted appointments are recorded, keyed by a stable form id (the conversation id).
+
+    A submission is begun (an atomic claim on the form id, so a form is only submitted once even
+    if the agent retries), claims its slot (at most one form per slot), then is completed or aborted.
+    """
+
+    @abstractmethod
+    async def get_status(self, form_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def begin_submission(self, form_id: str) -> bool:
+        """Returns False if the form was already submitted, or is being submitted."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def abort_submission(self, form_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def complete_submission(self, form_id: str, appointment_id: str, appointment_info: Dict[str, str]):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def claim_slot(self, appointment_id: str, form_id: str) -> bool:
+        """Returns False if another form has the slot. Claiming a slot the form already has succeeds."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def release_slot(self, appointment_id: str, form_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_final_form(self, form_id: str, form_fields: Dict[str, str]):
+        """Keeps a form's fields as they were when its call ended, submitted or not."""
+        raise NotImplementedError
+
+
+class InMemoryAppointmentScheduler(AppointmentSchedulerBackend):
+    """Keeps submissions in process, for development and a single worker.
+
+    Bounded: entries expire after ttl_seconds, and the oldest are evicted past max_forms.
+    Slots are claimed in the process' AppointmentAvailabilityStore.
+    """
+
+    def __init__(self, ttl_seconds: int = DEFAULT_SCHEDULER_TTL_SECONDS, max_forms: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_forms = max_forms
+        # form id -> (status, expires at)
+        self._statuses: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        self._appointments: Dict[str, Dict[str, str]] = {}
+        self._final_forms: OrderedDict[str, Dict[str, str]] = OrderedDict()
+
+    async def get_status(self, form_id: str) -> Optional[str]:
+        entry = self._statuses.get(form_id)
+        if entry is None:
+            return None
+        status, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._forget(form_id)
+            return None
+        return status
+
+    async def begin_submission(self, form_id: str) -> bool:
+        if await self.get_status(form_id) is not None:
+            return False
+        self._set_status(form_id, SUBMITTING, SUBMISSION_LOCK_SECONDS)
+        return True
+
+    async def abort_submission(self, form_id: str):
+        if await self.get_status(form_id) == SUBMITTING:
+            self._forget(form_id)
+
+    async def complete_submission(self, form_id: str, appointment_id: str, appointment_info: Dict[str, str]):
+        self._set_status(form_id, SCHEDULED, self.ttl_seconds)
+        self._appointments[form_id] = appointment_info
+
+    async def claim_slot(self, appointment_id: str, form_id: str) -> bool:
+        return get_appointment_availability_store().reserve(appointment_id, form_id)
+
+    async def release_slot(self, appointment_id: str, form_id: str):
+        get_appointment_availability_store().release(appointment_id, form_id)
+
+    async def save_final_form(self, form_id: str, form_fields: Dict[str, str]):
+        self._final_forms[form_id] = form_fields
+        self._final_forms.move_to_end(form_id)
+        while len(self._final_forms) > self.max_forms:
+            self._final_forms.popitem(last=False)
+
+    def get_appointment(self, form_id: str) -> Optional[Dict[str, str]]:
+        return self._appointments.get(form_id)
+
+    def get_final_form(self, form_id: str) -> Optional[Dict[str, str]]:
+        return self._final_forms.get(form_id)
+
+    def _set_status(self, form_id: str, status: str, ttl_seconds: float):
+        self._statuses[form_id] = (status, time.monotonic() + ttl_seconds)
+        self._statuses.move_to_end(form_id)
+        while len(self._statuses) > self.max_forms:
+            evicted_form_id, _ = self._statuses.popitem(last=False)
+            self._appointments.pop(evicted_form_id, None)
+
+    def _forget(self, form_id: str):
+        self._statuses.pop(form_id, None)
+        self._appointments.pop(form_id, None)
+
+
+# deletes the key only if it still holds the expected value
+_COMPARE_AND_DELETE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisAppointmentScheduler(AppointmentSchedulerBackend):
+    """Keeps submissions and slot claims in Redis, so every app container sees the same bookings.
+
+    Keys (all expire after ttl_seconds):
+        {key_prefix}:form:{form_id}          'submitting' or 'scheduled', set with NX
+        {key_prefix}:slot:{appointment_id}   the form id holding the slot, set with NX
+        {key_prefix}:appointment:{form_id}   hash of the submitted form's fields
+        {key_prefix}:final_form:{form_id}    hash of the form's fields when its call ended
+    """
+
+    def __init__(self, redis: Optional[Any] = None, ttl_seconds: int = DEFAULT_SCHEDULER_TTL_SECONDS, key_prefix: str = 'health_appointment'):
+        if redis is None:
+            from vocode.streaming.utils.redis import initialize_redis
+            redis = initialize_redis()
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    def _form_key(self, form_id: str) -> str:
+        return f'{self.key_prefix}:form:{form_id}'
+
+    def _slot_key(self, appointment_id: str) -> str:
+        return f'{self.key_prefix}:slot:{appointment_id}'
+
+    def _appointment_key(self, form_id: str) -> str:
+        return f'{self.key_prefix}:appointment:{form_id}'
+
+    def _final_form_key(self, form_id: str) -> str:
+        return f'{self.key_prefix}:final_form:{form_id}'
+
+    async def get_status(self, form_id: str) -> Optional[str]:
+        return await self.redis.get(self._form_key(form_id))
+
+    async def begin_submission(self, form_id: str) -> bool:
+        return bool(await self.redis.set(self._form_key(form_id), SUBMITTING, nx=True, ex=SUBMISSION_LOCK_SECONDS))
+
+    async def abort_submission(self, form_id: str):
+        await self.redis.eval(_COMPARE_AND_DELETE_SCRIPT, 1, self._form_key(form_id), SUBMITTING)
+
+    async def complete_submission(self, form_id: str, appointment_id: str, appointment_info: Dict[str, str]):
+        # one round trip for all the writes
+        async with self.redis.pipeline(transaction=True) as pipeline:
+            pipeline.set(self._form_key(form_id), SCHEDULED, ex=self.ttl_seconds)
+            pipeline.delete(self._appointment_key(form_id))
+            pipeline.hset(self._appointment_key(form_id), mapping=appointment_info)
+            pipeline.expire(self._appointment_key(form_id), self.ttl_seconds)
+            pipeline.expire(self._slot_key(appointment_id), self.ttl_seconds)
+            await pipeline.execute()
+
+    async def claim_slot(self, appointment_id: str, form_id: str) -> bool:
+        slot_key = self._slot_key(appointment_id)
+        claimed = await self.redis.set(slot_key, form_id, nx=True, ex=self.ttl_seconds)
+        holder = form_id if claimed else await self.redis.get(slot_key)
+        if holder is not None:
+            # this worker's searches only know the claims it has seen, so a slot another worker's
+            # form holds stops being offered here once a claim on it fails
+            get_appointment_availability_store().reserve(appointment_id, holder)
+        return holder == form_id
+
+    async def release_slot(self, appointment_id: str, form_id: str):
+        await self.redis.eval(_COMPARE_AND_DELETE_SCRIPT, 1, self._slot_key(appointment_id), form_id)
+        get_appointment_availability_store().release(appointment_id, form_id)
+
+    async def save_final_form(self, form_id: str, form_fields: Dict[str, str]):
+        if not form_fields:
+            # redis can't store an empty hash
+            return
+        async with self.redis.pipeline(transaction=True) as pipeline:
+            pipeline.delete(self._final_form_key(form_id))
+            pipeline.hset(self._final_form_key(form_id), mapping=form_fields)
+            pipeline.expire(self._final_form_key(form_id), self.ttl_seconds)
+            await pipeline.execute()
+
+    async def get_appointment(self, form_id: str) -> Dict[str, str]:
+        return await self.redis.hgetall(self._appointment_key(form_id))
+
+    async def get_final_form(self, form_id: str) -> Dict[str, str]:
+        return await self.redis.hgetall(self._final_form_key(form_id))
+
+
+SCHEDULER_BACKENDS = ('memory', 'redis')
+
+_appointment_scheduler_backends: Dict[Tuple[str, int], AppointmentSchedulerBackend] = {}
+
+
+def get_appointment_scheduler_backend(backend: str = 'memory', ttl_seconds: int = DEFAULT_SCHEDULER_TTL_SECONDS) -> AppointmentSchedulerBackend:
+    """The process-wide backend, created on first use.
+
+    The scheduler settings are part of the call config, which is rebuilt from Redis for every
+    call, so the backend (and its Redis connection pool) lives here instead.
+    """
+    key = (backend, ttl_seconds)
+    scheduler_backend = _appointment_scheduler_backends.get(key)
+    if scheduler_backend is None:
+        if backend == 'memory':
+            scheduler_backend = InMemoryAppointmentScheduler(ttl_seconds)
+        elif backend == 'redis':
+            scheduler_backend = RedisAppointmentScheduler(ttl_seconds=ttl_seconds)
+        else:
+            raise ValueError(f'unknown scheduler backend {backend!r}, expected one of {SCHEDULER_BACKENDS}')
+        logger.info(f'using the {backend} appointment scheduler backend')
+        _appointment_scheduler_backends[key] = scheduler_backend
+    return scheduler_backend
+
+
+def set_appointment_scheduler_backend(scheduler_backend: AppointmentSchedulerBackend, backend: str = 'memory', ttl_seconds: int = DEFAULT_SCHEDULER_TTL_SECONDS):
+    _appointment_scheduler_backends[(backend, ttl_seconds)] = scheduler_backend
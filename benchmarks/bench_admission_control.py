@@ -0,0 +1,91 @@
+"""Turn latency of the calls a worker takes, at its capacity and overloaded, with and without
+admission control (admission_control.py).
+
+One app node runs in its own process (benchmarks.stub_services:create_stub_app, as in
+benchmarks.load_harness), so the simulated callers don't add to its event loop lag. Callers
+arrive at --calls-per-second in every run and each talks for --turns turns. Overloaded, the node
+is offered --overload times as many calls; with admission control it takes up to --capacity calls
+at once (MAX_ACTIVE_CONVERSATIONS) and answers the rest with overflow TwiML, which the
+simulated callers hang up on.
+
+    python -m benchmarks.bench_admission_control --capacity 20 --overload 3 --turns 3
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+import httpx
+
+from benchmarks.common import format_ms, summarize
+from benchmarks.load_harness import wait_until_listening
+from benchmarks.twilio_call_simulator import simulate_call
+
+
+async def delayed_call(address: str, delay: float, turns: int):
+    await asyncio.sleep(delay)
+    return await simulate_call(address, turns)
+
+
+async def run(calls: int, turns: int, calls_per_second: float, port: int, admission_env: Dict[str, str]) -> Dict[str, Any]:
+    env = {**os.environ, 'BASE_URL': 'stub.invalid', 'WEB_CONCURRENCY': '1', **admission_env}
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'benchmarks.stub_services:create_stub_app', '--factory',
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    address = f'127.0.0.1:{port}'
+    try:
+        await wait_until_listening([address])
+        start = time.perf_counter()
+        results = await asyncio.gather(*(delayed_call(address, i / calls_per_second, turns) for i in range(calls)))
+        elapsed = time.perf_counter() - start
+        async with httpx.AsyncClient() as client:
+            metrics = (await client.get(f'http://{address}/metrics')).text
+    finally:
+        process.terminate()
+        process.wait()
+    completed = [result for result in results if result.ok]
+    turn_latency = summarize([latency for result in completed for latency in result.turn_latencies])
+    return {
+        'calls': calls,
+        'completed': len(completed),
+        'overflowed': sum(result.overflowed for result in results),
+        'failed': sum(not result.ok and not result.overflowed for result in results),
+        # what /metrics says the node turned away, by limit
+        'rejected': [line.split('"')[1] + ' ' + line.split()[-1] for line in metrics.splitlines() if line.startswith('telephony_calls_rejected_total{')],
+        'elapsed': elapsed,
+        'turn_latency_p50': turn_latency['p50'],
+        'turn_latency_p95': turn_latency['p95'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--capacity', type=int, default=20, help='calls the node takes at once with admission control')
+    parser.add_argument('--overload', type=float, default=3.0, help='calls offered overloaded, as a multiple of --capacity')
+    parser.add_argument('--turns', type=int, default=3, help='caller turns per call')
+    parser.add_argument('--calls-per-second', type=float, default=12.0)
+    parser.add_argument('--port', type=int, default=3300)
+    args = parser.parse_args()
+
+    no_limits = {'MAX_ACTIVE_CONVERSATIONS': '0', 'MAX_EVENT_LOOP_LAG_MS': '0'}
+    admission_control = {'MAX_ACTIVE_CONVERSATIONS': str(args.capacity), 'MAX_EVENT_LOOP_LAG_MS': '100'}
+    overload = round(args.capacity * args.overload)
+    runs = (
+        ('at capacity', args.capacity, no_limits),
+        ('overloaded', overload, no_limits),
+        ('overloaded, admission', overload, admission_control),
+    )
+    print(f'{"":>22} {"offered":>8} {"completed":>10} {"overflow":>9} {"failed":>7} {"turn p50":>11} {"turn p95":>11}  rejected (/metrics)')
+    for name, calls, admission_env in runs:
+        result = asyncio.run(run(calls, args.turns, args.calls_per_second, args.port, admission_env))
+        print(f'{name:>22} {result["calls"]:>8} {result["completed"]:>10} {result["overflowed"]:>9} {result["failed"]:>7} '
+              f'{format_ms(result["turn_latency_p50"]):>11} {format_ms(result["turn_latency_p95"]):>11}  {", ".join(result["rejected"])}')
+
+
+if __name__ == '__main__':
+    main()
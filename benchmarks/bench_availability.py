@@ -0,0 +1,98 @@
+"""Availability store at clinic scale: load time from sqlite, id lookups, physician/time
+range queries against a linear scan of a plain list, and concurrent reservations.
+
+    python -m benchmarks.bench_availability --slots 50000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from benchmarks.common import generate_appointment_slots
+
+from appointment_availability import AppointmentAvailabilityStore
+
+
+def write_sqlite(path: str, slots):
+    connection = sqlite3.connect(path)
+    connection.execute(
+        'CREATE TABLE appointment_slots (appointment_number TEXT, appointment_id TEXT PRIMARY KEY, '
+        'appointment_physician_id TEXT, appointment_physician_name TEXT, appointment_time TEXT, '
+        'appointment_start TEXT, appointment_address TEXT)'
+    )
+    connection.executemany(
+        'INSERT INTO appointment_slots VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(slot.appointment_number, slot.appointment_id, slot.appointment_physician_id, slot.appointment_physician_name,
+          slot.appointment_time, slot.appointment_start.isoformat(), slot.appointment_address) for slot in slots],
+    )
+    connection.commit()
+    connection.close()
+
+
+def per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slots', type=int, default=50000)
+    parser.add_argument('--physicians', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    slots = generate_appointment_slots(args.slots, args.physicians)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'slots.sqlite')
+        write_sqlite(path, slots)
+        start = time.perf_counter()
+        store = AppointmentAvailabilityStore.from_sqlite(path)
+        print(f'loaded {len(store)} slots from sqlite in {time.perf_counter() - start:.3f}s')
+
+    slot_dicts = [{**slot.to_form_fields(), 'appointment_start': slot.appointment_start} for slot in slots]
+    window_start = slots[len(slots) // 2].appointment_start
+    window_end = window_start + timedelta(days=1)
+
+    def linear_lookup(i):
+        appointment_id = slots[(i * 7919) % len(slots)].appointment_id
+        return [slot for slot in slot_dicts if slot['appointment_id'] == appointment_id]
+
+    def indexed_lookup(i):
+        return store.get(slots[(i * 7919) % len(slots)].appointment_id)
+
+    def linear_range(i):
+        physician_id = f'phys_id_{i % args.physicians:04d}'
+        return [slot for slot in slot_dicts if slot['appointment_physician_id'] == physician_id and window_start <= slot['appointment_start'] < window_end]
+
+    def indexed_range(i):
+        return store.search(physician=f'phys_id_{i % args.physicians:04d}', start=window_start, end=window_end)
+
+    scan_iterations = max(1, args.iterations // 50)
+    print(f'id lookup:    linear scan {per_call(linear_lookup, scan_iterations) * 1e6:10.1f}us, index {per_call(indexed_lookup, args.iterations) * 1e6:8.2f}us')
+    print(f'range query:  linear scan {per_call(linear_range, scan_iterations) * 1e6:10.1f}us, index {per_call(indexed_range, args.iterations) * 1e6:8.2f}us')
+
+    # every thread tries to book every slot in the same set, each slot must be booked exactly once
+    contested = [slot.appointment_id for slot in slots[:1000]]
+    booked = [0] * args.threads
+
+    def book(thread_index: int):
+        for appointment_id in contested:
+            if store.reserve(appointment_id, f'caller-{thread_index}'):
+                booked[thread_index] += 1
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f'reservations: {len(contested)} contested slots, {sum(booked)} booked across {args.threads} threads')
+
+
+if __name__ == '__main__':
+    main()
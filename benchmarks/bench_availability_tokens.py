@@ -0,0 +1,70 @@
+"""Context tokens added by one *see_appointment_availability lookup.
+
+The action result is added to the transcript as a function message, and re-sent on every
+later LLM call of the conversation. Compares the old rendering (the repr of every slot)
+with the paginated compact rendering, unfiltered and filtered by physician and day.
+
+    python -m benchmarks.bench_availability_tokens
+"""
+import argparse
+import asyncio
+
+from benchmarks.common import generate_appointment_slots, setup_env
+
+setup_env()
+
+from vocode.streaming.agent.token_utils import num_tokens_from_messages  # noqa: E402
+from vocode.streaming.models.actions import ActionInput, ActionOutput  # noqa: E402
+from vocode.streaming.models.agent import ChatGPTAgentConfig  # noqa: E402
+
+from appointment_availability import AppointmentAvailabilityStore, set_appointment_availability_store  # noqa: E402
+from submit_health_appointment_info import (  # noqa: E402
+    HealthAppointmentForm,
+    HealthAppointmentInfoContainer,
+    HealthAppointmentScheduler,
+    SubmitHealthAppointmentInfoActionConfig,
+    SubmitHealthAppointmentInfoParameters,
+    SubmitHealthAppointmentInfoResponse,
+)
+
+
+def function_message_tokens(action_config, payload, success, info, next_step, model_name) -> int:
+    action_input = ActionInput(action_config=action_config, conversation_id='benchmark', params=SubmitHealthAppointmentInfoParameters(payload=payload))
+    action_output = ActionOutput(action_type=action_config.type, response=SubmitHealthAppointmentInfoResponse(success=success, info=info, next_step=next_step))
+    content = action_config.action_result_to_string(action_input, action_output)
+    return num_tokens_from_messages([{'role': 'function', 'name': action_config.type, 'content': content}], model_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slot-counts', type=int, nargs='+', default=[3, 100, 1000, 10000])
+    parser.add_argument('--model', default=ChatGPTAgentConfig.__fields__['model_name'].default)
+    args = parser.parse_args()
+
+    scheduler = HealthAppointmentScheduler()
+    action_config = SubmitHealthAppointmentInfoActionConfig(
+        health_appointment_info_container=HealthAppointmentInfoContainer(),
+        health_appointment_scheduler=scheduler)
+    form = HealthAppointmentForm()
+
+    print(f'model {args.model}, tokens added to the context per lookup')
+    print(f'{"slots":>7} {"full list":>10} {"page":>6} {"physician + day":>16}')
+    for slot_count in args.slot_counts:
+        slots = generate_appointment_slots(slot_count, physicians=min(100, slot_count))
+        set_appointment_availability_store(AppointmentAvailabilityStore(slots))
+        # what *see_appointment_availability returned before it was paginated
+        full_list_tokens = function_message_tokens(
+            action_config, {'*see_appointment_availability': ''}, True,
+            f'available appointments list: {form.available_appointments_list()}',
+            'help the user pick out an appointment. Don\'t repeat verbatim, give important details like name and time.',
+            args.model)
+        counts = [full_list_tokens]
+        for filters in ({}, {'physician': slots[-1].appointment_physician_name, 'start_date': slots[-1].appointment_start.strftime('%Y-%m-%d')}):
+            payload = {'*see_appointment_availability': filters}
+            success, info, next_step = asyncio.run(form.validate_key_and_submit_if_valid(payload, scheduler))
+            counts.append(function_message_tokens(action_config, payload, success, info, next_step, args.model))
+        print(f'{slot_count:>7} {counts[0]:>10} {counts[1]:>6} {counts[2]:>16}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Outbound campaign throughput, in calls initiated per second, against a local fake of the
+Twilio Calls endpoint (benchmarks.fake_twilio).
+
+Every call goes through outbound_campaign's OutboundCall path: the agent config is built, the
+call is created on the fake and its config saved (in memory here, Redis in production).
+Concurrency 1 dials one patient at a time, like outbound_call.py used to. The rate limited
+run shows the account limit holding, the retry run has the fake fail the first
+--failures requests with a 503, and the resume run repeats the last campaign id.
+
+    python -m benchmarks.bench_campaign --patients 500 --twilio-latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+
+from benchmarks.common import setup_env
+from benchmarks.fake_twilio import FakeTwilioServer
+
+setup_env()
+
+from vocode.streaming.telephony.config_manager.in_memory_config_manager import InMemoryConfigManager  # noqa: E402
+
+from http_clients import HttpClientRegistry  # noqa: E402
+from outbound_campaign import CampaignStats, InMemoryCampaignProgressStore, OutboundCampaign, read_contacts  # noqa: E402
+
+
+def write_patient_list(path: str, patients: int, invalid: int):
+    with open(path, 'w') as f:
+        for i in range(patients):
+            # the first `invalid` numbers are too short, Twilio rejects them
+            phone_number = '+1555' if i < invalid else '+1650{:07d}'.format(i)
+            kind = 'reschedule' if i % 4 == 0 else 'reminder'
+            f.write(json.dumps({'contact_id': f'patient-{i}', 'phone_number': phone_number, 'patient_name': 'Jane Doe', 'kind': kind, 'appointment_time': 'Tuesday at 10:30 AM'}) + '\n')
+
+
+async def run_campaign(server: FakeTwilioServer, path: str, campaign_id: str, progress_store: InMemoryCampaignProgressStore, concurrency: int, account_calls_per_second: float, backoff_seconds: float) -> CampaignStats:
+    registry = HttpClientRegistry()
+    campaign = OutboundCampaign(
+        campaign_id=campaign_id,
+        base_url='campaign.invalid',
+        from_phones=['+15555550100', '+15555550101', '+15555550102', '+15555550103'],
+        config_manager=InMemoryConfigManager(),
+        progress_store=progress_store,
+        max_concurrency=concurrency,
+        # a production account is limited, these runs measure the campaign itself
+        calls_per_second_per_number=0,
+        account_calls_per_second=account_calls_per_second,
+        backoff_base_seconds=backoff_seconds,
+        scheduler_backend='memory',
+        api_base_url=server.base_url,
+        http_client_registry=registry,
+    )
+    try:
+        return await campaign.run(read_contacts(path))
+    finally:
+        await registry.aclose()
+
+
+def report(name: str, stats: CampaignStats, server: FakeTwilioServer):
+    print(
+        f'{name:>24}: {stats.calls_per_second:8.1f} calls/s | {stats.initiated} initiated, {stats.failed} failed, '
+        f'{stats.retried} retried, {stats.skipped} skipped in {stats.seconds:.2f}s | {server.request_count} requests to twilio'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--patients', type=int, default=500)
+    parser.add_argument('--invalid', type=int, default=5, help='patients with a number twilio rejects')
+    parser.add_argument('--twilio-latency', type=float, default=0.05, help='fake Calls endpoint response time in seconds')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--account-cps', type=float, default=50.0, help='account limit of the rate limited run')
+    parser.add_argument('--failures', type=int, default=20, help='503s the fake returns in the retry run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'patients.jsonl')
+        write_patient_list(path, args.patients, args.invalid)
+
+        for concurrency in args.concurrency:
+            with FakeTwilioServer(response_delay_seconds=args.twilio_latency) as server:
+                stats = asyncio.run(run_campaign(server, path, f'concurrency-{concurrency}', InMemoryCampaignProgressStore(), concurrency, 0, 0))
+                report(f'concurrency {concurrency}', stats, server)
+
+        concurrency = max(args.concurrency)
+        with FakeTwilioServer(response_delay_seconds=args.twilio_latency) as server:
+            stats = asyncio.run(run_campaign(server, path, 'rate-limited', InMemoryCampaignProgressStore(), concurrency, args.account_cps, 0))
+            report(f'account limit {args.account_cps:g}/s', stats, server)
+
+        progress_store = InMemoryCampaignProgressStore()
+        with FakeTwilioServer(response_delay_seconds=args.twilio_latency, fail_first_n=args.failures) as server:
+            stats = asyncio.run(run_campaign(server, path, 'retries', progress_store, concurrency, 0, 0.05))
+            report(f'{args.failures} failures, retried', stats, server)
+        with FakeTwilioServer(response_delay_seconds=args.twilio_latency) as server:
+            stats = asyncio.run(run_campaign(server, path, 'retries', progress_store, concurrency, 0, 0.05))
+            report('resumed', stats, server)
+
+
+if __name__ == '__main__':
+    main()
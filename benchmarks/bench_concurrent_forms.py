@@ -0,0 +1,89 @@
+"""Runs N simulated conversations through SubmitHealthAppointmentInfo concurrently.
+
+Each conversation submits its own patient's fields (with a simulated LLM round trip
+between turns), books its own slot, and then checks its form was not touched by any
+other conversation.
+Throughput should grow roughly linearly with the number of concurrent conversations.
+
+    python -m benchmarks.bench_concurrent_forms --conversations 1 10 50 200
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import generate_appointment_slots, setup_env
+
+setup_env()
+
+from vocode.streaming.models.actions import ActionInput  # noqa: E402
+
+from appointment_availability import AppointmentAvailabilityStore, set_appointment_availability_store  # noqa: E402
+from appointment_scheduler import InMemoryAppointmentScheduler, set_appointment_scheduler_backend  # noqa: E402
+from submit_health_appointment_info import (  # noqa: E402
+    HealthAppointmentFormStore,
+    HealthAppointmentInfoContainer,
+    HealthAppointmentScheduler,
+    SubmitHealthAppointmentInfo,
+    SubmitHealthAppointmentInfoActionConfig,
+    SubmitHealthAppointmentInfoParameters,
+)
+
+
+def scripted_payloads(index: int):
+    return [
+        {'patient_name': f'Patient Number{index}'},
+        {'patient_dob': '1990-01-{:02d}'.format(index % 28 + 1)},
+        {'reason_for_visit': f'checkup {index}'},
+        {'patient_phone_number': '+1 650-253-{:04d}'.format(index % 10000)},
+        {'appointment_id': f'appt_id_{index:06d}'},
+        {'send_text': False},
+        {'*validate_all_and_submit_if_valid': ''},
+    ]
+
+
+async def run_conversation(action: SubmitHealthAppointmentInfo, index: int, turn_latency: float) -> bool:
+    conversation_id = f'bench-conversation-{index}'
+    for payload in scripted_payloads(index):
+        await asyncio.sleep(turn_latency)  # simulated LLM round trip
+        action_output = await action.run(ActionInput(
+            action_config=action.action_config,
+            conversation_id=conversation_id,
+            params=SubmitHealthAppointmentInfoParameters(payload=payload),
+        ))
+    form = action.form_store.get(conversation_id)
+    return (
+        action_output.response.success
+        and form is not None
+        and form.patient_name == f'Patient Number{index}'
+        and form.reason_for_visit == f'checkup {index}'
+    )
+
+
+async def run(conversations: int, turn_latency: float):
+    action_config = SubmitHealthAppointmentInfoActionConfig(
+        health_appointment_info_container=HealthAppointmentInfoContainer(),
+        health_appointment_scheduler=HealthAppointmentScheduler())
+    action = SubmitHealthAppointmentInfo(action_config, form_store=HealthAppointmentFormStore())
+    # one slot per conversation, so every submit can succeed
+    set_appointment_availability_store(AppointmentAvailabilityStore(generate_appointment_slots(conversations)))
+    set_appointment_scheduler_backend(InMemoryAppointmentScheduler())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_conversation(action, i, turn_latency) for i in range(conversations)))
+    elapsed = time.perf_counter() - start
+    return elapsed, results.count(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conversations', type=int, nargs='+', default=[1, 10, 50, 200])
+    parser.add_argument('--turn-latency', type=float, default=0.05, help='simulated LLM round trip in seconds')
+    args = parser.parse_args()
+
+    print(f'{"conversations":>14} {"elapsed":>10} {"conv/s":>10} {"failed":>7}')
+    for conversations in args.conversations:
+        elapsed, failed = asyncio.run(run(conversations, args.turn_latency))
+        print(f'{conversations:>14} {elapsed:>9.3f}s {conversations / elapsed:>10.1f} {failed:>7}')
+
+
+if __name__ == '__main__':
+    main()
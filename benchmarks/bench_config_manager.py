@@ -0,0 +1,114 @@
+"""Call config save and load latency, and Redis bytes per call, with vocode's RedisConfigManager
+(the whole config as JSON under the conversation id) and template_config_manager's
+TemplateConfigManager (a small record per call, the agent config stored once).
+
+The configs are the production inbound call's (main.build_inbound_call_configs), one per call
+with its own numbers and Twilio sid. Like /inbound_call and the websocket landing on different
+workers, one manager saves the configs and another reads them, starting with an empty cache.
+Runs against an in-process fakeredis (pip install fakeredis), which has no network round trip,
+so the latencies are mostly JSON and parsing. --redis uses the Redis the app uses (REDISHOST,
+REDISPORT, ...), e.g. `docker compose up redis`.
+
+    python -m benchmarks.bench_config_manager --calls 1000 [--redis]
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from typing import List
+
+from benchmarks.common import format_ms, setup_env, summarize
+
+setup_env()
+os.environ.setdefault('APPOINTMENT_SCHEDULER_BACKEND', 'memory')
+
+from vocode.streaming.models.telephony import TwilioCallConfig  # noqa: E402
+from vocode.streaming.telephony.config_manager.base_config_manager import BaseConfigManager  # noqa: E402
+from vocode.streaming.telephony.config_manager.redis_config_manager import RedisConfigManager  # noqa: E402
+from vocode.streaming.utils.redis import initialize_redis  # noqa: E402
+
+from main import build_inbound_call_configs  # noqa: E402
+from template_config_manager import TemplateConfigManager  # noqa: E402
+
+
+def create_redis(real_redis: bool):
+    if real_redis:
+        return initialize_redis()
+    import fakeredis
+    # decoded like initialize_redis's
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+def redis_config_manager(redis) -> RedisConfigManager:
+    config_manager = RedisConfigManager()
+    config_manager.redis = redis
+    return config_manager
+
+
+def call_configs(calls: int) -> List[TwilioCallConfig]:
+    inbound_call_config = build_inbound_call_configs()[0]
+    return [
+        TwilioCallConfig(
+            transcriber_config=TwilioCallConfig.default_transcriber_config(),
+            synthesizer_config=TwilioCallConfig.default_synthesizer_config(),
+            agent_config=inbound_call_config.agent_config,
+            twilio_config=inbound_call_config.twilio_config,
+            twilio_sid=f'CA{i:032d}',
+            from_phone='+1650{:07d}'.format(i),
+            to_phone='+15555550100',
+            direction='inbound',
+        )
+        for i in range(calls)
+    ]
+
+
+async def run(name: str, saver: BaseConfigManager, reader: BaseConfigManager, configs: List[TwilioCallConfig], call_key) -> None:
+    conversation_ids = [f'bench_config_manager_{uuid.uuid4().hex}' for _ in configs]
+    save_timings: List[float] = []
+    get_timings: List[float] = []
+    for conversation_id, config in zip(conversation_ids, configs):
+        start = time.perf_counter()
+        await saver.save_config(conversation_id, config)
+        save_timings.append(time.perf_counter() - start)
+    for conversation_id, config in zip(conversation_ids, configs):
+        start = time.perf_counter()
+        loaded = await reader.get_config(conversation_id)
+        get_timings.append(time.perf_counter() - start)
+        assert loaded == config, f'{name}: {conversation_id} read back different'
+    per_call = [await saver.redis.strlen(call_key(conversation_id)) for conversation_id in conversation_ids]
+    for conversation_id in conversation_ids:
+        await saver.delete_config(conversation_id)
+
+    saves, gets = summarize(save_timings), summarize(get_timings)
+    print(
+        f'{name:>9}: save p50 {format_ms(saves["p50"]):>10} p95 {format_ms(saves["p95"]):>10} | '
+        f'get p50 {format_ms(gets["p50"]):>10} p95 {format_ms(gets["p95"]):>10} | '
+        f'{sum(per_call) / len(per_call):,.0f} bytes per call'
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=1000)
+    parser.add_argument('--redis', action='store_true', help='use the Redis at REDISHOST/REDISPORT instead of fakeredis')
+    args = parser.parse_args()
+
+    redis = create_redis(args.redis)
+    configs = call_configs(args.calls)
+    print(f'{args.calls} calls, each config {len(configs[0].json().encode()):,} bytes as JSON, {"redis" if args.redis else "fakeredis"}')
+    await run('redis', redis_config_manager(redis), redis_config_manager(redis), configs, lambda conversation_id: conversation_id)
+
+    # a fresh prefix, so the reader can't find templates from earlier runs
+    key_prefix = f'bench_config_manager_{uuid.uuid4().hex[:8]}'
+    saver = TemplateConfigManager(redis, key_prefix=key_prefix)
+    reader = TemplateConfigManager(redis, key_prefix=key_prefix)
+    await run('templates', saver, reader, configs, saver._call_key)
+    template_keys = [key async for key in redis.scan_iter(f'{key_prefix}:config_template:*')]
+    template_bytes = sum([await redis.strlen(key) for key in template_keys])
+    print(f'{"":>9}  {len(template_keys)} templates, {template_bytes:,} bytes once | reader template cache {reader.template_hits} hits, {reader.template_misses} misses')
+    await redis.delete(*template_keys)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
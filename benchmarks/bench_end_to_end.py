@@ -0,0 +1,133 @@
+"""End-to-end appointment calls, offline: the production call config and agent
+(SpellerAgentFactory's HealthAppointmentChatGPTAgent with SubmitHealthAppointmentInfo),
+with a stub LLM, stub transcriber/synthesizer and a fake Twilio media websocket.
+
+The app from main.create_app() is served in process by uvicorn, and every call runs the
+scripted appointment conversation from benchmarks.stub_services, ending in a booking.
+Reports turn latency, SubmitHealthAppointmentInfo.run time and calls per second, as a
+baseline to compare performance changes against.
+
+    python -m benchmarks.bench_end_to_end --calls 1 10 50 --llm-first-token-ms 300
+
+--batched has the stub LLM send everything the caller said in an utterance in one payload
+instead of one function call per field, to compare LLM round trips and call length.
+--no-prefetch turns off the availability that comes with the result completing stage 1,
+so the agent looks it up itself; compare the "details turn" latency, from the caller giving
+their details to the bot offering slots.
+--no-read-back has the LLM read back validated fields instead of the action. The action only
+reads back single-call utterances (vocode doesn't go back to the LLM after a read-back), so
+it's always off without --batched.
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+from benchmarks.common import format_ms, generate_appointment_slots, setup_env, summarize
+
+setup_env()
+os.environ.setdefault('APPOINTMENT_SCHEDULER_BACKEND', 'memory')
+
+import uvicorn  # noqa: E402
+
+from appointment_availability import AppointmentAvailabilityStore, set_appointment_availability_store  # noqa: E402
+from appointment_scheduler import SCHEDULED, InMemoryAppointmentScheduler, set_appointment_scheduler_backend  # noqa: E402
+from benchmarks.stub_services import StubLLMAgentFactory, create_stub_app, scripted_appointment_turns  # noqa: E402
+from benchmarks.twilio_call_simulator import simulate_call  # noqa: E402
+from instrumentation import span_metrics  # noqa: E402
+from main import build_inbound_call_configs  # noqa: E402
+from submit_health_appointment_info import SubmitHealthAppointmentInfo, SubmitHealthAppointmentInfoActionConfig, health_appointment_form_store  # noqa: E402
+
+# the caller's utterance with their details, the turn that ends with the bot offering slots
+DETAILS_TURN_INDEX = 1
+
+action_run_seconds: List[float] = []
+
+
+class TimedSubmitHealthAppointmentInfo(SubmitHealthAppointmentInfo):
+    async def run(self, action_input):
+        start = time.perf_counter()
+        try:
+            return await super().run(action_input)
+        finally:
+            action_run_seconds.append(time.perf_counter() - start)
+
+
+def print_summary(name: str, values: List[float]):
+    result = summarize(values)
+    print(f'  {name:<22} n={result["count"]:<5} p50 {format_ms(result["p50"]):>10} p95 {format_ms(result["p95"]):>10} p99 {format_ms(result["p99"]):>10}')
+
+
+async def run(calls: int, port: int, llm_first_token_seconds: float, llm_seconds_per_token: float, batched: bool = False, prefetch_availability: bool = True, read_back: bool = True):
+    os.environ['STUB_APP_AGENT'] = 'llm'
+    set_appointment_availability_store(AppointmentAvailabilityStore(generate_appointment_slots(calls)))
+    scheduler_backend = InMemoryAppointmentScheduler()
+    set_appointment_scheduler_backend(scheduler_backend)
+    action_run_seconds.clear()
+    span_metrics.clear()
+    agent_factory = StubLLMAgentFactory(
+        first_token_seconds=llm_first_token_seconds,
+        seconds_per_token=llm_seconds_per_token,
+        action_classes={SubmitHealthAppointmentInfoActionConfig.type_string(): TimedSubmitHealthAppointmentInfo},
+        batched=batched,
+    )
+    inbound_call_configs = build_inbound_call_configs()
+    for inbound_call_config in inbound_call_configs:
+        for action_config in inbound_call_config.agent_config.actions:
+            if isinstance(action_config, SubmitHealthAppointmentInfoActionConfig):
+                action_config.health_appointment_scheduler.prefetch_availability = prefetch_availability
+                action_config.health_appointment_scheduler.read_back = read_back and batched
+    app = create_stub_app(agent_factory, inbound_call_configs)
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', lifespan='on'))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        # the caller talks once per scripted turn, plus once to end the call
+        turns = len(scripted_appointment_turns(0)) + 1
+        start = time.perf_counter()
+        results = await asyncio.gather(*(simulate_call(f'127.0.0.1:{port}', turns) for _ in range(calls)))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.should_exit = True
+        await server_task
+    booked = 0
+    for result in results:
+        if result.conversation_id is not None and await scheduler_backend.get_status(result.conversation_id) == SCHEDULED:
+            booked += 1
+    completed = [result for result in results if result.ok]
+    print(f'{calls} concurrent calls: {len(completed)} completed, {booked} booked, {elapsed:.2f}s, {len(completed) / elapsed:.2f} calls/s')
+    llm_requests = sum(client.request_count for client in agent_factory.openai_clients)
+    call_seconds = [result.call_seconds for result in completed]
+    print(f'  per call: {llm_requests / max(1, len(agent_factory.openai_clients)):.1f} LLM requests, {sum(call_seconds) / max(1, len(call_seconds)):.2f}s from answer to hang up')
+    # the post-call pipeline frees each call's form when the call ends
+    print(f'  forms still in memory after the calls: {len(health_appointment_form_store)}')
+    print_summary('turn latency', [latency for result in completed for latency in result.turn_latencies])
+    print_summary('details turn', [result.turn_latencies[DETAILS_TURN_INDEX] for result in completed if len(result.turn_latencies) > DETAILS_TURN_INDEX])
+    print_summary('first audio', [result.first_audio_seconds for result in completed if result.first_audio_seconds is not None])
+    print_summary('action run', action_run_seconds)
+    print('  spans (instrumentation.py, what /metrics serves):')
+    for name in ('agent.first_response', 'agent.generate_response', 'action.run', 'form.validate_key_and_submit', 'config_manager.save', 'config_manager.get'):
+        histogram = span_metrics.get(name)
+        if histogram is not None and histogram.count:
+            print(f'    {name:<30} n={histogram.count:<5} mean {format_ms(histogram.sum / histogram.count):>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--port', type=int, default=3200)
+    parser.add_argument('--llm-first-token-ms', type=float, default=0.0, help='simulated LLM time to first token')
+    parser.add_argument('--llm-ms-per-token', type=float, default=0.0)
+    parser.add_argument('--batched', action='store_true', help='one function call per utterance instead of one per field')
+    parser.add_argument('--no-prefetch', action='store_true', help="don't return the availability with the result completing stage 1")
+    parser.add_argument('--no-read-back', action='store_true', help='the LLM reads back validated fields, not the action')
+    args = parser.parse_args()
+
+    for calls in args.calls:
+        asyncio.run(run(calls, args.port, args.llm_first_token_ms / 1000, args.llm_ms_per_token / 1000, args.batched, not args.no_prefetch, not args.no_read_back))
+
+
+if __name__ == '__main__':
+    main()
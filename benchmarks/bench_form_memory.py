@@ -0,0 +1,68 @@
+"""Memory held by the per-call appointment forms, and the size of a call config in Redis.
+
+Creates --forms forms through the form store, as that many concurrent calls would, fills in a
+few fields on each and measures what they allocated with tracemalloc. The call config is the
+TwilioCallConfig of an inbound call, as RedisConfigManager saves it.
+
+    python -m benchmarks.bench_form_memory --forms 1000
+"""
+import argparse
+import os
+import tracemalloc
+
+from benchmarks.common import setup_env
+
+setup_env()
+os.environ.setdefault('APPOINTMENT_SCHEDULER_BACKEND', 'memory')
+
+from vocode.streaming.models.telephony import TwilioCallConfig  # noqa: E402
+
+from main import build_inbound_call_configs  # noqa: E402
+from submit_health_appointment_info import HealthAppointmentFormStore, HealthAppointmentInfoContainer  # noqa: E402
+
+
+def form_bytes(forms: int) -> float:
+    template = HealthAppointmentInfoContainer()
+    store = HealthAppointmentFormStore(max_forms=forms)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for i in range(forms):
+            form = store.get_or_create(f'conversation-{i}', template)
+            form.patient_name = f'Patient Number{i}'
+            form.patient_dob = '1990-01-{:02d}'.format(i % 28 + 1)
+            form.patient_phone_number = '+1 650-253-{:04d}'.format(i % 10000)
+            form.reason_for_visit = f'checkup {i}'
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, 'filename')) / forms
+
+
+def call_config_bytes() -> int:
+    inbound_call_config = build_inbound_call_configs()[0]
+    call_config = TwilioCallConfig(
+        transcriber_config=TwilioCallConfig.default_transcriber_config(),
+        synthesizer_config=TwilioCallConfig.default_synthesizer_config(),
+        agent_config=inbound_call_config.agent_config,
+        twilio_config=inbound_call_config.twilio_config,
+        twilio_sid='CAbenchmark',
+        from_phone='+15555550100',
+        to_phone='+15555550101',
+        direction='inbound',
+    )
+    return len(call_config.json().encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--forms', type=int, default=1000)
+    args = parser.parse_args()
+
+    per_form = form_bytes(args.forms)
+    print(f'{args.forms} forms: {per_form:,.0f} bytes per form, {per_form * args.forms / 1024:,.0f} KiB in all')
+    print(f'call config in redis: {call_config_bytes():,} bytes')
+
+
+if __name__ == '__main__':
+    main()
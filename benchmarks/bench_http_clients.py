@@ -0,0 +1,76 @@
+"""Outbound HTTP from simulated calls: a new client per call, as vocode's per-agent OpenAI
+client did, against the shared clients of http_clients.HttpClientRegistry.
+
+Every call makes --requests-per-call requests to a local stub server (benchmarks.fake_twilio),
+which counts the connections it accepts; each one is a handshake (TCP here, TCP and TLS in
+production). "client setup" is the time to create the call's client, which builds an SSL
+context, on the event loop.
+
+    python -m benchmarks.bench_http_clients --calls 20 --requests-per-call 5
+"""
+import argparse
+import asyncio
+import time
+from typing import List, Tuple
+
+import httpx
+
+from benchmarks.common import format_ms, setup_env, summarize
+from benchmarks.fake_twilio import FakeTwilioServer
+
+setup_env()
+
+from http_clients import HttpClientRegistry  # noqa: E402
+
+
+async def simulate_call(mode: str, registry: HttpClientRegistry, url: str, requests_per_call: int, turn_seconds: float, setups: List[float], latencies: List[float]):
+    start = time.perf_counter()
+    client = httpx.AsyncClient() if mode == 'client per call' else registry.get('bench')
+    setups.append(time.perf_counter() - start)
+    for _ in range(requests_per_call):
+        start = time.perf_counter()
+        response = await client.post(url, data={'To': '+16502530000', 'From': '+15555550100', 'Body': 'benchmark'})
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        # the caller talks between requests
+        await asyncio.sleep(turn_seconds)
+    if mode == 'client per call':
+        await client.aclose()
+
+
+async def run(mode: str, server: FakeTwilioServer, calls: int, requests_per_call: int, turn_seconds: float) -> Tuple[List[float], List[float]]:
+    registry = HttpClientRegistry()
+    url = f'{server.base_url}/2010-04-01/Accounts/ACbenchmark/Messages.json'
+    setups: List[float] = []
+    latencies: List[float] = []
+    # calls overlap, a few start while others are mid call
+    tasks = []
+    for _ in range(calls):
+        tasks.append(asyncio.create_task(simulate_call(mode, registry, url, requests_per_call, turn_seconds, setups, latencies)))
+        await asyncio.sleep(turn_seconds / 4)
+    await asyncio.gather(*tasks)
+    await registry.aclose()
+    return setups, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--requests-per-call', type=int, default=5)
+    parser.add_argument('--server-latency', type=float, default=0.01, help='stub server response time in seconds')
+    parser.add_argument('--turn-seconds', type=float, default=0.2, help='time between a call\'s requests')
+    args = parser.parse_args()
+
+    for mode in ('client per call', 'shared'):
+        with FakeTwilioServer(response_delay_seconds=args.server_latency) as server:
+            setups, latencies = asyncio.run(run(mode, server, args.calls, args.requests_per_call, args.turn_seconds))
+            setup = summarize(setups)
+            latency = summarize(latencies)
+            print(
+                f'{mode:>15}: {server.connection_count} connections for {server.request_count} requests | '
+                f'client setup p50 {format_ms(setup["p50"])} | request p50 {format_ms(latency["p50"])} p95 {format_ms(latency["p95"])}'
+            )
+
+
+if __name__ == '__main__':
+    main()
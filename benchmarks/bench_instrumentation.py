@@ -0,0 +1,67 @@
+"""Overhead of a timing span (instrumentation.span), with and without the JSON trace log,
+next to the cheapest thing it wraps in a call: one field validation.
+
+    python -m benchmarks.bench_instrumentation --iterations 200000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.common import setup_env
+
+setup_env()
+
+from instrumentation import disable_trace_log, enable_trace_log, span, span_metrics  # noqa: E402
+from submit_health_appointment_info import HealthAppointmentForm, HealthAppointmentScheduler  # noqa: E402
+
+
+def time_per_iteration(function, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations
+
+
+def empty():
+    pass
+
+
+def empty_span():
+    with span('bench.empty', 'bench-conversation'):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=200000)
+    args = parser.parse_args()
+
+    baseline = time_per_iteration(empty, args.iterations)
+    metrics_only = time_per_iteration(empty_span, args.iterations) - baseline
+    with tempfile.TemporaryDirectory() as directory:
+        enable_trace_log(os.path.join(directory, 'trace.jsonl'))
+        try:
+            traced = time_per_iteration(empty_span, args.iterations // 10) - baseline
+        finally:
+            disable_trace_log()
+
+    form = HealthAppointmentForm()
+    scheduler = HealthAppointmentScheduler()
+    loop = asyncio.new_event_loop()
+    validation_iterations = args.iterations // 10
+    start = time.perf_counter()
+    for _ in range(validation_iterations):
+        loop.run_until_complete(form.validate_key_and_submit_if_valid({'patient_name': 'Jane Doe'}, scheduler))
+    validation = (time.perf_counter() - start) / validation_iterations
+    loop.close()
+
+    print(f'span, metrics only:      {metrics_only * 1e9:8.0f}ns')
+    print(f'span, with trace log:    {traced * 1e9:8.0f}ns')
+    print(f'one field validation:    {validation * 1e9:8.0f}ns (includes its own span and the event loop round trip)')
+    print(f'spans recorded: {span_metrics.get("bench.empty").count}')
+
+
+if __name__ == '__main__':
+    main()
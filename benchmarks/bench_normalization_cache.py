@@ -0,0 +1,58 @@
+"""Phone number and date of birth validation, cold and warm.
+
+"first number" is the first phone number validated in the process, which loads the
+phonenumbers metadata unless preload_phone_number_metadata() ran at startup. "miss" is a
+value the normalization caches haven't seen, "hit" one they have, which is what every
+re-validation and '*validate_all_and_submit_if_valid' pays.
+
+    python -m benchmarks.bench_normalization_cache --iterations 20000
+"""
+import argparse
+import time
+
+from benchmarks.common import format_ms, setup_env
+
+setup_env()
+
+from health_appointment_validators import clear_normalization_caches, preload_phone_number_metadata, validate_date_of_birth, validate_phone_number  # noqa: E402
+
+
+def time_first_call(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def time_per_call(function, values, iterations: int, clear_caches: bool) -> float:
+    total = 0.0
+    for i in range(iterations):
+        value = values[i % len(values)]
+        if clear_caches:
+            clear_normalization_caches()
+        start = time.perf_counter()
+        result = function('field', value)
+        total += time.perf_counter() - start
+        assert result.success, result.info
+    return total / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--preload', action='store_true', help='load the phonenumbers metadata before the first number')
+    args = parser.parse_args()
+
+    if args.preload:
+        print(f'preload metadata:    {format_ms(time_first_call(preload_phone_number_metadata)):>10}')
+    print(f'first number:        {format_ms(time_first_call(validate_phone_number, "patient_phone_number", "650 253 0000")):>10}')
+
+    phone_numbers = ['650 254 {:04d}'.format(i) for i in range(100)]
+    dates = ['19{:02d}-03-{:02d}'.format(year, day) for year in range(50, 100) for day in (3, 17)]
+    for name, function, values in (('phone', validate_phone_number, phone_numbers), ('date of birth', validate_date_of_birth, dates)):
+        miss = time_per_call(function, values, args.iterations, clear_caches=True)
+        hit = time_per_call(function, values, args.iterations, clear_caches=False)
+        print(f'{name:<14} miss {format_ms(miss):>10}  hit {format_ms(hit):>10}  ({miss / hit:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Time to first audio on call pickup, with the greeting synthesized on every call (miss) or
+served from phrase_audio_cache (hit).
+
+Calls go through the stub app and the fake Twilio websocket (see benchmarks.stub_services),
+and hang up after the greeting. The stub synthesizer stands in for a TTS service that takes
+--tts-first-chunk-ms to return its first audio. Time to first audio runs from the
+/inbound_call POST to the first media frame of the greeting.
+
+    python -m benchmarks.bench_phrase_cache --calls 10 --tts-first-chunk-ms 300
+"""
+import argparse
+import asyncio
+import tempfile
+from typing import List, Optional
+
+from benchmarks.common import format_ms, setup_env, summarize
+
+setup_env()
+
+import uvicorn  # noqa: E402
+
+from benchmarks.stub_services import StubSynthesizerFactory, create_stub_app  # noqa: E402
+from benchmarks.twilio_call_simulator import simulate_call  # noqa: E402
+from instrumentation import span_metrics  # noqa: E402
+from phrase_audio_cache import PhraseAudioCache  # noqa: E402
+
+
+async def run(calls: int, port: int, tts_first_chunk_seconds: float, phrase_audio_cache: Optional[PhraseAudioCache]) -> List[float]:
+    app = create_stub_app(
+        synthesizer_factory=StubSynthesizerFactory(first_chunk_delay_seconds=tts_first_chunk_seconds),
+        phrase_audio_cache=phrase_audio_cache,
+    )
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', lifespan='on'))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        if app.state.phrase_audio_cache_warm_up is not None:
+            await app.state.phrase_audio_cache_warm_up
+        first_audio: List[float] = []
+        # one call at a time, so calls don't queue behind each other
+        for _ in range(calls):
+            result = await simulate_call(f'127.0.0.1:{port}', turns=0, settle_seconds=0.1)
+            if result.first_audio_seconds is not None:
+                first_audio.append(result.first_audio_seconds)
+    finally:
+        server.should_exit = True
+        await server_task
+    return first_audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=10)
+    parser.add_argument('--port', type=int, default=3500)
+    parser.add_argument('--tts-first-chunk-ms', type=float, default=300.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, phrase_audio_cache in (('miss', None), ('hit', PhraseAudioCache(directory))):
+            span_metrics.clear()
+            first_audio = summarize(asyncio.run(run(args.calls, args.port, args.tts_first_chunk_ms / 1000, phrase_audio_cache)))
+            hits = span_metrics.get('synthesizer.phrase_cache_hit')
+            print(
+                f'{name:>4}: n={first_audio["count"]:<4} time to first audio p50 {format_ms(first_audio["p50"]):>10} '
+                f'p95 {format_ms(first_audio["p95"]):>10} | cache hits {hits.count if hits else 0}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Measures agent creation time and per-turn prompt overhead, with and without the compiled
+prompt/schema caches.
+
+"uncached" clears the caches before every agent and formats each turn with vocode's
+format_openai_chat_messages_from_transcript, which re-tokenizes the preamble and functions.
+
+    python -m benchmarks.bench_prompt_compilation --iterations 50 --turns 20
+"""
+import argparse
+import time
+from typing import List
+
+from benchmarks.common import format_ms, setup_env, summarize
+
+setup_env()
+
+from vocode.streaming.agent.openai_utils import format_openai_chat_messages_from_transcript  # noqa: E402
+from vocode.streaming.models.agent import ChatGPTAgentConfig  # noqa: E402
+from vocode.streaming.models.transcript import Transcript  # noqa: E402
+
+import health_appointment_prompt  # noqa: E402
+import submit_health_appointment_info  # noqa: E402
+from speller_agent import SpellerAgentFactory  # noqa: E402
+from submit_health_appointment_info import (  # noqa: E402
+    HealthAppointmentInfoContainer,
+    HealthAppointmentScheduler,
+    SubmitHealthAppointmentInfoActionConfig,
+)
+
+
+def clear_caches():
+    submit_health_appointment_info.compile_health_appointment_schema.cache_clear()
+    submit_health_appointment_info._openai_function_cache.clear()
+    health_appointment_prompt._compile_prompt_preamble.cache_clear()
+    health_appointment_prompt.static_prompt_tokens.cache_clear()
+
+
+def create_agent():
+    agent_config = ChatGPTAgentConfig(
+        prompt_preamble=health_appointment_prompt.build_prompt_preamble(),
+        generate_responses=True,
+        actions=[
+            SubmitHealthAppointmentInfoActionConfig(
+                health_appointment_info_container=HealthAppointmentInfoContainer(),
+                health_appointment_scheduler=HealthAppointmentScheduler()),
+        ],
+    )
+    return SpellerAgentFactory().create_agent(agent_config)
+
+
+def scripted_transcript(turns: int) -> Transcript:
+    transcript = Transcript()
+    for i in range(turns):
+        transcript.add_human_message(f'my name is Patient Number{i}', conversation_id='bench')
+        transcript.add_bot_message(f'P. a. t. i. e. n. t. space N. u. m. b. e. r. {i}. Is that correct?', conversation_id='bench', is_final=True)
+    return transcript
+
+
+def bench_agent_creation(iterations: int, cached: bool) -> List[float]:
+    timings = []
+    for _ in range(iterations):
+        if not cached:
+            clear_caches()
+        start = time.perf_counter()
+        create_agent()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_function_schemas(iterations: int, cached: bool) -> List[float]:
+    # the part of agent creation that the caches cover, without the openai client setup
+    agent = create_agent()
+    timings = []
+    for _ in range(iterations):
+        if not cached:
+            clear_caches()
+        start = time.perf_counter()
+        agent.get_functions()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_turns(turns: int, cached: bool) -> List[float]:
+    agent = create_agent()
+    timings = []
+    for turn in range(1, turns + 1):
+        agent.attach_transcript(scripted_transcript(turn))
+        if not cached:
+            clear_caches()
+        start = time.perf_counter()
+        if cached:
+            agent.format_chat_messages()
+        else:
+            format_openai_chat_messages_from_transcript(
+                agent.transcript, agent.get_model_name_for_tokenizer(), agent.functions, agent.agent_config.prompt_preamble)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--turns', type=int, default=20)
+    args = parser.parse_args()
+
+    create_agent()  # warm up imports and tiktoken
+    for cached in (False, True):
+        label = 'cached' if cached else 'uncached'
+        creation = summarize(bench_agent_creation(args.iterations, cached))
+        functions = summarize(bench_function_schemas(args.iterations, cached))
+        turns = summarize(bench_turns(args.turns, cached))
+        print(
+            f'{label:>9}: agent creation p50 {format_ms(creation["p50"])} | '
+            f'function schemas p50 {format_ms(functions["p50"])} | '
+            f'per-turn prompt p50 {format_ms(turns["p50"])} p95 {format_ms(turns["p95"])}'
+        )
+
+
+if __name__ == '__main__':
+    main()
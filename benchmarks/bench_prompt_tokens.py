@@ -0,0 +1,85 @@
+"""Token report for the verbose and compact prompt modes.
+
+Counts tokens with vocode's tiktoken helpers: the static part sent on every LLM turn
+(system preamble + function definitions) and the total prompt tokens sent over a full
+scripted appointment conversation, where every LLM call re-sends the growing transcript.
+
+    python -m benchmarks.bench_prompt_tokens
+"""
+import argparse
+import asyncio
+import json
+from typing import Dict, List
+
+from benchmarks.common import setup_env
+
+setup_env()
+
+from vocode.streaming.agent.token_utils import num_tokens_from_functions, num_tokens_from_messages  # noqa: E402
+from vocode.streaming.models.agent import ChatGPTAgentConfig  # noqa: E402
+
+from health_appointment_prompt import PROMPT_MODES, build_prompt_preamble  # noqa: E402
+from submit_health_appointment_info import (  # noqa: E402
+    HealthAppointmentForm,
+    HealthAppointmentInfoContainer,
+    HealthAppointmentScheduler,
+    SubmitHealthAppointmentInfo,
+    SubmitHealthAppointmentInfoActionConfig,
+)
+
+# (what the caller says, payloads the agent submits in response)
+SCRIPTED_CONVERSATION = [
+    ('Yes, I would like to make an appointment.', [{'*see_next_step': ''}]),
+    ('My name is Jane Doe.', [{'patient_name': 'Jane Doe'}]),
+    ('Yes that is right. I was born March 3rd 1985.', [{'patient_dob': '1985-03-03'}]),
+    ('Correct. I need a checkup for my knee.', [{'reason_for_visit': 'knee checkup'}]),
+    ('My number is 650 253 0000.', [{'patient_phone_number': '650 253 0000'}]),
+    ('Yes. What appointments are there?', [{'*see_appointment_availability': ''}]),
+    ('The first one please.', [{'appointment_id': 'appt_id_155121'}]),
+    ('Yes, please text me.', [{'send_text': False}]),
+    ('That is all.', [{'*validate_all_and_submit_if_valid': ''}]),
+]
+
+
+def scripted_messages(action: SubmitHealthAppointmentInfo) -> List[List[Dict]]:
+    """Returns the transcript messages sent on each LLM call of the scripted conversation."""
+    scheduler = HealthAppointmentScheduler()
+    form = HealthAppointmentForm()
+    messages: List[Dict] = [{'role': 'assistant', 'content': 'Hello, this line schedules appointments for Dr. Tang\'s Clinic. Would you like to make an appointment?'}]
+    per_call: List[List[Dict]] = []
+    for caller_text, payloads in SCRIPTED_CONVERSATION:
+        messages.append({'role': 'user', 'content': caller_text})
+        for payload in payloads:
+            per_call.append(list(messages))
+            success, info, next_step = asyncio.run(form.validate_key_and_submit_if_valid(payload, scheduler))
+            messages.append({'role': 'assistant', 'content': None, 'function_call': {'name': action.get_function_name(), 'arguments': json.dumps({'payload': payload})}})
+            messages.append({'role': 'function', 'name': action.get_function_name(), 'content': json.dumps({'success': success, 'info': info, 'next_step': next_step})})
+        per_call.append(list(messages))
+        messages.append({'role': 'assistant', 'content': 'Thanks, that was validated. Is that correct?'})
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=ChatGPTAgentConfig.__fields__['model_name'].default)
+    args = parser.parse_args()
+
+    action = SubmitHealthAppointmentInfo(SubmitHealthAppointmentInfoActionConfig(
+        health_appointment_info_container=HealthAppointmentInfoContainer(),
+        health_appointment_scheduler=HealthAppointmentScheduler()))
+    functions = [action.get_openai_function()]
+    function_tokens = num_tokens_from_functions(functions, args.model)
+    calls = scripted_messages(action)
+
+    print(f'model {args.model}, {len(calls)} LLM calls in the scripted conversation')
+    print(f'{"mode":>8} {"preamble":>9} {"functions":>10} {"per turn":>9} {"conversation":>13}')
+    for mode in PROMPT_MODES:
+        system_message = {'role': 'system', 'content': build_prompt_preamble(mode)}
+        preamble_tokens = num_tokens_from_messages([system_message], args.model) - 3
+        per_turn = preamble_tokens + function_tokens
+        conversation = sum(per_turn + num_tokens_from_messages(messages, args.model) for messages in calls)
+        print(f'{mode:>8} {preamble_tokens:>9} {function_tokens:>10} {per_turn:>9} {conversation:>13}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Concurrent submissions through an appointment scheduler backend.
+
+Every form submits twice at once (a retried or duplicated submit), and forms_per_slot forms
+race for each slot. Checks that each form is scheduled once and each slot booked once.
+--backend redis uses the Redis from REDISHOST/REDISPORT, e.g. `docker compose up redis`.
+
+    python -m benchmarks.bench_scheduler --forms 1000 --backend memory
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from benchmarks.common import format_ms, generate_appointment_slots, setup_env, summarize
+
+setup_env()
+
+from appointment_availability import AppointmentAvailabilityStore, set_appointment_availability_store  # noqa: E402
+from appointment_scheduler import SCHEDULER_BACKENDS, InMemoryAppointmentScheduler, RedisAppointmentScheduler  # noqa: E402
+from submit_health_appointment_info import HealthAppointmentForm  # noqa: E402
+
+
+def populated_form(index: int, appointment_id: str) -> HealthAppointmentForm:
+    return HealthAppointmentForm(
+        patient_name=f'Patient Number{index}',
+        patient_dob='1990-01-{:02d}'.format(index % 28 + 1),
+        reason_for_visit=f'checkup {index}',
+        patient_phone_number='+1 650-253-{:04d}'.format(index % 10000),
+        appointment_id=appointment_id,
+        send_text=False,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--forms', type=int, default=1000)
+    parser.add_argument('--forms-per-slot', type=int, default=4)
+    parser.add_argument('--backend', choices=SCHEDULER_BACKENDS, default='memory')
+    args = parser.parse_args()
+
+    slots = generate_appointment_slots(max(1, args.forms // args.forms_per_slot))
+    set_appointment_availability_store(AppointmentAvailabilityStore(slots))
+    if args.backend == 'redis':
+        # a fresh prefix, so runs don't see each other's bookings
+        scheduler_backend = RedisAppointmentScheduler(ttl_seconds=600, key_prefix=f'bench_scheduler_{uuid.uuid4().hex[:8]}')
+    else:
+        scheduler_backend = InMemoryAppointmentScheduler()
+    forms = [populated_form(i, slots[i % len(slots)].appointment_id) for i in range(args.forms)]
+    timings = []
+
+    async def submit(form: HealthAppointmentForm) -> bool:
+        start = time.perf_counter()
+        success, _, _ = await form.submit_if_valid(scheduler_backend)
+        timings.append(time.perf_counter() - start)
+        return success
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(submit(form) for form in forms for _ in range(2)))
+    elapsed = time.perf_counter() - start
+
+    scheduled_forms = {form._form_id for form, success in zip((form for form in forms for _ in range(2)), results) if success}
+    booked_slots = {form.appointment_id for form in forms if form._form_id in scheduled_forms}
+    result = summarize(timings)
+    print(f'{args.backend}: {len(results)} submits in {elapsed:.3f}s ({len(results) / elapsed:.0f}/s), '
+          f'p50 {format_ms(result["p50"])} p99 {format_ms(result["p99"])}')
+    print(f'{sum(results)} succeeded, {len(scheduled_forms)} forms scheduled, {len(booked_slots)} of {len(slots)} slots booked')
+    assert sum(results) == len(scheduled_forms) == len(booked_slots) == len(slots), 'a form or a slot was booked twice'
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""Compares event-loop stall time while sending confirmation texts.
+
+"blocking" calls send_text_through_twilio on the event loop, the way the submit action
+used to. "queued" hands the text to sms_dispatcher and lets its workers send it.
+Both run against a local fake of the Twilio Messages endpoint.
+
+    python -m benchmarks.bench_sms_dispatch --texts 20 --twilio-latency 0.1
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import List
+
+from benchmarks.common import format_ms, setup_env, summarize
+from benchmarks.fake_twilio import FakeTwilioServer
+
+setup_env()
+
+import twilio_sms  # noqa: E402
+
+HEARTBEAT_SECONDS = 0.001
+
+
+async def heartbeat(lags: List[float], stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        lags.append(max(0.0, time.perf_counter() - start - HEARTBEAT_SECONDS))
+
+
+async def run_scenario(mode: str, texts: int):
+    lags: List[float] = []
+    caller_latencies: List[float] = []
+    stop = asyncio.Event()
+    heartbeat_task = asyncio.create_task(heartbeat(lags, stop))
+    dispatcher = twilio_sms.TwilioSmsDispatcher(min_seconds_between_texts_per_number=0)
+    await dispatcher.start()
+    for i in range(texts):
+        phone_number = '+1650253{:04d}'.format(i)
+        start = time.perf_counter()
+        if mode == 'blocking':
+            twilio_sms.send_text_through_twilio(phone_number, 'Your appointment details')
+        else:
+            dispatcher.enqueue(phone_number, 'Your appointment details')
+        caller_latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)  # other conversations keep running between submits
+    await dispatcher.stop()
+    stop.set()
+    await heartbeat_task
+    return caller_latencies, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--texts', type=int, default=20)
+    parser.add_argument('--twilio-latency', type=float, default=0.1, help='fake Messages endpoint latency in seconds')
+    args = parser.parse_args()
+
+    with FakeTwilioServer(response_delay_seconds=args.twilio_latency) as server:
+        os.environ['TWILIO_API_BASE_URL'] = server.base_url
+        for mode in ('blocking', 'queued'):
+            caller_latencies, lags = asyncio.run(run_scenario(mode, args.texts))
+            caller = summarize(caller_latencies)
+            stall = summarize(lags)
+            print(
+                f'{mode:>9}: caller p50 {format_ms(caller["p50"])} p99 {format_ms(caller["p99"])} | '
+                f'loop stall max {format_ms(stall["max"])} total {format_ms(sum(lags))}'
+            )
+        print(f'fake twilio received {len(server.messages)} texts')
+
+
+if __name__ == '__main__':
+    main()
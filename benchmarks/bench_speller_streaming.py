@@ -0,0 +1,58 @@
+"""Time to the first audio of a SpellerAgent answer, spelled in one message or streamed in chunks.
+
+Calls go through the stub app and the fake Twilio websocket (see benchmarks.stub_services).
+The stub synthesizer is set up like a TTS service that synthesizes the whole text before
+returning audio (--synthesis-ms-per-character), which is when streaming the spelling pays off.
+Turn latency runs from the end of the caller's speech to the first frame of the answer.
+
+    python -m benchmarks.bench_speller_streaming --calls 5 --letters-per-chunk 2 4 8
+"""
+import argparse
+import asyncio
+from typing import List, Optional
+
+from benchmarks.common import format_ms, setup_env, summarize
+
+setup_env()
+
+import uvicorn  # noqa: E402
+
+from benchmarks.stub_services import StubSynthesizerFactory, create_stub_app, speller_inbound_call_configs  # noqa: E402
+from benchmarks.twilio_call_simulator import simulate_call  # noqa: E402
+
+
+async def run(calls: int, port: int, letters_per_chunk: Optional[int], synthesis_seconds_per_character: float, turns: int) -> List[float]:
+    app = create_stub_app(
+        inbound_call_configs=speller_inbound_call_configs(streaming=letters_per_chunk is not None, letters_per_chunk=letters_per_chunk or 4),
+        synthesizer_factory=StubSynthesizerFactory(synthesis_seconds_per_character=synthesis_seconds_per_character),
+    )
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', lifespan='on'))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        results = await asyncio.gather(*(simulate_call(f'127.0.0.1:{port}', turns) for _ in range(calls)))
+    finally:
+        server.should_exit = True
+        await server_task
+    return [latency for result in results if result.ok for latency in result.turn_latencies]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=5)
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--port', type=int, default=3400)
+    parser.add_argument('--letters-per-chunk', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--synthesis-ms-per-character', type=float, default=10.0)
+    args = parser.parse_args()
+
+    for letters_per_chunk in [None, *args.letters_per_chunk]:
+        latencies = asyncio.run(run(args.calls, args.port, letters_per_chunk, args.synthesis_ms_per_character / 1000, args.turns))
+        result = summarize(latencies)
+        name = 'one message' if letters_per_chunk is None else f'{letters_per_chunk} per chunk'
+        print(f'{name:<14} n={result["count"]:<4} turn latency p50 {format_ms(result["p50"]):>10} p95 {format_ms(result["p95"]):>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Cold start: what importing main.py costs, per top-level package, and the time from
+starting a uvicorn process to it accepting its first call.
+
+The import profile comes from `python -X importtime -c "import main"` in a fresh process,
+so nothing is cached in sys.modules. "Time to first call" starts a node as load_harness does
+(benchmarks.stub_services:create_stub_app) and POSTs /inbound_call until one is answered.
+
+    python -m benchmarks.bench_startup --runs 3 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.common import BENCHMARK_ENV, format_ms, summarize
+
+
+def benchmark_env() -> Dict[str, str]:
+    return {**BENCHMARK_ENV, **os.environ, 'BASE_URL': 'stub.invalid'}
+
+
+def profile_import(module: str) -> Tuple[float, Dict[str, float]]:
+    """Total import time of module, and the self time of every package it pulled in, in seconds."""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        env=benchmark_env(), capture_output=True, text=True, check=True,
+    )
+    self_seconds: Dict[str, float] = defaultdict(float)
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        self_seconds[name.strip().split('.')[0]] += int(self_us) / 1e6
+        if name.strip() == module:
+            total = int(cumulative_us) / 1e6
+    return total, dict(self_seconds)
+
+
+def time_to_first_call(port: int, timeout: float = 60) -> float:
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'benchmarks.stub_services:create_stub_app', '--factory',
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        env=benchmark_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f'http://127.0.0.1:{port}') as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    response = client.post('/inbound_call', data={'CallSid': 'CAstartup', 'From': '+15555550101', 'To': '+15555550100'})
+                    if response.status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.02)
+        raise RuntimeError(f'no call was accepted within {timeout}s')
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15, help='packages to list in the import profile')
+    parser.add_argument('--port', type=int, default=3300)
+    args = parser.parse_args()
+
+    totals: List[float] = []
+    self_seconds: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(args.runs):
+        total, by_package = profile_import('main')
+        totals.append(total)
+        for package, seconds in by_package.items():
+            self_seconds[package].append(seconds)
+    print(f'import main: p50 {format_ms(summarize(totals)["p50"])} over {args.runs} runs')
+    for package, seconds in sorted(self_seconds.items(), key=lambda item: -summarize(item[1])['p50'])[:args.top]:
+        print(f'  {package:<28} {format_ms(summarize(seconds)["p50"]):>10}')
+
+    first_call = summarize([time_to_first_call(args.port) for _ in range(args.runs)])
+    print(f'time to first accepted call: p50 {format_ms(first_call["p50"])} max {format_ms(first_call["max"])}')
+
+
+if __name__ == '__main__':
+    main()
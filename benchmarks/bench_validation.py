@@ -0,0 +1,70 @@
+"""Repeated '*validate_all_and_submit_if_valid' validation passes on a fully populated form.
+
+"full" drops the per-field validation cache before every attempt, which is what every
+submit used to cost. "incremental" only re-checks fields changed since they were last
+validated, and "one change" edits a single field between attempts. Only the validation
+is timed, the submission itself goes to the scheduler backend.
+
+    python -m benchmarks.bench_validation --attempts 2000
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from benchmarks.common import format_ms, setup_env, summarize
+
+setup_env()
+
+from submit_health_appointment_info import HealthAppointmentForm, HealthAppointmentScheduler  # noqa: E402
+
+POPULATED_FORM = [
+    {'patient_name': 'Jane Doe'},
+    {'patient_dob': '1985-03-03'},
+    {'insurance_info_payer_name': 'Aetna'},
+    {'insurance_info_payer_id': '60054'},
+    {'referral_to_physician': 'Dr. Nickel Baker'},
+    {'reason_for_visit': 'knee checkup'},
+    {'patient_address': '1 Main St'},
+    {'patient_phone_number': '650 253 0000'},
+    {'appointment_id': 'appt_id_155121'},
+    {'send_text': False},
+]
+
+
+def populated_form() -> HealthAppointmentForm:
+    form = HealthAppointmentForm()
+    scheduler = HealthAppointmentScheduler()
+    for payload in POPULATED_FORM:
+        success, info, _ = asyncio.run(form.validate_key_and_submit_if_valid(payload, scheduler))
+        assert success, info
+    return form
+
+
+def bench(mode: str, attempts: int) -> List[float]:
+    form = populated_form()
+    timings = []
+    for attempt in range(attempts):
+        if mode == 'full':
+            form.invalidate_validation_cache()
+        elif mode == 'one change':
+            form.reason_for_visit = f'knee checkup {attempt}'
+        start = time.perf_counter()
+        errors = form.validation_errors()
+        timings.append(time.perf_counter() - start)
+        assert not errors, errors
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attempts', type=int, default=2000)
+    args = parser.parse_args()
+
+    for mode in ('full', 'incremental', 'one change'):
+        result = summarize(bench(mode, args.attempts))
+        print(f'{mode:>12}: p50 {format_ms(result["p50"])} p95 {format_ms(result["p95"])} p99 {format_ms(result["p99"])}')
+
+
+if __name__ == '__main__':
+    main()
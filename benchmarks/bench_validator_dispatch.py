@@ -0,0 +1,101 @@
+"""Compares per-field validation dispatch: the compiled validator table against the
+if-chain validate_key_and_submit_if_valid used before the registry (copied below).
+
+The compiled table type checks the fields it validates, so the comparison shows what that
+costs on top of a single dict lookup.
+
+    python -m benchmarks.bench_validator_dispatch --iterations 20000
+"""
+import argparse
+import time
+from datetime import datetime
+
+import phonenumbers
+
+from benchmarks.common import setup_env
+
+setup_env()
+
+from health_appointment_validators import years_since  # noqa: E402
+from submit_health_appointment_info import _FIELD_VALIDATORS, HealthAppointmentInfoContainer  # noqa: E402
+
+INPUT_SCHEMA_PROPERTIES = HealthAppointmentInfoContainer.input_schema['properties']
+
+PAYLOADS = [
+    ('patient_name', 'Jane Doe'),
+    ('patient_dob', '1985-03-03'),
+    ('insurance_info_payer_name', 'Aetna'),
+    ('insurance_info_payer_id', '60054'),
+    ('referral_to_physician', 'Dr. Nickel Baker'),
+    ('reason_for_visit', 'knee checkup'),
+    ('patient_address', '1 Main St'),
+    ('patient_phone_number', '650 253 0000'),
+    ('appointment_id', 'appt_id_155121'),
+    ('send_text', True),
+]
+
+
+def legacy_validate(key, value):
+    next_step = 'repeat back to the caller the value inputted, and confirm that\'s correct. To save and submit, use *validate_all_and_submit_if_valid'
+    if key == 'patient_name':
+        if ' ' not in value:
+            return (False, 'patient should give first and last name', next_step)
+        return (True, key + ' is valid', next_step + ' note: Spell back the name inputted.')
+    if key == 'patient_dob':
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            return (False, 'error parsing date', next_step)
+        try:
+            age = years_since(value)
+            if age < -1 or age > 150:
+                return (False, 'calculated age was {} which is invalid'.format(age), next_step)
+        except ValueError:
+            return (False, 'error calculating years of age. ', next_step)
+        return (True, key + ' is valid', next_step)
+    if key == 'patient_phone_number':
+        try:
+            parsed_number = phonenumbers.parse(value, "US")
+        except phonenumbers.phonenumberutil.NumberParseException:
+            return (False, 'could not parse provided number: {}'.format(value), next_step + ' please retry.')
+        if not phonenumbers.is_valid_number(parsed_number):
+            return (False, 'number provided is not valid: {}'.format(value), next_step + ' please retry.')
+        formatted_number = phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
+        return (True, 'The parsed number that will be used is {}'.format(formatted_number), next_step)
+    if key in INPUT_SCHEMA_PROPERTIES:
+        return (True, key + ' is valid', next_step)
+    return (False, key + ' not found', next_step)
+
+
+def compiled_validate(key, value):
+    next_step = 'repeat back to the caller the value inputted, and confirm that\'s correct. To save and submit, use *validate_all_and_submit_if_valid'
+    field_validator = _FIELD_VALIDATORS.get(key)
+    if field_validator is None:
+        return (False, key + ' not found', next_step)
+    result = field_validator(key, value)
+    return (result.success, result.info, next_step + result.next_step)
+
+
+def bench(validate, payloads, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for key, value in payloads:
+            validate(key, value)
+    return (time.perf_counter() - start) / (iterations * len(payloads))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    # the phone number parse dominates both, so also report the dispatch cost without it
+    without_phone = [payload for payload in PAYLOADS if payload[0] != 'patient_phone_number']
+    for label, payloads in (('all fields', PAYLOADS), ('without phone', without_phone)):
+        legacy = bench(legacy_validate, payloads, args.iterations)
+        compiled = bench(compiled_validate, payloads, args.iterations)
+        print(f'{label:>14}: if-chain {legacy * 1e6:.2f}us/field, compiled table {compiled * 1e6:.2f}us/field')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Helpers shared by the benchmark scripts.
+
+Benchmarks are run from the repository root, e.g.:
+    python -m benchmarks.bench_concurrent_forms
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence
+
+# twilio_sms and the vocode clients read these, give the benchmarks harmless values
+BENCHMARK_ENV = {
+    'TWILIO_ACCOUNT_SID': 'ACbenchmark',
+    'TWILIO_AUTH_TOKEN': 'benchmark',
+    'TWILIO_ADDRESS': '+15555550100',
+    'OPENAI_API_KEY': 'sk-benchmark',
+    # the simulated callers of the in process benchmarks run on the app's event loop, their lag isn't the app's
+    'MAX_EVENT_LOOP_LAG_MS': '0',
+}
+
+
+def setup_env():
+    for key, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(key, value)
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    return {
+        'count': len(values),
+        'mean': statistics.fmean(values) if values else 0.0,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else 0.0,
+    }
+
+
+def format_ms(seconds: float) -> str:
+    return f'{seconds * 1000:.3f}ms'
+
+
+@contextmanager
+def timer(results: List[float]):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        results.append(time.perf_counter() - start)
+
+
+def generate_appointment_slots(count: int, physicians: int = 100):
+    """count slots spread over physicians, one slot per physician per half hour."""
+    from datetime import datetime, timedelta
+
+    from appointment_availability import AppointmentSlot
+
+    first_start = datetime(2024, 7, 1, 9)
+    slots = []
+    for i in range(count):
+        physician = i % physicians
+        start = first_start + timedelta(minutes=30 * (i // physicians))
+        slots.append(AppointmentSlot(
+            appointment_number=str(i + 1),
+            appointment_id=f'appt_id_{i:06d}',
+            appointment_physician_id=f'phys_id_{physician:04d}',
+            appointment_physician_name=f'Dr. Number{physician}',
+            appointment_time=start.strftime('%-I:%M %p %A %B %-d'),
+            appointment_start=start,
+            appointment_address='123 St Clinic, 123 123 St',
+        ))
+    return slots
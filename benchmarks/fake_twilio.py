@@ -0,0 +1,94 @@
+"""A local fake of the Twilio REST API (sending texts and creating calls), good enough for the benchmarks.
+
+Runs a threaded HTTP server in the background and records every request it receives.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs
+
+_MESSAGES_PATH = re.compile(r'^/2010-04-01/Accounts/(?P<account_sid>[^/]+)/Messages\.json$')
+_CALLS_PATH = re.compile(r'^/2010-04-01/Accounts/(?P<account_sid>[^/]+)/Calls\.json$')
+# what Twilio accepts as a To number, anything else is a 400
+_E164 = re.compile(r'^\+[1-9]\d{7,14}$')
+
+
+class FakeTwilioServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 refuses connections when a campaign dials many calls at once
+    request_queue_size = 128
+
+    def __init__(self, response_delay_seconds: float = 0.1, fail_first_n: int = 0):
+        super().__init__(('127.0.0.1', 0), _FakeTwilioHandler)
+        self.response_delay_seconds = response_delay_seconds
+        self.fail_first_n = fail_first_n
+        self.messages: List[Dict[str, str]] = []
+        self.calls: List[Dict[str, str]] = []
+        self.request_count = 0
+        self.connection_count = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connection_count += 1
+        super().process_request(request, client_address)
+
+    def next_status(self) -> int:
+        with self._lock:
+            self.request_count += 1
+            return 503 if self.request_count <= self.fail_first_n else 201
+
+
+class _FakeTwilioHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are separate writes, without this a kept-alive connection waits ~40ms on a delayed ACK
+    disable_nagle_algorithm = True
+    server: FakeTwilioServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        time.sleep(self.server.response_delay_seconds)
+        if _MESSAGES_PATH.match(self.path):
+            records, sid_prefix = self.server.messages, 'SM'
+        elif _CALLS_PATH.match(self.path):
+            records, sid_prefix = self.server.calls, 'CA'
+        else:
+            return self._respond(404, {'message': f'unknown path {self.path}'})
+        form = {key: values[0] for key, values in parse_qs(body).items()}
+        if not _E164.match(form.get('To', '')):
+            return self._respond(400, {'message': f"invalid To number {form.get('To')!r}"})
+        status = self.server.next_status()
+        if status >= 400:
+            return self._respond(status, {'message': 'service unavailable'})
+        with self.server._lock:
+            records.append(form)
+        self._respond(status, {'sid': f'{sid_prefix}{uuid.uuid4().hex}', 'to': form.get('To'), 'status': 'queued'})
+
+    def _respond(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,97 @@
+"""Drives simulated Twilio calls against 1..N app nodes to show how calls scale per node.
+
+Each node is a uvicorn process running benchmarks.stub_services:create_stub_app (stub speech
+services and the SpellerAgent, so nothing leaves the machine). Each call is a fake Twilio
+media stream (see benchmarks.twilio_call_simulator) with a few caller turns, and calls are
+spread round robin over the nodes.
+
+    python -m benchmarks.load_harness --nodes 1 2 4 --calls-per-node 50 --turns 3
+
+--workers-per-node > 1 shares call configs through Redis (REDISHOST/REDISPORT), as in production.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import format_ms, summarize
+from benchmarks.twilio_call_simulator import simulate_call
+
+
+def start_nodes(nodes: int, workers_per_node: int, first_port: int) -> List[subprocess.Popen]:
+    env = {**os.environ, 'BASE_URL': 'stub.invalid', 'WEB_CONCURRENCY': str(workers_per_node)}
+    if workers_per_node > 1:
+        env['STUB_APP_CONFIG_MANAGER'] = 'redis'
+    return [
+        subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'benchmarks.stub_services:create_stub_app', '--factory',
+             '--host', '127.0.0.1', '--port', str(first_port + node), '--workers', str(workers_per_node), '--log-level', 'warning'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        for node in range(nodes)
+    ]
+
+
+async def wait_until_listening(addresses: List[str], timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        for address in addresses:
+            while True:
+                try:
+                    await client.get(f'http://{address}/events')
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f'{address} did not start')
+                    await asyncio.sleep(0.2)
+
+
+async def run(nodes: int, calls_per_node: int, turns: int, workers_per_node: int, first_port: int) -> Dict[str, float]:
+    processes = start_nodes(nodes, workers_per_node, first_port)
+    addresses = [f'127.0.0.1:{first_port + node}' for node in range(nodes)]
+    try:
+        await wait_until_listening(addresses)
+        calls = nodes * calls_per_node
+        start = time.perf_counter()
+        results = await asyncio.gather(*(simulate_call(addresses[i % nodes], turns) for i in range(calls)))
+        elapsed = time.perf_counter() - start
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+    completed = [result for result in results if result.ok]
+    turn_latency = summarize([latency for result in completed for latency in result.turn_latencies])
+    return {
+        'calls': calls,
+        'completed': len(completed),
+        'elapsed': elapsed,
+        'turn_latency_p50': turn_latency['p50'],
+        'turn_latency_p95': turn_latency['p95'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--calls-per-node', type=int, default=50)
+    parser.add_argument('--turns', type=int, default=3, help='caller turns per call')
+    parser.add_argument('--workers-per-node', type=int, default=1)
+    parser.add_argument('--first-port', type=int, default=3100)
+    args = parser.parse_args()
+
+    print(f'{"nodes":>6} {"calls":>6} {"completed":>10} {"calls/s":>8} {"per node":>9} {"turn p50":>11} {"turn p95":>11}')
+    for nodes in args.nodes:
+        result = asyncio.run(run(nodes, args.calls_per_node, args.turns, args.workers_per_node, args.first_port))
+        calls_per_second = result['completed'] / result['elapsed']
+        print(f'{nodes:>6} {result["calls"]:>6} {result["completed"]:>10} {calls_per_second:>8.1f} {calls_per_second / nodes:>9.1f} '
+              f'{format_ms(result["turn_latency_p50"]):>11} {format_ms(result["turn_latency_p95"]):>11}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""Offline stand-ins for the speech services and the LLM, so the app can take calls without
+Deepgram, Azure or OpenAI.
+
+- StubTranscriber: a final transcription each time the caller stops talking (any byte that
+  isn't mulaw silence is speech, and endpoint_seconds of silence ends the utterance).
+- StubSynthesizer: silence as long as the text would take to say. Its first chunk can be
+  delayed by a fixed time plus a time per character, like a TTS service that synthesizes
+  the whole text before returning any audio.
+- StubOpenAIClient: stands in for the agent's AsyncOpenAI client and streams a scripted
+  appointment conversation, one turn of function calls per caller utterance.
+
+create_stub_app() is main.create_app() with these and an in-memory config manager (or Redis
+with STUB_APP_CONFIG_MANAGER=redis, needed for more than one worker). STUB_APP_AGENT picks
+the SpellerAgent ('speller', the default) or the appointment agent with the stub LLM ('llm'):
+
+    uvicorn benchmarks.stub_services:create_stub_app --factory --port 3001
+"""
+import asyncio
+import itertools
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Type
+
+from benchmarks.common import setup_env
+
+setup_env()
+
+from openai.types.chat import ChatCompletionChunk  # noqa: E402
+from openai.types.chat.chat_completion_chunk import Choice, ChoiceDelta, ChoiceDeltaFunctionCall  # noqa: E402
+
+from vocode.streaming.action.base_action import BaseAction  # noqa: E402
+from vocode.streaming.agent.base_agent import BaseAgent  # noqa: E402
+from vocode.streaming.agent.chat_gpt_agent import ChatGPTAgent  # noqa: E402
+from vocode.streaming.models.agent import AgentConfig  # noqa: E402
+from vocode.streaming.models.audio import AudioEncoding  # noqa: E402
+from vocode.streaming.models.message import BaseMessage  # noqa: E402
+from vocode.streaming.models.synthesizer import SynthesizerConfig  # noqa: E402
+from vocode.streaming.models.telephony import TwilioConfig  # noqa: E402
+from vocode.streaming.models.transcriber import TranscriberConfig, Transcription  # noqa: E402
+from vocode.streaming.synthesizer.abstract_factory import AbstractSynthesizerFactory  # noqa: E402
+from vocode.streaming.synthesizer.base_synthesizer import BaseSynthesizer, SynthesisResult  # noqa: E402
+from vocode.streaming.telephony.config_manager.in_memory_config_manager import InMemoryConfigManager  # noqa: E402
+from vocode.streaming.telephony.server.base import TwilioInboundCallConfig  # noqa: E402
+from vocode.streaming.transcriber.abstract_factory import AbstractTranscriberFactory  # noqa: E402
+from vocode.streaming.transcriber.base_transcriber import BaseAsyncTranscriber  # noqa: E402
+
+from speller_agent import SpellerAgentFactory  # noqa: E402
+from submit_health_appointment_info import SubmitHealthAppointmentInfoActionConfig  # noqa: E402
+
+MULAW_SILENCE_BYTE = b'\xff'
+
+
+class StubTranscriber(BaseAsyncTranscriber[TranscriberConfig]):
+    def __init__(self, transcriber_config: TranscriberConfig, endpoint_seconds: float = 0.1):
+        super().__init__(transcriber_config)
+        bytes_per_sample = 2 if transcriber_config.audio_encoding == AudioEncoding.LINEAR16 else 1
+        self.silence_byte = b'\x00' if bytes_per_sample == 2 else MULAW_SILENCE_BYTE
+        self.endpoint_bytes = int(endpoint_seconds * transcriber_config.sampling_rate * bytes_per_sample)
+        self.utterance_count = 0
+
+    async def _run_loop(self):
+        in_speech = False
+        silent_bytes = 0
+        while True:
+            chunk = await self.input_queue.get()
+            if chunk.strip(self.silence_byte):
+                in_speech = True
+                silent_bytes = 0
+            elif in_speech:
+                silent_bytes += len(chunk)
+                if silent_bytes >= self.endpoint_bytes:
+                    in_speech = False
+                    self.utterance_count += 1
+                    self.produce_nonblocking(Transcription(message=f'caller utterance {self.utterance_count}', confidence=1.0, is_final=True))
+
+
+class StubTranscriberFactory(AbstractTranscriberFactory):
+    def __init__(self, endpoint_seconds: float = 0.1):
+        self.endpoint_seconds = endpoint_seconds
+
+    def create_transcriber(self, transcriber_config: TranscriberConfig):
+        return StubTranscriber(transcriber_config, self.endpoint_seconds)
+
+
+class StubSynthesizer(BaseSynthesizer[SynthesizerConfig]):
+    def __init__(self, synthesizer_config: SynthesizerConfig, seconds_per_character: float = 0.05, first_chunk_delay_seconds: float = 0.0, synthesis_seconds_per_character: float = 0.0):
+        super().__init__(synthesizer_config)
+        self.seconds_per_character = seconds_per_character
+        self.first_chunk_delay_seconds = first_chunk_delay_seconds
+        self.synthesis_seconds_per_character = synthesis_seconds_per_character
+
+    @classmethod
+    def get_voice_identifier(cls, synthesizer_config: SynthesizerConfig) -> str:
+        return 'stub'
+
+    async def get_cached_audio(self, message: BaseMessage):
+        return None
+
+    async def create_speech_uncached(self, message: BaseMessage, chunk_size: int, is_first_text_chunk: bool = False, is_sole_text_chunk: bool = False) -> SynthesisResult:
+        bytes_per_sample = 2 if self.synthesizer_config.audio_encoding == AudioEncoding.LINEAR16 else 1
+        silence_byte = b'\x00' if bytes_per_sample == 2 else MULAW_SILENCE_BYTE
+        total_bytes = int(len(message.text) * self.seconds_per_character * self.synthesizer_config.sampling_rate) * bytes_per_sample
+
+        first_chunk_delay_seconds = self.first_chunk_delay_seconds + len(message.text) * self.synthesis_seconds_per_character
+
+        async def chunk_generator():
+            if first_chunk_delay_seconds:
+                await asyncio.sleep(first_chunk_delay_seconds)
+            for offset in range(0, total_bytes, chunk_size):
+                yield SynthesisResult.ChunkResult(silence_byte * min(chunk_size, total_bytes - offset), offset + chunk_size >= total_bytes)
+
+        return SynthesisResult(chunk_generator(), lambda seconds: message.text)
+
+
+class StubSynthesizerFactory(AbstractSynthesizerFactory):
+    def __init__(self, seconds_per_character: float = 0.05, first_chunk_delay_seconds: float = 0.0, synthesis_seconds_per_character: float = 0.0):
+        self.seconds_per_character = seconds_per_character
+        self.first_chunk_delay_seconds = first_chunk_delay_seconds
+        self.synthesis_seconds_per_character = synthesis_seconds_per_character
+
+    def create_synthesizer(self, synthesizer_config: SynthesizerConfig):
+        return StubSynthesizer(synthesizer_config, self.seconds_per_character, self.first_chunk_delay_seconds, self.synthesis_seconds_per_character)
+
+
+def scripted_appointment_turns(index: int, batched: bool = False) -> List[List[Dict[str, Any]]]:
+    """The payloads the stub LLM submits after each caller utterance, booking slot appt_id_{index:06d}.
+
+    The caller gives their details in one go, and the agent then looks up the availability.
+    By default that's one function call per field, as the prompt used to ask for; batched sends
+    everything said in an utterance in one payload. The availability lookup stays its own call,
+    which StubOpenAIClient skips when the form already returned the slots.
+    """
+    turns = [
+        [{'*see_next_step': ''}],
+        [
+            {'patient_name': f'Patient Number{index}'},
+            {'patient_dob': '1990-01-{:02d}'.format(index % 28 + 1)},
+            {'reason_for_visit': f'checkup {index}'},
+            {'patient_phone_number': '+1 650-253-{:04d}'.format(index % 10000)},
+            {'*see_appointment_availability': ''},
+        ],
+        [{'appointment_id': f'appt_id_{index:06d}'}],
+        [{'send_text': False}, {'*validate_all_and_submit_if_valid': ''}],
+    ]
+    if batched:
+        turns = [
+            [{key: value for payload in turn for key, value in payload.items() if key != '*see_appointment_availability'}]
+            + [payload for payload in turn if '*see_appointment_availability' in payload]
+            for turn in turns
+        ]
+    return turns
+
+
+class StubOpenAIClient:
+    """Streams scripted chat completions in place of AsyncOpenAI.
+
+    After the caller's nth utterance it calls function_name once per payload in turns[n], then
+    answers with reply_text. Like a real LLM it only looks at the messages it's sent, so it
+    follows the conversation vocode actually built, and it doesn't look up the availability
+    again when a function result this turn already listed it.
+    """
+
+    api_key = 'stub'
+
+    def __init__(self, turns: List[List[Dict[str, Any]]], function_name: str, reply_text: str = 'Thanks, I saved that. Is that correct?', first_token_seconds: float = 0.0, seconds_per_token: float = 0.0):
+        self.turns = turns
+        self.function_name = function_name
+        self.reply_text = reply_text
+        self.first_token_seconds = first_token_seconds
+        self.seconds_per_token = seconds_per_token
+        self.request_count = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, messages: List[Dict[str, Any]], functions: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        self.request_count += 1
+        user_turns = [i for i, message in enumerate(messages) if message['role'] == 'user']
+        payloads: List[Dict[str, Any]] = []
+        if user_turns and len(user_turns) <= len(self.turns) and any(function['name'] == self.function_name for function in functions or []):
+            messages_this_turn = messages[user_turns[-1]:]
+            calls_this_turn = sum(1 for message in messages_this_turn if message.get('function_call'))
+            turn = self.turns[len(user_turns) - 1]
+            if any(message['role'] == 'function' and 'available appointments:' in (message.get('content') or '') for message in messages_this_turn):
+                turn = [payload for payload in turn if '*see_appointment_availability' not in payload]
+            payloads = turn[calls_this_turn:calls_this_turn + 1]
+        if payloads:
+            deltas = [ChoiceDelta(function_call=ChoiceDeltaFunctionCall(name=self.function_name, arguments=json.dumps({'payload': payloads[0]})))]
+            finish_reason = 'function_call'
+        else:
+            deltas = [ChoiceDelta(content=token) for token in self.reply_text.split(' ')]
+            deltas = [deltas[0]] + [ChoiceDelta(content=' ' + delta.content) for delta in deltas[1:]]
+            finish_reason = 'stop'
+        return self._stream(deltas, finish_reason)
+
+    async def _stream(self, deltas: List[ChoiceDelta], finish_reason: str):
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        if self.first_token_seconds:
+            await asyncio.sleep(self.first_token_seconds)
+        for delta in deltas + [ChoiceDelta()]:
+            is_last = delta.content is None and delta.function_call is None
+            yield ChatCompletionChunk(
+                id=completion_id, created=int(time.time()), model='stub', object='chat.completion.chunk',
+                choices=[Choice(index=0, delta=delta, finish_reason=finish_reason if is_last else None)],
+            )
+            if self.seconds_per_token:
+                await asyncio.sleep(self.seconds_per_token)
+
+
+class StubLLMAgentFactory(SpellerAgentFactory):
+    """SpellerAgentFactory, with every ChatGPTAgent talking to a StubOpenAIClient.
+
+    Each agent gets the next call number, so concurrent calls book different slots.
+    action_classes replaces action implementations, e.g. with instrumented subclasses.
+    The stub clients are kept in openai_clients, e.g. to count LLM requests.
+    """
+
+    def __init__(self, first_token_seconds: float = 0.0, seconds_per_token: float = 0.0, action_classes: Optional[Dict[str, Type[BaseAction]]] = None, batched: bool = False):
+        super().__init__()
+        self.first_token_seconds = first_token_seconds
+        self.seconds_per_token = seconds_per_token
+        self.action_classes = action_classes or {}
+        self.batched = batched
+        self.call_numbers = itertools.count()
+        self.openai_clients: List[StubOpenAIClient] = []
+
+    def create_agent(self, agent_config: AgentConfig) -> BaseAgent:
+        agent = super().create_agent(agent_config)
+        if isinstance(agent, ChatGPTAgent):
+            agent.openai_client = StubOpenAIClient(
+                scripted_appointment_turns(next(self.call_numbers), self.batched),
+                SubmitHealthAppointmentInfoActionConfig.type_string(),
+                first_token_seconds=self.first_token_seconds,
+                seconds_per_token=self.seconds_per_token,
+            )
+            self.openai_clients.append(agent.openai_client)
+            if hasattr(agent.action_factory, 'actions'):
+                agent.action_factory.actions.update(self.action_classes)
+        return agent
+
+
+def speller_inbound_call_configs(streaming: bool = False, letters_per_chunk: int = 4) -> List[TwilioInboundCallConfig]:
+    """The SpellerAgent's call config, streaming its spelling in chunks when streaming is set."""
+    from speller_agent import SpellerAgentConfig
+
+    return [
+        TwilioInboundCallConfig(
+            url='/inbound_call',
+            agent_config=SpellerAgentConfig(
+                initial_message=BaseMessage(text='Hello, this line schedules appointments.'),
+                generate_responses=streaming,
+                letters_per_chunk=letters_per_chunk,
+            ),
+            twilio_config=TwilioConfig(account_sid=os.environ['TWILIO_ACCOUNT_SID'], auth_token=os.environ['TWILIO_AUTH_TOKEN']),
+        )
+    ]
+
+
+def create_stub_app(
+    agent_factory: Optional[SpellerAgentFactory] = None,
+    inbound_call_configs: Optional[List[TwilioInboundCallConfig]] = None,
+    synthesizer_factory: Optional[StubSynthesizerFactory] = None,
+    phrase_audio_cache: Optional[Any] = None,
+    admission_controller: Optional[Any] = None,
+):
+    os.environ.setdefault('BASE_URL', 'stub.invalid')
+    os.environ.setdefault('APPOINTMENT_SCHEDULER_BACKEND', 'memory')
+    from main import build_inbound_call_configs, create_app
+
+    if os.getenv('STUB_APP_CONFIG_MANAGER') == 'redis':
+        from template_config_manager import TemplateConfigManager
+        config_manager = TemplateConfigManager()
+    else:
+        config_manager = InMemoryConfigManager()
+    if os.getenv('STUB_APP_AGENT', 'speller') == 'llm':
+        # the production call config, only the services behind it are stubbed
+        inbound_call_configs = inbound_call_configs or build_inbound_call_configs()
+        agent_factory = agent_factory or StubLLMAgentFactory()
+    else:
+        inbound_call_configs = inbound_call_configs or speller_inbound_call_configs()
+    return create_app(
+        config_manager=config_manager,
+        inbound_call_configs=inbound_call_configs,
+        agent_factory=agent_factory,
+        transcriber_factory=StubTranscriberFactory(),
+        synthesizer_factory=synthesizer_factory or StubSynthesizerFactory(),
+        phrase_audio_cache=phrase_audio_cache,
+        admission_controller=admission_controller,
+    )
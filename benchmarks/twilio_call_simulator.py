@@ -0,0 +1,136 @@
+"""A fake Twilio on the other end of the app's media websocket.
+
+simulate_call() does what Twilio does for an inbound call: POST /inbound_call, open the
+websocket from the returned TwiML, send 'start', stream 20ms mulaw frames in real time and
+acknowledge the bot's marks as if its audio had played. The caller waits for the greeting,
+then for each turn talks for speech_seconds (non-silent frames, which the stub transcriber
+treats as speech) and waits for the bot to answer and go quiet.
+
+Turn latency is measured from the end of the caller's speech to the first frame of the
+bot's answer, so it includes the stub transcriber's endpointing silence.
+"""
+import asyncio
+import base64
+import json
+import re
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+import websockets
+
+FRAME_SECONDS = 0.02
+SILENCE_FRAME = base64.b64encode(b'\xff' * 160).decode()
+SPEECH_FRAME = base64.b64encode(b'\x00' * 160).decode()
+CONNECT_CALL_PATTERN = re.compile(r'/connect_call/([^"/]+)"')
+
+
+class CallResult:
+    def __init__(self):
+        self.conversation_id: Optional[str] = None
+        self.ok = False
+        # the app answered with overflow TwiML instead of taking the call
+        self.overflowed = False
+        self.first_audio_seconds: Optional[float] = None
+        # from the call being answered to the caller hanging up
+        self.call_seconds = 0.0
+        self.turn_latencies: List[float] = []
+        self.timed_out_turns = 0
+        self.media_messages = 0
+        self.marks = 0
+
+
+async def simulate_call(
+    address: str,
+    turns: int = 3,
+    speech_seconds: float = 0.5,
+    settle_seconds: float = 0.3,
+    turn_timeout_seconds: float = 10.0,
+) -> CallResult:
+    result = CallResult()
+    call_sid = f'CA{uuid.uuid4().hex}'
+    stream_sid = f'MZ{uuid.uuid4().hex}'
+    start = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(base_url=f'http://{address}', timeout=30) as client:
+            response = await client.post('/inbound_call', data={'CallSid': call_sid, 'From': '+15555550101', 'To': '+15555550100'})
+            response.raise_for_status()
+        connect_call = CONNECT_CALL_PATTERN.search(response.text)
+        if connect_call is None:
+            result.overflowed = True
+            return result
+        result.conversation_id = connect_call.group(1)
+        async with websockets.connect(f'ws://{address}/connect_call/{result.conversation_id}', max_size=None) as websocket:
+            await websocket.send(json.dumps({'event': 'connected', 'protocol': 'Call', 'version': '1.0.0'}))
+            await websocket.send(json.dumps({'event': 'start', 'streamSid': stream_sid, 'start': {'streamSid': stream_sid, 'callSid': call_sid}}))
+            speaking = False
+            last_media_time = 0.0
+            media_arrived = asyncio.Event()
+
+            async def receive():
+                nonlocal last_media_time
+                async for message in websocket:
+                    data = json.loads(message)
+                    if data['event'] == 'media':
+                        result.media_messages += 1
+                        last_media_time = time.perf_counter()
+                        if result.first_audio_seconds is None:
+                            result.first_audio_seconds = last_media_time - start
+                        media_arrived.set()
+                    elif data['event'] == 'mark':
+                        # twilio echoes marks once the audio before them has played
+                        result.marks += 1
+                        await websocket.send(json.dumps({'event': 'mark', 'streamSid': stream_sid, 'mark': data['mark']}))
+
+            async def send_audio():
+                next_frame = time.perf_counter()
+                while True:
+                    payload = SPEECH_FRAME if speaking else SILENCE_FRAME
+                    await websocket.send(json.dumps({'event': 'media', 'streamSid': stream_sid, 'media': {'payload': payload}}))
+                    next_frame += FRAME_SECONDS
+                    await asyncio.sleep(max(0.0, next_frame - time.perf_counter()))
+
+            async def wait_for_bot(since: float) -> Optional[float]:
+                """Waits for the bot to start answering and then go quiet. Returns when it started."""
+                while last_media_time < since:
+                    media_arrived.clear()
+                    arrived = asyncio.ensure_future(media_arrived.wait())
+                    await asyncio.wait([arrived, receiver], timeout=turn_timeout_seconds, return_when=asyncio.FIRST_COMPLETED)
+                    arrived.cancel()
+                    if last_media_time < since:
+                        if receiver.done():
+                            raise ConnectionError('the app hung up')
+                        raise asyncio.TimeoutError
+                answered_at = last_media_time
+                while time.perf_counter() - last_media_time < settle_seconds:
+                    await asyncio.sleep(settle_seconds / 3)
+                return answered_at
+
+            receiver = asyncio.create_task(receive())
+            sender = asyncio.create_task(send_audio())
+            try:
+                await wait_for_bot(start)
+                for _ in range(turns):
+                    speaking = True
+                    await asyncio.sleep(speech_seconds)
+                    speaking = False
+                    speech_ended_at = time.perf_counter()
+                    try:
+                        answered_at = await wait_for_bot(speech_ended_at)
+                        result.turn_latencies.append(answered_at - speech_ended_at)
+                    except asyncio.TimeoutError:
+                        result.timed_out_turns += 1
+            finally:
+                sender.cancel()
+            result.call_seconds = time.perf_counter() - start
+            await websocket.send(json.dumps({'event': 'stop', 'streamSid': stream_sid}))
+            try:
+                await asyncio.wait_for(receiver, timeout=10)
+            except asyncio.TimeoutError:
+                receiver.cancel()
+        result.ok = result.media_messages > 0 and result.timed_out_turns == 0
+    except Exception as e:
+        print(f'call failed: {e!r}', file=sys.stderr)
+    return result
@@ -0,0 +1,138 @@
+import functools
+import json
+
+from vocode.streaming.agent.token_utils import num_tokens_from_functions, num_tokens_from_messages
+
+from submit_health_appointment_info import SubmitHealthAppointmentInfoActionConfig, HealthAppointmentInfoContainer, compile_health_appointment_schema
+
+
+PROMPT_MODES = ('verbose', 'compact')
+
+
+def build_prompt_preamble(mode: str = 'verbose') -> str:
+    """Returns the appointment agent's prompt preamble, rendered once per schema version.
+
+    'verbose' is the original hand written preamble. 'compact' is generated from the schema
+    metadata, states each rule once and leaves the stage structure to the action's results
+    (see HealthAppointmentForm.stage_progress).
+    """
+    if mode not in PROMPT_MODES:
+        raise ValueError(f'unknown prompt mode {mode!r}, expected one of {PROMPT_MODES}')
+    if mode == 'compact':
+        return _compile_compact_prompt_preamble(compile_health_appointment_schema().version)
+    return _compile_prompt_preamble(compile_health_appointment_schema().version)
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_prompt_preamble(schema_version: str) -> str:
+    input_schema = HealthAppointmentInfoContainer.input_schema
+    input_schema_helper_info = HealthAppointmentInfoContainer.input_schema_helper_info
+    required_field_names = [field for stage in input_schema_helper_info['required_field_stages'] for field in input_schema_helper_info[stage]]
+    action_name = SubmitHealthAppointmentInfoActionConfig.type_string()
+    return f"""
+                    Help the caller schedule a doctor's appointment.
+                    
+                    Collect the following fields from the caller: {repr(input_schema['properties'])},
+                    and use the {action_name} each time information is given.
+                    If the user has already given several pieces of information, and
+                    the {action_name} was not called, call
+                    the {action_name} once with all of them in the payload,
+                    e.g. {{"patient_name": "...", "patient_dob": "..."}}. The fields are only
+                    saved if all of them are valid, the result has each field's result.
+
+                    The fields that start with *, for example *see_next_step, are not required and should
+                    not be collected from the caller. They should be used to check that the form from
+                    {action_name} is in a valid state, and to
+                    collect data, etc.
+
+                    Also, see which fields are required in {input_schema_helper_info}.
+
+                    If the {action_name} function is successful, let the user know.
+                    If the {action_name} function gives an error, also let the user know,
+                    and try to work through the error with the user.
+                    If the {action_name} has a next step, 
+                    such as repeating the info back to confirm, or spelling out the info, do it, unless the user asks not to.
+
+                    Don't say YYYY-MM-DD when referring to date of birth, say date of birth.
+
+                    When spelling or saying individual letters, output what you want to say
+                    with a period and a space between each letter. Also, turn spaces into the word space.
+                    For example, testing should become: t. e. s. t. i. n. g. 
+                    Also, Apple Pie should become: A. p. p. l. e. space P. i. e.
+
+                    If the user says 'yeah', or 'uhh', consider that they are trying to
+                    start a sentence, and wait before trying to say something.
+
+                    Don't list out all the required fields more than once or unless prompted.
+
+                    After inputting a field to {action_name},
+                    confirm with the user the field submitted by repeating the info back, and ask if that is correct (unless the field is special/starts with a *, or the result says it was already read back).
+
+                    If a field is not listed as required in {required_field_names}, don't tell the user the field is needed or required.
+                    But do ask for the field, if the information is not already present.
+
+                    After getting the required fields for each stage, move to the next stage.
+                    Please get appointment information from {action_name} with the field '*see_appointment_availability',
+                    and not from the user, other than the user picking which appointment from the list.
+                    The result that completes the first stage already includes the available appointments, so offer those first.
+
+                    If a field is not required, tell the caller it is optional and they can continue without it.
+                    Providing a non-required field now can save time at the clinic.
+
+                    Please keep trying to run {action_name} with the field '*validate_all_and_submit_if_valid'
+                    and follow the steps to successfully submit.
+
+                    Don't tell the user their appointment is confirmed until successfully running
+                    {action_name} with the field '*validate_all_and_submit_if_valid'.
+
+                    After inputting a field, don't say 'confirmed', or 'scheduled', say the info was successfully validated.
+                    
+                    Get all required fields from each stage before moving to the next, i.e.,
+                    don't ask the caller which appointment they'd like until they have
+                    provided their name, reason for visit, etc.
+
+                    Important: Before telling the user all the information is good and confirmed,
+                    or before telling the user their appointment has been scheduled,
+                    run {action_name} with the field '*validate_all_and_submit_if_valid'.
+
+                    To submit the info inputted, use:
+                    {action_name} with the field '*validate_all_and_submit_if_valid'
+
+                    Important: no information will be saved, or submitted, unless the following is used:
+                    {action_name} with the field '*validate_all_and_submit_if_valid'
+
+                """
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_compact_prompt_preamble(schema_version: str) -> str:
+    properties = HealthAppointmentInfoContainer.input_schema['properties']
+    input_schema_helper_info = HealthAppointmentInfoContainer.input_schema_helper_info
+    required_field_names = {field for stage in input_schema_helper_info['required_field_stages'] for field in input_schema_helper_info[stage]}
+    # field descriptions are already in the function schema, only name them here
+    caller_fields = [field for field in properties if not field.startswith('*')]
+    required = ', '.join(field for field in caller_fields if field in required_field_names)
+    optional = ', '.join(field for field in caller_fields if field not in required_field_names)
+    action_name = SubmitHealthAppointmentInfoActionConfig.type_string()
+    return f"""Help the caller schedule a doctor's appointment by filling in a form with {action_name}.
+Required: {required}. Optional (say so, it saves time at the clinic): {optional}.
+Rules:
+- Call {action_name} each time the caller gives information, with every field they gave in one payload. Fields starting with * are commands, not caller info, and run after the fields.
+- Follow the next_step and form progress in each result. Use '*see_next_step' if unsure what to ask for.
+- After a field validates, repeat it back and ask if it's correct, unless the result says it was already read back. Say it was validated, not confirmed.
+- Spell letters with a period and space each, spaces as the word space: Apple Pie -> A. p. p. l. e. space P. i. e.
+- Say "date of birth", never "YYYY-MM-DD".
+- Offer appointments only from '*see_appointment_availability', or the ones included once stage 1 is complete.
+- Nothing is saved until '*validate_all_and_submit_if_valid' succeeds. Run it before saying the appointment is scheduled.
+- If a result has an error, explain it and fix it with the caller.
+- If the caller says 'yeah' or 'uhh', wait for them to finish."""
+
+
+@functools.lru_cache(maxsize=32)
+def static_prompt_tokens(model_name: str, prompt_preamble: str, functions_json: str) -> int:
+    """Tokens used by the system message and the function definitions, which are the same on every turn.
+
+    functions_json is the agent's functions serialized once, and is only used as part of the cache key.
+    """
+    system_message_tokens = num_tokens_from_messages([{"role": "system", "content": prompt_preamble}], model_name) - 3
+    return system_message_tokens + num_tokens_from_functions(json.loads(functions_json), model_name)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import functools
+import re
+
+import phonenumbers
+from phonenumbers import PhoneMetadata
+
+from datetime import date, datetime
+
+
+class FieldValidationResult(NamedTuple):
+    success: bool
+    info: str
+    # appended to the default next step for the field
+    next_step: str = ''
+    # the value to store on the form, e.g. the phone number in E.164 format
+    value: Any = None
+
+
+FieldValidator = Callable[[str, Any], FieldValidationResult]
+
+# phone numbers and dates are normalized the same way for every conversation, and the same
+# values come back on every '*validate_all_and_submit_if_valid', so the work is cached per
+# value string. bounded, since the strings come from callers.
+NORMALIZATION_CACHE_SIZE = 4096
+
+# numbers without a country code are parsed as US numbers
+DEFAULT_PHONE_REGION = 'US'
+
+# validators for the json schema 'format' keyword, and for individual fields.
+# compile_field_validators() turns these and the schema into one validator per field.
+# the schema is the one the model sees, so only standard formats go in FORMAT_VALIDATORS,
+# anything else is registered for its field.
+FORMAT_VALIDATORS: Dict[str, FieldValidator] = {}
+FIELD_VALIDATORS: Dict[str, FieldValidator] = {}
+
+_JSON_SCHEMA_TYPES = {
+    'string': str,
+    'boolean': bool,
+    'integer': int,
+    'number': (int, float),
+}
+
+
+def register_format_validator(format_name: str):
+    def decorator(validator: FieldValidator) -> FieldValidator:
+        FORMAT_VALIDATORS[format_name] = validator
+        return validator
+    return decorator
+
+
+def register_field_validator(field_name: str):
+    def decorator(validator: FieldValidator) -> FieldValidator:
+        FIELD_VALIDATORS[field_name] = validator
+        return validator
+    return decorator
+
+
+def years_since(date_string):
+    given_date = parse_date(date_string)
+    if given_date is None:
+        raise ValueError(f'{date_string!r} is not a YYYY-MM-DD date')
+    return _years_between(given_date, datetime.now().date())
+
+
+@functools.lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def parse_date(date_string: str) -> Optional[date]:
+    """The YYYY-MM-DD date, or None if it isn't one. Cached, strptime is slow."""
+    try:
+        return datetime.strptime(date_string, "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def _years_between(given_date: date, current_date: date) -> int:
+    # Calculate the difference in years
+    years_difference = current_date.year - given_date.year
+
+    # Adjust for partial years
+    if (current_date.month, current_date.day) < (given_date.month, given_date.day):
+        years_difference -= 1
+
+    return years_difference
+
+
+@register_format_validator('date')
+def validate_date_of_birth(key: str, value: Any) -> FieldValidationResult:
+    given_date = parse_date(value)
+    if given_date is None:
+        return FieldValidationResult(False, 'error parsing date: patient should give their full date of birth, month, day and year in the format YYYY-MM-DD .', ' If the month, day, year are present, but the format is wrong, try reinputting ')
+    age = _years_between(given_date, datetime.now().date())
+    if age < -1 or age > 150:
+        return FieldValidationResult(False, 'calculated age was {} which is invalid'.format(age))
+    return FieldValidationResult(True, key + ' is valid', value=value)
+
+
+@register_field_validator('patient_phone_number')
+def validate_phone_number(key: str, value: Any) -> FieldValidationResult:
+    # the result doesn't mention the key, so it's cached per number
+    return normalize_phone_number(value)
+
+
+@functools.lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_phone_number(value: str) -> FieldValidationResult:
+    """Parses a (DEFAULT_PHONE_REGION by default) number, the result's value is in E.164 format."""
+    try:
+        parsed_number = phonenumbers.parse(value, DEFAULT_PHONE_REGION)
+    except phonenumbers.phonenumberutil.NumberParseException:
+        return FieldValidationResult(False, 'could not parse provided number: {}'.format(value), ' please retry.')
+
+    if not phonenumbers.is_valid_number(parsed_number):
+        return FieldValidationResult(False, 'number provided is not valid: {}'.format(value), ' please retry.')
+
+    formatted_number = phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
+    return FieldValidationResult(True, 'The parsed number that will be used is {}'.format(formatted_number), ' If the user doesn\t say the number is correct, tell the user for international numbers a plus sign should be added in front (E.164 format).', formatted_number)
+
+
+def preload_phone_number_metadata(regions: Tuple[str, ...] = (DEFAULT_PHONE_REGION,)):
+    """phonenumbers loads each region's metadata, and compiles its patterns, on first use,
+    which made the first number a worker validated take several ms. Loads all the metadata
+    and validates an example number for each of regions, call it once at startup.
+
+    Only the regions callers are expected to use are warmed, the compiled patterns live in
+    the re module's cache, which is bounded.
+    """
+    PhoneMetadata.load_all()
+    for region in regions:
+        example_number = phonenumbers.example_number(region)
+        if example_number is not None:
+            phonenumbers.is_valid_number(example_number)
+            phonenumbers.format_number(example_number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def clear_normalization_caches():
+    parse_date.cache_clear()
+    normalize_phone_number.cache_clear()
+
+
+@register_field_validator('patient_name')
+def validate_patient_name(key: str, value: Any) -> FieldValidationResult:
+    if ' ' not in value:
+        # how does this work for chinese?
+        return FieldValidationResult(False, 'patient should give first and last name')
+    return FieldValidationResult(True, key + ' is valid', ' note: Spell back the name inputted.', value)
+
+
+def compile_field_validators(input_schema: Dict[str, Any]) -> Dict[str, FieldValidator]:
+    """Builds one validator per schema property from its type, enum, pattern and format,
+    plus any validator registered for the field itself. Regexes are compiled here, once.
+    """
+    return {
+        key: _compile_field_validator(key, field_schema)
+        for key, field_schema in input_schema['properties'].items()
+        if not key.startswith('*')
+    }
+
+
+def _compile_field_validator(key: str, field_schema: Dict[str, Any]) -> FieldValidator:
+    # guards only reject, and return None for valid values. validators can also normalize the value.
+    guards: List[Callable[[Any], Optional[FieldValidationResult]]] = []
+    type_name = field_schema.get('type')
+    expected_type = _JSON_SCHEMA_TYPES.get(type_name, object)
+    # bool is a subclass of int, don't accept it for numbers
+    rejects_bool = type_name in ('integer', 'number')
+    if 'enum' in field_schema:
+        allowed_values = frozenset(field_schema['enum'])
+
+        def check_enum(value: Any) -> Optional[FieldValidationResult]:
+            if value not in allowed_values:
+                return FieldValidationResult(False, f'{key} should be one of {sorted(allowed_values)}')
+            return None
+        guards.append(check_enum)
+    if 'pattern' in field_schema:
+        pattern = re.compile(field_schema['pattern'])
+
+        def check_pattern(value: Any) -> Optional[FieldValidationResult]:
+            if not pattern.search(value):
+                return FieldValidationResult(False, f'{key} {value!r} is not in the expected format', ' please ask the user to repeat it.')
+            return None
+        guards.append(check_pattern)
+    validators = [
+        validator for validator in (FORMAT_VALIDATORS.get(field_schema.get('format')), FIELD_VALIDATORS.get(key))
+        if validator is not None
+    ]
+    valid_info = key + ' is valid'
+    # fields without checks take any value, as they always have. the type is only checked
+    # before a check that needs it, which would otherwise raise
+    checks_type = bool(guards or validators)
+
+    def validate(key: str, value: Any) -> FieldValidationResult:
+        if checks_type and (not isinstance(value, expected_type) or (rejects_bool and value.__class__ is bool)):
+            return FieldValidationResult(False, f'{key} should be a {type_name}, got {value!r}')
+        for guard in guards:
+            error = guard(value)
+            if error is not None:
+                return error
+        if not validators:
+            return FieldValidationResult(True, valid_info, '', value)
+        for validator in validators:
+            result = validator(key, value)
+            if not result.success:
+                return result
+            value = result.value
+        return result
+    return validate
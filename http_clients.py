@@ -0,0 +1,119 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional, Union
+
+import asyncio
+import importlib.util
+import os
+import ssl
+import weakref
+
+import httpx
+from openai import DEFAULT_MAX_RETRIES, DEFAULT_TIMEOUT, AsyncAzureOpenAI, AsyncOpenAI
+
+from vocode.streaming.models.agent import ChatGPTAgentConfig
+
+
+class _PerLoopTransport(httpx.AsyncBaseTransport):
+    """A connection pool per event loop, opened on the first request made from it.
+
+    httpx connections belong to the loop they were opened on, so a client that outlives a loop
+    (or is created before one runs, as agents are) can't share one pool between loops.
+    """
+
+    def __init__(self, limits: httpx.Limits, http2: bool, ssl_context: ssl.SSLContext):
+        self.limits = limits
+        self.http2 = http2
+        self.ssl_context = ssl_context
+        self._transports: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = weakref.WeakKeyDictionary()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            # the pools of closed loops can't be closed from here, dropping them closes their sockets
+            for closed_loop in [other for other in self._transports if other.is_closed()]:
+                del self._transports[closed_loop]
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2, verify=self.ssl_context)
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
+
+    async def aclose(self):
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+class HttpClientRegistry:
+    """Process-wide httpx.AsyncClients, one per outbound integration ('openai', 'twilio'), so calls
+    share keep-alive connections instead of each opening (and TLS handshaking) their own.
+
+    Creating a client is expensive too: vocode's per-agent AsyncOpenAI built a new SSL context,
+    ~45ms on the event loop for every call. HTTP/2 is used when the h2 package is installed.
+
+    The clients can be created outside an event loop; each loop that uses them gets its own
+    connection pool, since httpx connections belong to the loop they were opened on. Close the
+    running loop's connections with aclose() on shutdown.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry_seconds: float = 30.0,
+        http2: Optional[bool] = None,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_seconds,
+        )
+        self.http2 = importlib.util.find_spec('h2') is not None if http2 is None else http2
+        # loading the CA bundle, and httpcore importing anyio's asyncio backend on its first request,
+        # take tens of ms each. done here once, instead of on the event loop of the first caller
+        self.ssl_context = httpx.create_ssl_context()
+        importlib.import_module('anyio._backends._asyncio')
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, name: str, **client_kwargs: Any) -> httpx.AsyncClient:
+        """The shared client for name, created with client_kwargs (e.g. timeout) the first time."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            transport = _PerLoopTransport(self.limits, self.http2, self.ssl_context)
+            client = self._clients[name] = httpx.AsyncClient(transport=transport, **client_kwargs)
+        return client
+
+    def openai_client(self, agent_config: ChatGPTAgentConfig, model_fallback: bool = False) -> Union[AsyncOpenAI, AsyncAzureOpenAI]:
+        """vocode's instantiate_openai_client, on the shared 'openai' connection pool."""
+        http_client = self.get('openai', timeout=DEFAULT_TIMEOUT)
+        max_retries = 0 if model_fallback else DEFAULT_MAX_RETRIES
+        if agent_config.azure_params:
+            return AsyncAzureOpenAI(
+                azure_endpoint=agent_config.azure_params.base_url,
+                api_key=agent_config.azure_params.api_key,
+                api_version=agent_config.azure_params.api_version,
+                max_retries=max_retries,
+                http_client=http_client,
+            )
+        return AsyncOpenAI(
+            api_key=agent_config.openai_api_key or os.environ["OPENAI_API_KEY"],
+            base_url="https://api.openai.com/v1",
+            max_retries=max_retries,
+            http_client=http_client,
+        )
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
+
+
+def _http_client_registry_from_env() -> HttpClientRegistry:
+    return HttpClientRegistry(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry_seconds=float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30")),
+    )
+
+
+http_clients = _http_client_registry_from_env()
@@ -0,0 +1,169 @@
+from __future__ import annotations
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+import json
+import time
+
+from loguru import logger
+
+from vocode.streaming.models.telephony import BaseCallConfig
+from vocode.streaming.telephony.config_manager.base_config_manager import BaseConfigManager
+
+# seconds, chosen around a turn's budget: most spans are well under 10ms, LLM calls take up to seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# set by the outermost span that knows it, so nested spans (validation inside an action) are traced to the same call
+current_conversation_id: ContextVar[Optional[str]] = ContextVar('current_conversation_id', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'errors')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # counts[i] is the number of observations in (buckets[i - 1], buckets[i]], the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if error:
+            self.errors += 1
+
+
+class SpanMetrics:
+    """Per span name timing histograms, rendered in the Prometheus text format.
+
+    Kept per process: with several workers, each serves its own numbers on /metrics.
+    Only touched from the event loop, so there's no locking.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms: Dict[str, Histogram] = {}
+
+    def observe(self, name: str, seconds: float, error: bool = False):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram(self.buckets)
+        histogram.observe(seconds, error)
+
+    def get(self, name: str) -> Optional[Histogram]:
+        return self._histograms.get(name)
+
+    def clear(self):
+        self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = [
+            '# HELP telephony_span_seconds Time spent in instrumented parts of a call.',
+            '# TYPE telephony_span_seconds histogram',
+        ]
+        for name, histogram in sorted(self._histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'telephony_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'telephony_span_seconds_bucket{{span="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'telephony_span_seconds_sum{{span="{name}"}} {histogram.sum}')
+            lines.append(f'telephony_span_seconds_count{{span="{name}"}} {histogram.count}')
+        lines += [
+            '# HELP telephony_span_errors_total Instrumented spans that raised.',
+            '# TYPE telephony_span_errors_total counter',
+        ]
+        for name, histogram in sorted(self._histograms.items()):
+            lines.append(f'telephony_span_errors_total{{span="{name}"}} {histogram.errors}')
+        return '\n'.join(lines) + '\n'
+
+
+span_metrics = SpanMetrics()
+
+_trace_sink_id: Optional[int] = None
+
+
+def enable_trace_log(path: str):
+    """Writes a JSON line per span to path, with its conversation id, name, start time and duration.
+
+    Written from a background thread (loguru's enqueue), at loguru's TRACE level so the stdout
+    handler (DEBUG and up) doesn't print them.
+    """
+    global _trace_sink_id
+    disable_trace_log()
+    _trace_sink_id = logger.add(path, level='TRACE', format='{message}', filter=lambda record: 'span' in record['extra'], enqueue=True)
+
+
+def disable_trace_log():
+    global _trace_sink_id
+    if _trace_sink_id is not None:
+        logger.remove(_trace_sink_id)
+        _trace_sink_id = None
+
+
+def record_span(name: str, seconds: float, error: bool = False, conversation_id: Optional[str] = None):
+    """Records a span that was timed by hand, e.g. across the yields of a generator."""
+    span_metrics.observe(name, seconds, error)
+    if _trace_sink_id is not None:
+        record = {
+            'conversation_id': conversation_id or current_conversation_id.get(),
+            'span': name,
+            'start': time.time() - seconds,
+            'seconds': seconds,
+            'error': error,
+        }
+        logger.bind(span=name).trace(json.dumps(record))
+
+
+class span:
+    """Times the block it wraps:
+
+        with span('action.run', conversation_id):
+            ...
+
+    A couple of microseconds when trace logs are off, small next to anything worth timing (a field
+    validation is ~20µs), so it stays on in production. See benchmarks/bench_instrumentation.py.
+    """
+
+    __slots__ = ('name', 'conversation_id', 'start', '_token')
+
+    def __init__(self, name: str, conversation_id: Optional[str] = None):
+        self.name = name
+        self.conversation_id = conversation_id
+        self._token = None
+
+    def __enter__(self) -> span:
+        if self.conversation_id is not None:
+            self._token = current_conversation_id.set(self.conversation_id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        seconds = time.perf_counter() - self.start
+        record_span(self.name, seconds, exc_type is not None, self.conversation_id)
+        if self._token is not None:
+            current_conversation_id.reset(self._token)
+        return False
+
+
+class InstrumentedConfigManager(BaseConfigManager):
+    """Times the call config reads and writes (Redis in production) of another config manager."""
+
+    def __init__(self, config_manager: BaseConfigManager):
+        self.config_manager = config_manager
+
+    async def save_config(self, conversation_id: str, config: BaseCallConfig):
+        with span('config_manager.save', conversation_id):
+            await self.config_manager.save_config(conversation_id, config)
+
+    async def get_config(self, conversation_id) -> Optional[BaseCallConfig]:
+        with span('config_manager.get', conversation_id):
+            return await self.config_manager.get_config(conversation_id)
+
+    async def delete_config(self, conversation_id):
+        with span('config_manager.delete', conversation_id):
+            await self.config_manager.delete_config(conversation_id)
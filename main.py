@@ -1,24 +1,39 @@
 # Standard library imports
+import asyncio
 import os
 import sys
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 
 # Third-party imports
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from loguru import logger
-from pyngrok import ngrok
 
 # Local application/library specific imports
-from submit_health_appointment_info import SubmitHealthAppointmentInfoActionConfig, HealthAppointmentInfoContainer, HealthAppointmentScheduler
-from speller_agent import SpellerAgentFactory, SpellerAgentConfig
+from submit_health_appointment_info import SUBMIT_SUCCESS_MESSAGE, SubmitHealthAppointmentInfoActionConfig, HealthAppointmentInfoContainer, HealthAppointmentScheduler
+from speller_agent import EventsManager, SpellerAgentFactory, SpellerAgentConfig
+from health_appointment_prompt import build_prompt_preamble
+from health_appointment_validators import preload_phone_number_metadata
+from twilio_sms import sms_dispatcher
+from http_clients import http_clients
+from instrumentation import InstrumentedConfigManager, enable_trace_log, span_metrics
+from post_call import PostCallPipeline
+from phrase_audio_cache import PhraseAudioCache, PhraseCachingSynthesizerFactory, phrase_audio_cache_from_env
+from template_config_manager import TemplateConfigManager
+from admission_control import AdmissionControlMiddleware, AdmissionController, admission_controller_from_env
 
 from vocode.logging import configure_pretty_logging
+from vocode.streaming.agent.abstract_factory import AbstractAgentFactory
 from vocode.streaming.models.agent import ChatGPTAgentConfig
 from vocode.streaming.models.message import BaseMessage
-from vocode.streaming.models.telephony import TwilioConfig
-from vocode.streaming.telephony.config_manager.redis_config_manager import RedisConfigManager
-from vocode.streaming.telephony.server.base import TelephonyServer, TwilioInboundCallConfig
+from vocode.streaming.models.telephony import TwilioCallConfig, TwilioConfig
+from vocode.streaming.synthesizer.abstract_factory import AbstractSynthesizerFactory
+from vocode.streaming.telephony.config_manager.base_config_manager import BaseConfigManager
+from vocode.streaming.telephony.server.base import AbstractInboundCallConfig, TelephonyServer, TwilioInboundCallConfig
+from vocode.streaming.transcriber.abstract_factory import AbstractTranscriberFactory
 from vocode.streaming.action.end_conversation import EndConversationVocodeActionConfig
 
 # if running from python, this will load the local .env
@@ -27,29 +42,43 @@ load_dotenv()
 
 configure_pretty_logging()
 
-app = FastAPI(docs_url=None)
 
-config_manager = RedisConfigManager()
+def get_worker_count() -> int:
+    # uvicorn reads the same variable for its --workers default
+    return int(os.getenv("WEB_CONCURRENCY", "1"))
 
-BASE_URL = os.getenv("BASE_URL")
 
-if not BASE_URL:
+def get_base_url() -> str:
+    base_url = os.getenv("BASE_URL")
+    if base_url:
+        return base_url
+
+    if get_worker_count() > 1:
+        # every worker would open its own tunnel
+        raise ValueError("BASE_URL must be set when running more than one worker")
+
+    # only for local development, deployments set BASE_URL and never import it
+    from pyngrok import ngrok
+
     ngrok_auth = os.environ.get("NGROK_AUTH_TOKEN")
     if ngrok_auth is not None:
         ngrok.set_auth_token(ngrok_auth)
     port = sys.argv[sys.argv.index("--port") + 1] if "--port" in sys.argv else 3000
 
     # Open a ngrok tunnel to the dev server
-    BASE_URL = ngrok.connect(port).public_url.replace("https://", "")
-    logger.info('ngrok tunnel "{}" -> "http://127.0.0.1:{}"'.format(BASE_URL, port))
+    base_url = ngrok.connect(port).public_url.replace("https://", "")
+    logger.info('ngrok tunnel "{}" -> "http://127.0.0.1:{}"'.format(base_url, port))
 
-if not BASE_URL:
-    raise ValueError("BASE_URL must be set in environment if not using pyngrok")
+    if not base_url:
+        raise ValueError("BASE_URL must be set in environment if not using pyngrok")
+    return base_url
 
-telephony_server = TelephonyServer(
-    base_url=BASE_URL,
-    config_manager=config_manager,
-    inbound_call_configs=[
+
+def build_inbound_call_configs() -> List[AbstractInboundCallConfig]:
+    scheduler_backend = os.getenv("APPOINTMENT_SCHEDULER_BACKEND", "redis")
+    if scheduler_backend == "memory" and get_worker_count() > 1:
+        logger.warning("the memory scheduler backend isn't shared between workers, use the redis backend so slots can't be double booked")
+    return [
         TwilioInboundCallConfig(
             url="/inbound_call",
             agent_config=ChatGPTAgentConfig(
@@ -63,84 +92,14 @@ telephony_server = TelephonyServer(
                 #    Help the caller schedule a doctor's appointment.
                 #    Keep using the submit info action until there are no errors.
                 # """
-                prompt_preamble=f"""
-                    Help the caller schedule a doctor's appointment.
-                    
-                    Collect the following fields from the caller: {repr(HealthAppointmentInfoContainer().input_schema['properties'])},
-                    and use the {SubmitHealthAppointmentInfoActionConfig.type_string()} each time information is given.
-                    If the user has already given pieces of information, and
-                    the {SubmitHealthAppointmentInfoActionConfig.type_string()} was not called, call
-                    the {SubmitHealthAppointmentInfoActionConfig.type_string()} multiple times for each piece
-                    of information. Don't call the action once with multiple pieces of
-                    information.
-
-                    The fields that start with *, for example *see_next_step, are not required and should
-                    not be collected from the caller. They should be used to check that the form from
-                    {SubmitHealthAppointmentInfoActionConfig.type_string()} is in a valid state, and to
-                    collect data, etc.
-
-                    Also, see which fields are required in {HealthAppointmentInfoContainer().input_schema_helper_info}.
-
-                    If the {SubmitHealthAppointmentInfoActionConfig.type_string()} function is successful, let the user know.
-                    If the {SubmitHealthAppointmentInfoActionConfig.type_string()} function gives an error, also let the user know,
-                    and try to work through the error with the user.
-                    If the {SubmitHealthAppointmentInfoActionConfig.type_string()} has a next step, 
-                    such as repeating the info back to confirm, or spelling out the info, do it, unless the user asks not to.
-
-                    Don't say YYYY-MM-DD when referring to date of birth, say date of birth.
-
-                    When spelling or saying individual letters, output what you want to say
-                    with a period and a space between each letter. Also, turn spaces into the word space.
-                    For example, testing should become: t. e. s. t. i. n. g. 
-                    Also, Apple Pie should become: A. p. p. l. e. space P. i. e.
-
-                    If the user says 'yeah', or 'uhh', consider that they are trying to
-                    start a sentence, and wait before trying to say something.
-
-                    Don't list out all the required fields more than once or unless prompted.
-
-                    After inputting a field to {SubmitHealthAppointmentInfoActionConfig.type_string()},
-                    confirm with the user the field submitted by repeating the info back, and ask if that is correct (unless the field is special/starts with a *).
+                prompt_preamble=build_prompt_preamble(os.getenv("PROMPT_MODE", "verbose")),
 
-                    If a field is not listed as required in {HealthAppointmentInfoContainer().get_required_field_names()}, don't tell the user the field is needed or required.
-                    But do ask for the field, if the information is not already present.
-
-                    After getting the required fields for each stage, move to the next stage.
-                    Please get appointment information from {SubmitHealthAppointmentInfoActionConfig.type_string()} with the field '*see_appointment_availability',
-                    and not from the user, other than the user picking which appointment from the list.
-
-                    If a field is not required, tell the caller it is optional and they can continue without it.
-                    Providing a non-required field now can save time at the clinic.
-
-                    Please keep trying to run {SubmitHealthAppointmentInfoActionConfig.type_string()} with the field '*validate_all_and_submit_if_valid'
-                    and follow the steps to successfully submit.
-
-                    Don't tell the user their appointment is confirmed until successfully running
-                    {SubmitHealthAppointmentInfoActionConfig.type_string()} with the field '*validate_all_and_submit_if_valid'.
-
-                    After inputting a field, don't say 'confirmed', or 'scheduled', say the info was successfully validated.
-                    
-                    Get all required fields from each stage before moving to the next, i.e.,
-                    don't ask the caller which appointment they'd like until they have
-                    provided their name, reason for visit, etc.
-
-                    Important: Before telling the user all the information is good and confirmed,
-                    or before telling the user their appointment has been scheduled,
-                    run {SubmitHealthAppointmentInfoActionConfig.type_string()} with the field '*validate_all_and_submit_if_valid'.
-
-                    To submit the info inputted, use:
-                    {SubmitHealthAppointmentInfoActionConfig.type_string()} with the field '*validate_all_and_submit_if_valid'
-
-                    Important: no information will be saved, or submitted, unless the following is used:
-                    {SubmitHealthAppointmentInfoActionConfig.type_string()} with the field '*validate_all_and_submit_if_valid'
-
-                """,
                 generate_responses=True,
                 actions = [
                     EndConversationVocodeActionConfig(),
                     SubmitHealthAppointmentInfoActionConfig(
                         health_appointment_info_container=HealthAppointmentInfoContainer(),
-                        health_appointment_scheduler=HealthAppointmentScheduler(scheduled_appointments_status={}))
+                        health_appointment_scheduler=HealthAppointmentScheduler(backend=scheduler_backend))
                 ]
             ),
             twilio_config=TwilioConfig(
@@ -148,8 +107,122 @@ telephony_server = TelephonyServer(
                 auth_token=os.environ["TWILIO_AUTH_TOKEN"],
             ),
         )
-    ],
-    agent_factory=SpellerAgentFactory(),
-)
-
-app.include_router(telephony_server.get_router())
\ No newline at end of file
+    ]
+
+
+async def warm_up_phrase_audio_cache(
+    phrase_audio_cache: PhraseAudioCache,
+    synthesizer_factory: AbstractSynthesizerFactory,
+    inbound_call_configs: List[AbstractInboundCallConfig],
+):
+    # the phrases every call says word for word: its greeting and the submit confirmation
+    for inbound_call_config in inbound_call_configs:
+        initial_message = inbound_call_config.agent_config.initial_message
+        phrases = [initial_message.text] if initial_message else []
+        try:
+            await phrase_audio_cache.warm_up(
+                synthesizer_factory,
+                inbound_call_config.synthesizer_config or TwilioCallConfig.default_synthesizer_config(),
+                phrases + [SUBMIT_SUCCESS_MESSAGE],
+            )
+        except Exception:
+            # calls synthesize the phrases themselves until they're cached
+            logger.exception(f"failed to warm up the phrase audio cache for {inbound_call_config.url}")
+
+
+def create_app(
+    config_manager: Optional[BaseConfigManager] = None,
+    inbound_call_configs: Optional[List[AbstractInboundCallConfig]] = None,
+    agent_factory: Optional[AbstractAgentFactory] = None,
+    transcriber_factory: Optional[AbstractTranscriberFactory] = None,
+    synthesizer_factory: Optional[AbstractSynthesizerFactory] = None,
+    phrase_audio_cache: Optional[PhraseAudioCache] = None,
+    admission_controller: Optional[AdmissionController] = None,
+) -> FastAPI:
+    """Creates the app. The tunnel, the config manager and the call configs are set up on startup,
+    in each worker, so importing this module has no side effects.
+
+    Run several workers with `uvicorn main:create_app --factory --workers N` (or WEB_CONCURRENCY=N),
+    and several nodes behind a load balancer by pointing BASE_URL at it. Call configs are shared
+    through Redis (see TemplateConfigManager), so a call's /inbound_call and websocket can land on
+    different workers. Everything else a call needs (its form, its agent) lives in the worker
+    holding its websocket.
+
+    Timings of the hot paths are served on /metrics, and with TRACE_LOG_PATH set each
+    span is also written there as a JSON line with its conversation id.
+
+    With a phrase_audio_cache (or PHRASE_AUDIO_CACHE_DIR set), the calls' fixed phrases are
+    synthesized once, in the background on startup, and served from the cache after that.
+
+    Each worker admits new calls while it has room for them, see AdmissionController (or
+    MAX_ACTIVE_CONVERSATIONS and MAX_EVENT_LOOP_LAG_MS), and answers the others with overflow TwiML.
+    Without either limit, admission control isn't installed.
+    """
+    admission = admission_controller or admission_controller_from_env()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        trace_log_path = os.getenv("TRACE_LOG_PATH")
+        if trace_log_path:
+            enable_trace_log(trace_log_path)
+        # so the first caller's phone number doesn't wait on it
+        preload_phone_number_metadata()
+        call_configs = inbound_call_configs if inbound_call_configs is not None else build_inbound_call_configs()
+        if admission.enabled:
+            admission.inbound_call_urls = {inbound_call_config.url for inbound_call_config in call_configs}
+            admission.start()
+        cache = phrase_audio_cache or phrase_audio_cache_from_env()
+        warm_up_task: Optional[asyncio.Task] = None
+        caching_synthesizer_factory: Optional[AbstractSynthesizerFactory] = None
+        if cache is not None:
+            from vocode.streaming.synthesizer.default_factory import DefaultSynthesizerFactory
+
+            uncached_synthesizer_factory = synthesizer_factory or DefaultSynthesizerFactory()
+            caching_synthesizer_factory = PhraseCachingSynthesizerFactory(uncached_synthesizer_factory, cache)
+            # in the background, a call that comes first synthesizes (and caches) the phrases itself
+            warm_up_task = asyncio.create_task(warm_up_phrase_audio_cache(cache, uncached_synthesizer_factory, call_configs))
+        factories: Dict[str, Any] = {
+            name: factory for name, factory in (
+                ("agent_factory", agent_factory or SpellerAgentFactory()),
+                ("transcriber_factory", transcriber_factory),
+                ("synthesizer_factory", caching_synthesizer_factory or synthesizer_factory),
+            ) if factory is not None
+        }
+        post_call_pipeline = PostCallPipeline(transcript_archive_dir=os.getenv("TRANSCRIPT_ARCHIVE_DIR"))
+        telephony_server = TelephonyServer(
+            base_url=get_base_url(),
+            config_manager=InstrumentedConfigManager(config_manager or TemplateConfigManager()),
+            inbound_call_configs=call_configs,
+            events_manager=EventsManager(post_call_pipeline),
+            **factories,
+        )
+        app.include_router(telephony_server.get_router())
+        app.state.telephony_server = telephony_server
+        app.state.post_call_pipeline = post_call_pipeline
+        app.state.phrase_audio_cache = cache
+        app.state.phrase_audio_cache_warm_up = warm_up_task
+        app.state.admission_controller = admission
+        yield
+        if warm_up_task is not None:
+            warm_up_task.cancel()
+        if admission.enabled:
+            await admission.stop()
+        # calls that ended on this worker, then the texts they queued, then the connections they used
+        await post_call_pipeline.stop(drain=True)
+        await sms_dispatcher.stop(drain=True)
+        await http_clients.aclose()
+
+    app = FastAPI(docs_url=None, lifespan=lifespan)
+    if admission.enabled:
+        app.add_middleware(AdmissionControlMiddleware, admission_controller=admission)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        # per worker, see SpanMetrics and AdmissionController
+        admission_metrics = admission.render_prometheus() if admission.enabled else ''
+        return PlainTextResponse(span_metrics.render_prometheus() + admission_metrics, media_type="text/plain; version=0.0.4")
+
+    return app
+
+
+app = create_app()
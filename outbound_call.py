@@ -1,45 +1,57 @@
+"""Runs an appointment reminder or reschedule campaign over a patient list.
+
+    python outbound_call.py patients.csv --from +15555550100 --concurrency 8
+
+The list is a .csv or .jsonl file, see outbound_campaign.read_contacts for its columns. Progress
+is kept in Redis under the campaign id (the file name by default): running the same campaign
+again skips the patients already called and retries the ones whose calls failed.
+"""
+import argparse
 import os
 
 from dotenv import load_dotenv
 
-from vocode.streaming.models.agent import ChatGPTAgentConfig
-from vocode.streaming.models.message import BaseMessage
-from vocode.streaming.models.telephony import TwilioConfig
-
 load_dotenv()
 
-from speller_agent import SpellerAgentConfig
+from outbound_campaign import CAMPAIGN_KINDS, PROGRESS_BACKENDS, OutboundCampaign, get_campaign_progress_store, read_contacts
+from template_config_manager import TemplateConfigManager
 
-from vocode.streaming.telephony.config_manager.redis_config_manager import RedisConfigManager
-from vocode.streaming.telephony.conversation.outbound_call import OutboundCall
 
-BASE_URL = os.environ["BASE_URL"]
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('patients', help='a .csv or .jsonl patient list')
+    parser.add_argument('--campaign-id', help='defaults to the patient list file name')
+    parser.add_argument('--from', dest='from_phones', action='append', help='a number to call from, can be given more than once (default: TWILIO_ADDRESS)')
+    parser.add_argument('--kind', choices=CAMPAIGN_KINDS, default='reminder', help='for rows without a kind')
+    parser.add_argument('--concurrency', type=int, default=8, help='calls being placed at once')
+    parser.add_argument('--calls-per-second-per-number', type=float, default=1.0)
+    parser.add_argument('--account-calls-per-second', type=float, default=1.0, help="the Twilio account's CPS")
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--backoff-seconds', type=float, default=30.0, help='before the first retry, doubling after')
+    parser.add_argument('--progress-backend', choices=PROGRESS_BACKENDS, default='redis')
+    return parser.parse_args()
 
 
 async def main():
-    config_manager = RedisConfigManager()
-
-    outbound_call = OutboundCall(
-        base_url=BASE_URL,
-        to_phone="+15555555555",
-        from_phone="+15555555555",
-        config_manager=config_manager,
-        agent_config=ChatGPTAgentConfig(
-            initial_message=BaseMessage(text="What up"),
-            prompt_preamble="Have a pleasant conversation about life",
-            generate_responses=True,
-        ),
-        telephony_config=TwilioConfig(
-            account_sid=os.environ["TWILIO_ACCOUNT_SID"],
-            auth_token=os.environ["TWILIO_AUTH_TOKEN"],
-        ),
+    args = parse_args()
+    campaign = OutboundCampaign(
+        campaign_id=args.campaign_id or os.path.basename(args.patients),
+        base_url=os.environ["BASE_URL"],
+        from_phones=args.from_phones or [os.environ["TWILIO_ADDRESS"]],
+        config_manager=TemplateConfigManager(),
+        progress_store=get_campaign_progress_store(args.progress_backend),
+        max_concurrency=args.concurrency,
+        calls_per_second_per_number=args.calls_per_second_per_number,
+        account_calls_per_second=args.account_calls_per_second,
+        max_attempts=args.max_attempts,
+        backoff_base_seconds=args.backoff_seconds,
+        scheduler_backend=os.getenv("APPOINTMENT_SCHEDULER_BACKEND", "redis"),
     )
-
-    input("Press enter to start call...")
-    await outbound_call.start()
+    stats = await campaign.run(read_contacts(args.patients, default_kind=args.kind))
+    print(f'{stats.initiated} calls initiated, {stats.failed} failed, {stats.skipped} skipped, {stats.calls_per_second:.2f} calls/s')
 
 
 if __name__ == "__main__":
     import asyncio
 
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,467 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import asyncio
+import csv
+import heapq
+import json
+import os
+import time
+
+import httpx
+from loguru import logger
+
+from vocode.streaming.action.end_conversation import EndConversationVocodeActionConfig
+from vocode.streaming.models.agent import ChatGPTAgentConfig
+from vocode.streaming.models.message import BaseMessage
+from vocode.streaming.models.telephony import TwilioConfig
+from vocode.streaming.telephony.client.abstract_telephony_client import AbstractTelephonyClient
+from vocode.streaming.telephony.client.twilio_client import TwilioBadRequestException, TwilioClient
+from vocode.streaming.telephony.config_manager.base_config_manager import BaseConfigManager
+from vocode.streaming.telephony.conversation.outbound_call import OutboundCall
+
+from health_appointment_prompt import build_prompt_preamble
+from http_clients import HttpClientRegistry, http_clients
+from instrumentation import span
+from submit_health_appointment_info import HealthAppointmentInfoContainer, HealthAppointmentScheduler, SubmitHealthAppointmentInfoActionConfig
+
+# progress is kept this long after a campaign's last update
+DEFAULT_CAMPAIGN_TTL_SECONDS = 60 * 60 * 24 * 30
+
+CAMPAIGN_KINDS = ('reminder', 'reschedule')
+
+DIALING = 'dialing'
+INITIATED = 'initiated'
+RETRY_SCHEDULED = 'retry_scheduled'
+FAILED = 'failed'
+# not dialed again when a campaign is resumed. A contact left 'dialing' by a crash may or may not
+# have been called, it's skipped rather than risk calling a patient twice
+FINISHED_STATUSES = (DIALING, INITIATED, FAILED)
+
+
+class CampaignContact(NamedTuple):
+    contact_id: str
+    phone_number: str
+    patient_name: str
+    kind: str
+    appointment_time: str
+
+
+class CampaignProgress(NamedTuple):
+    status: str
+    attempts: int
+
+
+def read_contacts(path: str, default_kind: str = 'reminder') -> Iterator[CampaignContact]:
+    """Streams the contacts of a .csv (with a header row) or .jsonl patient list, one row at a time.
+
+    Rows need a phone_number, the other columns are optional: contact_id (defaults to the
+    phone number), patient_name, kind ('reminder' or 'reschedule') and appointment_time, as
+    it should be said. Rows without a phone number or with an unknown kind are logged and skipped.
+    """
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            rows: Iterable[Dict[str, Any]] = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for line_number, row in enumerate(rows, start=1):
+            phone_number = str(row.get('phone_number') or '').strip()
+            kind = row.get('kind') or default_kind
+            if not phone_number or kind not in CAMPAIGN_KINDS:
+                logger.warning(f'skipping row {line_number} of {path}: no phone number, or kind {kind!r} is not one of {CAMPAIGN_KINDS}')
+                continue
+            yield CampaignContact(
+                contact_id=str(row.get('contact_id') or phone_number),
+                phone_number=phone_number,
+                patient_name=row.get('patient_name') or '',
+                kind=kind,
+                appointment_time=row.get('appointment_time') or '',
+            )
+
+
+def build_campaign_agent_config(contact: CampaignContact, scheduler_backend: str = 'redis') -> ChatGPTAgentConfig:
+    """The agent for a campaign call. A reminder confirms the appointment, a reschedule call
+    books a new one with the same prompt and actions as the inbound line.
+
+    Only the greeting names the patient and the appointment, the rest of the config is the same
+    for every contact of a kind. TemplateConfigManager keeps the greeting in the call's own record,
+    so a campaign stores two agent templates however many contacts it dials.
+    """
+    greeting = f"Hi, this is Dr. Tang's Clinic calling for {contact.patient_name or 'you'}."
+    appointment = f'your appointment on {contact.appointment_time}' if contact.appointment_time else 'your upcoming appointment'
+    if contact.kind == 'reschedule':
+        return ChatGPTAgentConfig(
+            initial_message=BaseMessage(text=f"{greeting} We need to move {appointment}. Do you have a few minutes to pick a new time?"),
+            prompt_preamble=build_prompt_preamble(os.getenv("PROMPT_MODE", "verbose")),
+            generate_responses=True,
+            actions=[
+                EndConversationVocodeActionConfig(),
+                SubmitHealthAppointmentInfoActionConfig(
+                    health_appointment_info_container=HealthAppointmentInfoContainer(),
+                    health_appointment_scheduler=HealthAppointmentScheduler(backend=scheduler_backend)),
+            ],
+        )
+    return ChatGPTAgentConfig(
+        initial_message=BaseMessage(text=f"{greeting} This is a reminder of {appointment}. Will you be able to make it?"),
+        prompt_preamble="""
+            You are calling a patient of Dr. Tang's Clinic to remind them of the appointment in your greeting.
+            If they confirm, thank them and end the call.
+            If they can't make it, tell them the clinic will call back to find a new time, and end the call.
+            Don't discuss anything else, and don't ask for any personal information.
+        """,
+        generate_responses=True,
+        actions=[EndConversationVocodeActionConfig()],
+    )
+
+
+class CampaignTwilioClient(TwilioClient):
+    """vocode's TwilioClient, on the shared 'twilio' connection pool of http_client_registry, and
+    with the REST API base url configurable (TWILIO_API_BASE_URL) so it can be pointed at a fake.
+
+    Phone numbers are sent in E.164 whether or not they were given with a '+'.
+    """
+
+    def __init__(self, base_url: str, twilio_config: TwilioConfig, api_base_url: str, http_client_registry: HttpClientRegistry, request_timeout_seconds: float):
+        super().__init__(base_url=base_url, maybe_twilio_config=twilio_config)
+        self.api_base_url = api_base_url
+        self.http_client_registry = http_client_registry
+        self.request_timeout_seconds = request_timeout_seconds
+
+    def _calls_url(self, twilio_sid: Optional[str] = None) -> str:
+        calls = 'Calls' if twilio_sid is None else f'Calls/{twilio_sid}'
+        return f'{self.api_base_url}/2010-04-01/Accounts/{self.twilio_config.account_sid}/{calls}.json'
+
+    async def _post(self, url: str, data: Dict[str, str]) -> httpx.Response:
+        client = self.http_client_registry.get('twilio', timeout=self.request_timeout_seconds)
+        return await client.post(url, auth=(self.twilio_config.account_sid, self.twilio_config.auth_token), data=data)
+
+    async def create_call(
+        self,
+        conversation_id: str,
+        to_phone: str,
+        from_phone: str,
+        record: bool = False,
+        digits: Optional[str] = None,
+        telephony_params: Optional[Dict[str, str]] = None,
+    ) -> str:
+        data = {
+            "Twiml": self.get_connection_twiml(conversation_id=conversation_id).body.decode("utf-8"),
+            "To": f"+{to_phone.lstrip('+')}",
+            "From": f"+{from_phone.lstrip('+')}",
+            **(telephony_params or {}),
+        }
+        if digits:
+            data["SendDigits"] = digits
+        response = await self._post(self._calls_url(), data)
+        if response.status_code == 400:
+            logger.error(f"Failed to create call: {response.status_code} {response.text}")
+            raise TwilioBadRequestException("Telephony provider rejected call; this is usually due to a bad/malformed number.")
+        if response.status_code >= 400:
+            raise RuntimeError(f"Failed to create call: {response.status_code} {response.reason_phrase}")
+        return response.json()["sid"]
+
+    async def end_call(self, twilio_sid):
+        response = await self._post(self._calls_url(twilio_sid), {"Status": "completed"})
+        if response.status_code >= 400:
+            raise RuntimeError(f"Failed to end call: {response.status_code} {response.reason_phrase}")
+        return response.json()["status"] == "completed"
+
+
+class CampaignOutboundCall(OutboundCall):
+    """An OutboundCall placed through CampaignTwilioClient."""
+
+    def __init__(self, *args, api_base_url: str, http_client_registry: HttpClientRegistry, request_timeout_seconds: float = 10.0, **kwargs):
+        # create_telephony_client is called by OutboundCall.__init__
+        self.api_base_url = api_base_url
+        self.http_client_registry = http_client_registry
+        self.request_timeout_seconds = request_timeout_seconds
+        super().__init__(*args, **kwargs)
+
+    def create_telephony_client(self) -> AbstractTelephonyClient:
+        if not isinstance(self.telephony_config, TwilioConfig):
+            raise ValueError('campaign calls are placed through Twilio')
+        return CampaignTwilioClient(self.base_url, self.telephony_config, self.api_base_url, self.http_client_registry, self.request_timeout_seconds)
+
+
+class RateLimiter:
+    """Spaces acquisitions at least 1 / calls_per_second apart, across every task sharing it.
+
+    A caller reserves the next free time and sleeps until it, so waiting callers are served in
+    the order they arrived and never hold a lock while they wait.
+    """
+
+    def __init__(self, calls_per_second: float):
+        self.interval = 1 / calls_per_second if calls_per_second > 0 else 0.0
+        self._next_time = 0.0
+
+    @property
+    def next_time(self) -> float:
+        return self._next_time
+
+    async def acquire(self):
+        now = time.monotonic()
+        acquire_time = max(now, self._next_time)
+        self._next_time = acquire_time + self.interval
+        if acquire_time > now:
+            await asyncio.sleep(acquire_time - now)
+
+
+class CampaignProgressStore(ABC):
+    """Where a campaign records what happened to each contact, so a stopped campaign can be resumed."""
+
+    @abstractmethod
+    async def load(self, campaign_id: str) -> Dict[str, CampaignProgress]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save(self, campaign_id: str, contact_id: str, progress: CampaignProgress):
+        raise NotImplementedError
+
+
+class InMemoryCampaignProgressStore(CampaignProgressStore):
+    """Keeps progress in process, a campaign can only be resumed by the process that ran it."""
+
+    def __init__(self):
+        self.campaigns: Dict[str, Dict[str, CampaignProgress]] = {}
+
+    async def load(self, campaign_id: str) -> Dict[str, CampaignProgress]:
+        return dict(self.campaigns.get(campaign_id, {}))
+
+    async def save(self, campaign_id: str, contact_id: str, progress: CampaignProgress):
+        self.campaigns.setdefault(campaign_id, {})[contact_id] = progress
+
+
+class RedisCampaignProgressStore(CampaignProgressStore):
+    """Keeps a campaign's progress in one Redis hash, contact id -> 'status:attempts', which
+    expires ttl_seconds after the campaign's last update."""
+
+    def __init__(self, redis: Optional[Any] = None, ttl_seconds: int = DEFAULT_CAMPAIGN_TTL_SECONDS, key_prefix: str = 'health_appointment'):
+        if redis is None:
+            from vocode.streaming.utils.redis import initialize_redis
+            redis = initialize_redis()
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+    def _campaign_key(self, campaign_id: str) -> str:
+        return f'{self.key_prefix}:campaign:{campaign_id}'
+
+    async def load(self, campaign_id: str) -> Dict[str, CampaignProgress]:
+        progress: Dict[str, CampaignProgress] = {}
+        async for contact_id, value in self.redis.hscan_iter(self._campaign_key(campaign_id)):
+            status, _, attempts = value.rpartition(':')
+            progress[contact_id] = CampaignProgress(status, int(attempts))
+        return progress
+
+    async def save(self, campaign_id: str, contact_id: str, progress: CampaignProgress):
+        campaign_key = self._campaign_key(campaign_id)
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            pipeline.hset(campaign_key, contact_id, f'{progress.status}:{progress.attempts}')
+            pipeline.expire(campaign_key, self.ttl_seconds)
+            await pipeline.execute()
+
+
+PROGRESS_BACKENDS = ('memory', 'redis')
+
+
+def get_campaign_progress_store(backend: str = 'redis') -> CampaignProgressStore:
+    if backend == 'memory':
+        return InMemoryCampaignProgressStore()
+    if backend == 'redis':
+        return RedisCampaignProgressStore()
+    raise ValueError(f'unknown progress backend {backend!r}, expected one of {PROGRESS_BACKENDS}')
+
+
+class CampaignStats(NamedTuple):
+    initiated: int
+    failed: int
+    retried: int
+    skipped: int
+    seconds: float
+
+    @property
+    def calls_per_second(self) -> float:
+        return self.initiated / self.seconds if self.seconds else 0.0
+
+
+# places one call from from_phone and returns its call sid
+PlaceCall = Callable[[CampaignContact, str], Awaitable[str]]
+
+
+class OutboundCampaign:
+    """Dials a stream of contacts, each through an OutboundCall from one of from_phones.
+
+    - at most max_concurrency calls are being placed at once, and contacts are read from the
+      stream only as fast as they're dialed, so a list of any size is never held in memory
+    - every from number places at most calls_per_second_per_number calls per second, and the
+      account at most account_calls_per_second (Twilio queues calls past the account's CPS)
+    - calls Twilio fails (transport errors, 429s, 5xxs) are retried up to max_attempts times,
+      backoff_base_seconds * 2 ** attempt later, without holding a dialing slot while they wait.
+      Rejected numbers (400s) aren't retried
+    - progress is saved per contact in progress_store, so running the campaign again with
+      the same campaign_id skips the contacts already dialed
+    """
+
+    RETRYABLE_EXCEPTIONS = (RuntimeError, httpx.TransportError)
+
+    def __init__(
+        self,
+        campaign_id: str,
+        base_url: str,
+        from_phones: List[str],
+        config_manager: BaseConfigManager,
+        progress_store: CampaignProgressStore,
+        twilio_config: Optional[TwilioConfig] = None,
+        max_concurrency: int = 8,
+        calls_per_second_per_number: float = 1.0,
+        account_calls_per_second: float = 1.0,
+        max_attempts: int = 3,
+        backoff_base_seconds: float = 30.0,
+        scheduler_backend: str = 'redis',
+        api_base_url: Optional[str] = None,
+        http_client_registry: HttpClientRegistry = http_clients,
+        place_call: Optional[PlaceCall] = None,
+    ):
+        if not from_phones:
+            raise ValueError('a campaign needs at least one from number')
+        self.campaign_id = campaign_id
+        self.base_url = base_url
+        self.from_phones = from_phones
+        self.config_manager = config_manager
+        self.progress_store = progress_store
+        self.twilio_config = twilio_config or TwilioConfig(
+            account_sid=os.environ["TWILIO_ACCOUNT_SID"],
+            auth_token=os.environ["TWILIO_AUTH_TOKEN"],
+        )
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.scheduler_backend = scheduler_backend
+        self.api_base_url = api_base_url or os.environ.get("TWILIO_API_BASE_URL", "https://api.twilio.com")
+        self.http_client_registry = http_client_registry
+        self.place_call: PlaceCall = place_call or self._place_outbound_call
+        self._account_limiter = RateLimiter(account_calls_per_second)
+        self._number_limiters = {from_phone: RateLimiter(calls_per_second_per_number) for from_phone in from_phones}
+        self._progress: Dict[str, CampaignProgress] = {}
+        self._counts = {INITIATED: 0, FAILED: 0, RETRY_SCHEDULED: 0, 'skipped': 0}
+        self._queue: Optional[asyncio.Queue[Tuple[CampaignContact, int]]] = None
+        self._retries: List[Tuple[float, int, CampaignContact, int]] = []
+
+    async def run(self, contacts: Iterable[CampaignContact]) -> CampaignStats:
+        start = time.monotonic()
+        self._progress = await self.progress_store.load(self.campaign_id)
+        self._queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        try:
+            await self._enqueue_contacts(contacts)
+            await self._drain()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        stats = CampaignStats(
+            initiated=self._counts[INITIATED],
+            failed=self._counts[FAILED],
+            retried=self._counts[RETRY_SCHEDULED],
+            skipped=self._counts['skipped'],
+            seconds=time.monotonic() - start,
+        )
+        logger.info(f'campaign {self.campaign_id}: {stats}')
+        return stats
+
+    async def _enqueue_contacts(self, contacts: Iterable[CampaignContact]):
+        assert self._queue is not None
+        seen: Set[str] = set()
+        for contact in contacts:
+            progress = self._progress.get(contact.contact_id)
+            if contact.contact_id in seen or (progress is not None and progress.status in FINISHED_STATUSES):
+                self._counts['skipped'] += 1
+                continue
+            seen.add(contact.contact_id)
+            # blocks while the workers are busy, which is what keeps the list streaming
+            await self._queue.put((contact, progress.attempts if progress is not None else 0))
+            await self._enqueue_due_retries()
+
+    async def _enqueue_due_retries(self):
+        assert self._queue is not None
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now:
+            _, _, contact, attempts = heapq.heappop(self._retries)
+            await self._queue.put((contact, attempts))
+
+    async def _drain(self):
+        assert self._queue is not None
+        while True:
+            await self._queue.join()
+            if not self._retries:
+                return
+            # nothing is being dialed, so no retry can be scheduled before the earliest one is due
+            await asyncio.sleep(max(0.0, self._retries[0][0] - time.monotonic()))
+            await self._enqueue_due_retries()
+
+    async def _worker(self):
+        assert self._queue is not None
+        while True:
+            contact, attempts = await self._queue.get()
+            try:
+                await self._dial(contact, attempts)
+            except Exception:
+                logger.exception(f'unexpected error dialing contact {contact.contact_id}')
+                await self._save(contact, CampaignProgress(FAILED, attempts + 1))
+            finally:
+                self._queue.task_done()
+
+    async def _next_from_phone(self) -> str:
+        # the from number that's free soonest, then wait for it and for the account
+        from_phone = min(self.from_phones, key=lambda phone: self._number_limiters[phone].next_time)
+        await self._number_limiters[from_phone].acquire()
+        await self._account_limiter.acquire()
+        return from_phone
+
+    async def _dial(self, contact: CampaignContact, attempts: int):
+        from_phone = await self._next_from_phone()
+        attempts += 1
+        await self._save(contact, CampaignProgress(DIALING, attempts))
+        try:
+            with span('campaign.dial'):
+                await self.place_call(contact, from_phone)
+        except TwilioBadRequestException:
+            logger.error(f'twilio rejected the call to contact {contact.contact_id}, not retrying')
+            await self._save(contact, CampaignProgress(FAILED, attempts))
+            return
+        except self.RETRYABLE_EXCEPTIONS as e:
+            if attempts >= self.max_attempts:
+                logger.error(f'giving up calling contact {contact.contact_id} after {attempts} attempts: {e!r}')
+                await self._save(contact, CampaignProgress(FAILED, attempts))
+                return
+            logger.warning(f'error calling contact {contact.contact_id}, attempt {attempts}: {e!r}')
+            await self._save(contact, CampaignProgress(RETRY_SCHEDULED, attempts))
+            self._schedule_retry(contact, attempts)
+            return
+        await self._save(contact, CampaignProgress(INITIATED, attempts))
+
+    def _schedule_retry(self, contact: CampaignContact, attempts: int):
+        retry_time = time.monotonic() + self.backoff_base_seconds * 2 ** (attempts - 1)
+        # the counter breaks ties, contacts aren't comparable
+        heapq.heappush(self._retries, (retry_time, self._counts[RETRY_SCHEDULED], contact, attempts))
+
+    async def _save(self, contact: CampaignContact, progress: CampaignProgress):
+        if progress.status in self._counts:
+            self._counts[progress.status] += 1
+        self._progress[contact.contact_id] = progress
+        await self.progress_store.save(self.campaign_id, contact.contact_id, progress)
+
+    async def _place_outbound_call(self, contact: CampaignContact, from_phone: str) -> str:
+        outbound_call = CampaignOutboundCall(
+            base_url=self.base_url,
+            to_phone=contact.phone_number,
+            from_phone=from_phone,
+            config_manager=self.config_manager,
+            agent_config=build_campaign_agent_config(contact, self.scheduler_backend),
+            telephony_config=self.twilio_config,
+            api_base_url=self.api_base_url,
+            http_client_registry=self.http_client_registry,
+        )
+        await outbound_call.start()
+        return outbound_call.telephony_id
@@ -0,0 +1,239 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, Iterable, List, Optional, Set
+
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+
+from loguru import logger
+
+from vocode.streaming.models.message import BaseMessage, BotBackchannel, SilenceMessage
+from vocode.streaming.models.synthesizer import SynthesizerConfig
+from vocode.streaming.synthesizer.abstract_factory import AbstractSynthesizerFactory
+from vocode.streaming.synthesizer.base_synthesizer import BaseSynthesizer, CachedAudio, SynthesisResult
+from vocode.streaming.utils import get_chunk_size_per_second
+
+from instrumentation import record_span
+
+DEFAULT_PHRASE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+_AUDIO_SUFFIX = '.audio'
+
+
+def normalize_phrase(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def phrase_cache_key(text: str, synthesizer_config: SynthesizerConfig, voice_identifier: str) -> str:
+    """Content address of a phrase's audio: the text, the voice and the audio format it was synthesized in."""
+    key = '\0'.join((voice_identifier, str(synthesizer_config.audio_encoding), str(synthesizer_config.sampling_rate), normalize_phrase(text)))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class PhraseAudioCache:
+    """Synthesized audio of the agent's fixed phrases (the greeting, the submit confirmation),
+    kept on disk in directory and in memory, so calls don't synthesize them again.
+
+    Only registered phrases are cached, never what the LLM or the caller said, which could have
+    patient details in it. Entries are files named by phrase_cache_key, evicted least recently used
+    first past max_bytes; recency survives restarts through the files' modification times.
+    Writes go through a temporary file, so workers can share the directory. Files are only read
+    at startup, and written, removed and touched off the event loop, hits' touches in batches.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_PHRASE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._phrases: Set[str] = set()
+        # least recently used first
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        # hit since the last touch, in the order they were hit
+        self._touched: Dict[str, None] = {}
+        self._touch_task: Optional[asyncio.Task] = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def add_phrases(self, phrases: Iterable[str]):
+        self._phrases.update(normalize_phrase(phrase) for phrase in phrases)
+
+    def is_cacheable(self, text: str) -> bool:
+        return normalize_phrase(text) in self._phrases
+
+    def get(self, key: str) -> Optional[bytes]:
+        audio = self._entries.get(key)
+        if audio is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        # the caller has its audio, the recency on disk can land later
+        self._touched.pop(key, None)
+        self._touched[key] = None
+        if self._touch_task is None or self._touch_task.done():
+            self._touch_task = asyncio.create_task(self._touch_hits())
+        return audio
+
+    async def _touch_hits(self):
+        while self._touched:
+            keys, self._touched = list(self._touched), {}
+            try:
+                await asyncio.to_thread(self._touch, keys)
+            except Exception:
+                logger.exception('error updating the modification times of cached phrases')
+
+    async def put(self, key: str, audio: bytes):
+        if len(audio) > self.max_bytes:
+            return
+        await asyncio.to_thread(self._write, key, audio)
+        self._size += len(audio) - len(self._entries.pop(key, b''))
+        self._entries[key] = audio
+        evicted = self._evict()
+        if evicted:
+            await asyncio.to_thread(self._remove, evicted)
+
+    async def record(self, key: str, chunk_generator: AsyncGenerator[SynthesisResult.ChunkResult, None]) -> AsyncGenerator[SynthesisResult.ChunkResult, None]:
+        """Passes chunk_generator's chunks through, and caches their audio if they all were."""
+        chunks: List[bytes] = []
+        async for chunk_result in chunk_generator:
+            chunks.append(chunk_result.chunk)
+            yield chunk_result
+        # an interrupted phrase never gets here, its generator is closed part way
+        await self.put(key, b''.join(chunks))
+
+    async def warm_up(self, synthesizer_factory: AbstractSynthesizerFactory, synthesizer_config: SynthesizerConfig, phrases: Iterable[str]):
+        """Synthesizes the phrases not cached yet, one at a time, and registers them all."""
+        phrases = [normalize_phrase(phrase) for phrase in phrases]
+        self.add_phrases(phrases)
+        synthesizer = synthesizer_factory.create_synthesizer(synthesizer_config)
+        voice_identifier = get_voice_identifier(synthesizer)
+        chunk_size = get_chunk_size_per_second(synthesizer_config.audio_encoding, synthesizer_config.sampling_rate)
+        try:
+            for phrase in phrases:
+                key = phrase_cache_key(phrase, synthesizer_config, voice_identifier)
+                if key in self._entries:
+                    continue
+                start = time.perf_counter()
+                synthesis_result = await synthesizer.create_speech_uncached(BaseMessage(text=phrase), chunk_size, is_sole_text_chunk=True)
+                async for _ in self.record(key, synthesis_result.chunk_generator):
+                    pass
+                logger.info(f'cached the audio of {phrase!r} in {time.perf_counter() - start:.2f}s')
+        finally:
+            await synthesizer.tear_down()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _AUDIO_SUFFIX)
+
+    def _load(self):
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(_AUDIO_SUFFIX)]
+        for path in sorted(paths, key=os.path.getmtime):
+            with open(path, 'rb') as f:
+                audio = f.read()
+            self._entries[os.path.basename(path)[:-len(_AUDIO_SUFFIX)]] = audio
+            self._size += len(audio)
+        self._remove(self._evict())
+
+    def _evict(self) -> List[str]:
+        """Drops the least recently used entries past max_bytes from memory, returns their keys."""
+        evicted = []
+        while self._size > self.max_bytes and self._entries:
+            key, audio = self._entries.popitem(last=False)
+            self._size -= len(audio)
+            evicted.append(key)
+        return evicted
+
+    def _write(self, key: str, audio: bytes):
+        tmp_path = os.path.join(self.directory, f'.{uuid.uuid4().hex}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(audio)
+        os.replace(tmp_path, self._path(key))
+
+    def _remove(self, keys: List[str]):
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _touch(self, keys: List[str]):
+        for key in keys:
+            try:
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                # evicted since, by this worker or another
+                pass
+
+
+def get_voice_identifier(synthesizer: BaseSynthesizer) -> str:
+    try:
+        return synthesizer.get_voice_identifier(synthesizer.synthesizer_config)
+    except NotImplementedError:
+        # every setting of the config, the voice is somewhere in there
+        return f'{type(synthesizer).__name__}:{synthesizer.synthesizer_config.json()}'
+
+
+def install_phrase_caching(synthesizer: BaseSynthesizer, phrase_audio_cache: PhraseAudioCache) -> BaseSynthesizer:
+    """Patches this synthesizer instance to serve its fixed phrases from phrase_audio_cache.
+
+    This is instance patching, not a wrapper: the instance's create_speech, which
+    StreamingConversation calls for every message, is replaced with one that serves a cached
+    phrase itself and calls the original for anything else. The synthesizer stays the object
+    (and the class) the factory built, so vocode's isinstance checks on it and the state it sets
+    on it keep working, for synthesizers of any factory and constructor.
+
+    A cached phrase is served from memory as CachedAudio, which vocode streams to Twilio in
+    chunk_size pieces of audio in the call's format (mulaw). A registered phrase that misses is
+    synthesized as usual and cached on the way out.
+    """
+    synthesizer_config = synthesizer.synthesizer_config
+    voice_identifier = get_voice_identifier(synthesizer)
+    create_speech = synthesizer.create_speech
+
+    def is_cacheable(message: BaseMessage) -> bool:
+        return (not isinstance(message, (SilenceMessage, BotBackchannel)) and not synthesizer_config.should_encode_as_wav
+                and phrase_audio_cache.is_cacheable(message.text))
+
+    async def create_speech_with_phrase_cache(message: BaseMessage, chunk_size: int, is_first_text_chunk: bool = False, is_sole_text_chunk: bool = False) -> SynthesisResult:
+        if not is_cacheable(message):
+            return await create_speech(message, chunk_size, is_first_text_chunk=is_first_text_chunk, is_sole_text_chunk=is_sole_text_chunk)
+        key = phrase_cache_key(message.text, synthesizer_config, voice_identifier)
+        start = time.perf_counter()
+        audio = phrase_audio_cache.get(key)
+        record_span('synthesizer.phrase_cache_hit' if audio is not None else 'synthesizer.phrase_cache_miss', time.perf_counter() - start)
+        if audio is not None:
+            return CachedAudio(message, audio, synthesizer_config).create_synthesis_result(chunk_size)
+        synthesis_result = await create_speech(message, chunk_size, is_first_text_chunk=is_first_text_chunk, is_sole_text_chunk=is_sole_text_chunk)
+        if not synthesis_result.cached:
+            synthesis_result.chunk_generator = phrase_audio_cache.record(key, synthesis_result.chunk_generator)
+        return synthesis_result
+
+    synthesizer.create_speech = create_speech_with_phrase_cache
+    return synthesizer
+
+
+class PhraseCachingSynthesizerFactory(AbstractSynthesizerFactory):
+    """Creates synthesizer_factory's synthesizers with their fixed phrases served from
+    phrase_audio_cache, patched by install_phrase_caching."""
+
+    def __init__(self, synthesizer_factory: AbstractSynthesizerFactory, phrase_audio_cache: PhraseAudioCache):
+        self.synthesizer_factory = synthesizer_factory
+        self.phrase_audio_cache = phrase_audio_cache
+
+    def create_synthesizer(self, synthesizer_config: SynthesizerConfig) -> BaseSynthesizer:
+        return install_phrase_caching(self.synthesizer_factory.create_synthesizer(synthesizer_config), self.phrase_audio_cache)
+
+
+def phrase_audio_cache_from_env() -> Optional[PhraseAudioCache]:
+    """The cache in PHRASE_AUDIO_CACHE_DIR, or None when it isn't set."""
+    directory = os.getenv("PHRASE_AUDIO_CACHE_DIR")
+    if not directory:
+        return None
+    return PhraseAudioCache(directory, max_bytes=int(os.getenv("PHRASE_AUDIO_CACHE_MAX_MB", "32")) * 1024 * 1024)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+from typing import List, Optional
+
+import asyncio
+import json
+import os
+import time
+
+from loguru import logger
+
+from vocode.streaming.models.events import Event, EventType
+from vocode.streaming.models.transcript import Transcript, TranscriptCompleteEvent
+
+from appointment_scheduler import SCHEDULED
+from instrumentation import span
+from submit_health_appointment_info import HealthAppointmentFormStore, HealthAppointmentScheduler, health_appointment_form_store
+from twilio_sms import TwilioSmsDispatcher, sms_dispatcher
+
+
+class PostCallPipeline:
+    """Does the work a call leaves behind after it has ended, so live calls don't wait on it.
+
+    Fed PHONE_CALL_ENDED and TRANSCRIPT_COMPLETE events by speller_agent.EventsManager. For an
+    ended call it takes the call's form out of the form store (freeing it), saves its final
+    fields to the scheduler backend and, if an appointment was booked and the caller asked
+    for one, queues the confirmation text. Transcripts are written to transcript_archive_dir
+    (one JSON file per call) when it's set.
+
+    Events wait in a bounded queue for num_workers workers. When the queue is full, submit
+    waits for room, which holds up the teardown of the call that just ended, not the live
+    ones. Workers are started lazily on the first submit.
+    """
+
+    def __init__(
+        self,
+        form_store: HealthAppointmentFormStore = health_appointment_form_store,
+        sms: TwilioSmsDispatcher = sms_dispatcher,
+        transcript_archive_dir: Optional[str] = None,
+        max_queue_size: int = 1000,
+        num_workers: int = 4,
+    ):
+        self.form_store = form_store
+        self.sms = sms
+        self.transcript_archive_dir = transcript_archive_dir
+        self.max_queue_size = max_queue_size
+        self.num_workers = num_workers
+        self.processed_count = 0
+        self.failed_count = 0
+        self._queue: Optional[asyncio.Queue[Event]] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers) and self._loop is asyncio.get_running_loop()
+
+    async def start(self):
+        if not self.is_running:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+    async def stop(self, drain: bool = True):
+        if not self.is_running:
+            return
+        assert self._queue is not None
+        if drain:
+            await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def join(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def submit(self, event: Event):
+        await self.start()
+        assert self._queue is not None
+        if self._queue.full():
+            logger.warning(f'post-call queue is full, waiting to queue {event.type} for {event.conversation_id}')
+        await self._queue.put(event)
+
+    async def _worker(self):
+        assert self._queue is not None
+        while True:
+            event = await self._queue.get()
+            try:
+                if event.type == EventType.PHONE_CALL_ENDED:
+                    with span('post_call.phone_call_ended', event.conversation_id):
+                        await self.finish_form(event.conversation_id)
+                elif isinstance(event, TranscriptCompleteEvent):
+                    with span('post_call.archive_transcript', event.conversation_id):
+                        await self.archive_transcript(event.conversation_id, event.transcript)
+                self.processed_count += 1
+            except Exception:
+                self.failed_count += 1
+                logger.exception(f'post-call {event.type} failed for conversation {event.conversation_id}')
+            finally:
+                self._queue.task_done()
+
+    async def finish_form(self, conversation_id: str):
+        form = self.form_store.pop(conversation_id)
+        if form is None:
+            # the call never used the appointment form
+            return
+        scheduler_backend = (form._health_appointment_scheduler or HealthAppointmentScheduler()).get_backend()
+        await scheduler_backend.save_final_form(form._form_id, form.field_info_dict())
+        if form.send_text and await scheduler_backend.get_status(form._form_id) == SCHEDULED:
+            if not self.sms.enqueue(form.patient_phone_number, f'Your appointment details:\n{form.field_info_str()}'):
+                logger.error(f'could not queue the confirmation text for conversation {conversation_id}')
+
+    async def archive_transcript(self, conversation_id: str, transcript: Transcript):
+        if not self.transcript_archive_dir:
+            return
+        archived = json.dumps({
+            'conversation_id': conversation_id,
+            'archived_at': time.time(),
+            'transcript': transcript.to_string(),
+        })
+        path = os.path.join(self.transcript_archive_dir, f'{conversation_id}.json')
+        await asyncio.to_thread(_write_file, path, archived)
+
+
+def _write_file(path: str, contents: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(contents)
@@ -1,14 +1,24 @@
-from typing import Optional, Sequence, Tuple
+from typing import AsyncGenerator, List, Optional, Sequence, Tuple
 from types import MethodType
 
 import json
+import time
 
 from submit_health_appointment_info import SubmitHealthAppointmentInfoActionConfig, SubmitHealthAppointmentInfo
+from health_appointment_prompt import static_prompt_tokens
+from http_clients import HttpClientRegistry, http_clients
+from instrumentation import record_span, span
+from post_call import PostCallPipeline
+from spelling import spell_out, spelled_chunks
 
 from vocode.streaming.action.abstract_factory import AbstractActionFactory
 from vocode.streaming.agent.abstract_factory import AbstractAgentFactory
-from vocode.streaming.agent.base_agent import BaseAgent, RespondAgent
+from vocode.streaming.agent import chat_gpt_agent
+from vocode.streaming.agent.base_agent import BaseAgent, GeneratedResponse, RespondAgent
 from vocode.streaming.agent.chat_gpt_agent import ChatGPTAgent
+from vocode.streaming.agent.openai_utils import get_openai_chat_messages_from_transcript, merge_event_logs
+from vocode.streaming.agent.token_utils import get_chat_gpt_max_tokens, num_tokens_from_messages
+from vocode.streaming.models.agent import LLM_AGENT_DEFAULT_MAX_TOKENS
 from vocode.streaming.models.agent import AgentConfig, AgentType, ChatGPTAgentConfig
 from vocode.streaming.action.default_factory import DefaultActionFactory, CONVERSATION_ACTIONS
 from vocode.streaming.models.actions import ActionConfig, ActionType
@@ -16,19 +26,26 @@ from vocode.streaming.action.end_conversation import EndConversation
 
 from vocode.streaming.utils import events_manager
 from vocode.streaming.models.events import Event, EventType
+from vocode.streaming.models.message import BaseMessage
 
 from loguru import logger
 
 class SpellerAgentConfig(AgentConfig, type="agent_speller"):
-    """Configuration for SpellerAgent. Inherits from AgentConfig."""
+    """Configuration for SpellerAgent. Inherits from AgentConfig.
 
-    pass
+    With generate_responses set, the spelling is streamed in chunks of letters_per_chunk
+    spoken characters, so speech starts before the whole input is spelled and synthesized.
+    Smaller chunks start sooner, but each one is a synthesis request.
+    """
+
+    letters_per_chunk: int = 4
 
 
 class SpellerAgent(RespondAgent[SpellerAgentConfig]):
     """SpellerAgent class. Inherits from RespondAgent.
 
-    This agent takes human input and returns it with spaces between each character.
+    This agent takes human input and spells it back, the way the appointment prompt asks
+    names to be spelled (see spelling.py): "Apple Pie" -> "A. p. p. l. e. space P. i. e."
     """
 
     def __init__(self, agent_config: SpellerAgentConfig):
@@ -45,9 +62,9 @@ class SpellerAgent(RespondAgent[SpellerAgentConfig]):
         conversation_id: str,
         is_interrupt: bool = False,
     ) -> Tuple[Optional[str], bool]:
-        """Generates a response from the SpellerAgent.
+        """Generates a response from the SpellerAgent, used when generate_responses is off.
 
-        The response is generated by joining each character in the human input with a space.
+        The response is the whole human input spelled out.
         The second element of the tuple indicates whether the agent should stop (False means it should not stop).
 
         Args:
@@ -58,7 +75,25 @@ class SpellerAgent(RespondAgent[SpellerAgentConfig]):
         Returns:
             Tuple[Optional[str], bool]: The generated response and a flag indicating whether to stop.
         """
-        return "".join(c + " " for c in human_input), False
+        with span("agent.respond", conversation_id):
+            return spell_out(human_input), False
+
+    async def generate_response(
+        self,
+        human_input: str,
+        conversation_id: str,
+        is_interrupt: bool = False,
+        bot_was_in_medias_res: bool = False,
+    ) -> AsyncGenerator[GeneratedResponse, None]:
+        """Streams the spelled out human input, used when generate_responses is on.
+
+        Each chunk of letters_per_chunk spoken characters is its own message, so vocode
+        synthesizes and plays the first one while the rest are still queued.
+        """
+        start = time.perf_counter()
+        for chunk in spelled_chunks(human_input, self.agent_config.letters_per_chunk):
+            yield GeneratedResponse(message=BaseMessage(text=chunk), is_interruptible=True)
+        record_span("agent.generate_response", time.perf_counter() - start, conversation_id=conversation_id)
 
 class HealthAppointmentActionFactory(AbstractActionFactory):
     def __init__(self, actions: Sequence[ActionConfig] | dict = {}):
@@ -80,16 +115,110 @@ class HealthAppointmentActionFactory(AbstractActionFactory):
         action = action_class(action_config)
         return action
     
+class HealthAppointmentChatGPTAgent(ChatGPTAgent):
+    """ChatGPTAgent that only counts the tokens of the preamble and function definitions once.
+
+    vocode re-tokenizes the whole system prompt and every function schema on each turn to check the
+    context limit. Those are the same for every turn of every conversation using the same config, so
+    their token count is cached and only the transcript messages are counted per turn.
+
+    Response generation is timed, see instrumentation.py. Its OpenAI clients share a connection
+    pool with every other agent's once install_shared_openai_clients has run (SpellerAgentFactory
+    runs it).
+    """
+
+    def __init__(self, agent_config: ChatGPTAgentConfig, action_factory: AbstractActionFactory = DefaultActionFactory(), **kwargs):
+        super().__init__(agent_config, action_factory=action_factory, **kwargs)
+        self.functions_json = json.dumps(self.functions)
+
+    async def generate_response(
+        self,
+        human_input: str,
+        conversation_id: str,
+        is_interrupt: bool = False,
+        bot_was_in_medias_res: bool = False,
+    ) -> AsyncGenerator[GeneratedResponse, None]:
+        # time to the first response (what the caller waits for) and to the last
+        start = time.perf_counter()
+        first_response = True
+        error = False
+        try:
+            async for response in super().generate_response(human_input, conversation_id, is_interrupt, bot_was_in_medias_res):
+                if first_response:
+                    record_span("agent.first_response", time.perf_counter() - start, conversation_id=conversation_id)
+                    first_response = False
+                yield response
+        except Exception:
+            error = True
+            raise
+        finally:
+            record_span("agent.generate_response", time.perf_counter() - start, error, conversation_id)
+
+    def get_chat_parameters(self, messages: Optional[List] = None, use_functions: bool = True):
+        return super().get_chat_parameters(messages or self.format_chat_messages(), use_functions)
+
+    def format_chat_messages(self) -> List[dict]:
+        # same as vocode's format_openai_chat_messages_from_transcript, with the static part of the prompt cached
+        assert self.transcript is not None
+        model_name = self.get_model_name_for_tokenizer()
+        chat_messages = get_openai_chat_messages_from_transcript(
+            merged_event_logs=merge_event_logs(event_logs=self.transcript.event_logs),
+            prompt_preamble=self.agent_config.prompt_preamble,
+        )
+        static_tokens = static_prompt_tokens(model_name, self.agent_config.prompt_preamble, self.functions_json)
+        max_context_size = get_chat_gpt_max_tokens(model_name) - LLM_AGENT_DEFAULT_MAX_TOKENS - 50
+        num_removed_messages = 0
+        while static_tokens + num_tokens_from_messages(chat_messages[1:], model_name) > max_context_size:
+            if len(chat_messages) <= 1:
+                logger.error("Prompt is too long to fit in context window")
+                break
+            num_removed_messages += 1
+            chat_messages.pop(1)
+        if num_removed_messages > 0:
+            logger.info(f"Removed {num_removed_messages} messages from prompt to satisfy context limit")
+        return chat_messages
+
 class EventsManager(events_manager.EventsManager):
-    def __init__(self, ):
-        super().__init__(subscriptions=[EventType.PHONE_CALL_ENDED])
+    """Hands ended calls and their transcripts to the post-call pipeline, see post_call.py.
+
+    vocode awaits handle_event while tearing a call down, so it only queues the event.
+    """
+
+    def __init__(self, post_call_pipeline: PostCallPipeline):
+        super().__init__(subscriptions=[EventType.PHONE_CALL_ENDED, EventType.TRANSCRIPT_COMPLETE])
+        self.post_call_pipeline = post_call_pipeline
 
     async def handle_event(self, event: Event):
-        if event.type == EventType.PHONE_CALL_ENDED:
-            pass
+        if event.type in self.subscriptions:
+            await self.post_call_pipeline.submit(event)
+
+def install_shared_openai_clients(http_client_registry: HttpClientRegistry = http_clients):
+    """Patches vocode, for the whole process, so ChatGPTAgent builds its OpenAI clients on the
+    connection pool of http_client_registry.
+
+    vocode 0.1.113 has no way to hand an agent its client: ChatGPTAgent.__init__, and
+    apply_model_fallback when it switches to the fallback model, call the module function
+    chat_gpt_agent.instantiate_openai_client. That function is replaced with
+    http_client_registry.openai_client, which takes the same arguments. Every agent, and every
+    client a fallback switches to, then uses the shared pool, instead of building its own (and
+    an SSL context, ~45ms on the event loop) per call.
+    """
+    if not callable(getattr(chat_gpt_agent, 'instantiate_openai_client', None)):
+        raise RuntimeError('vocode.streaming.agent.chat_gpt_agent.instantiate_openai_client is gone, '
+                           'see how this vocode version builds ChatGPTAgent.openai_client')
+    chat_gpt_agent.instantiate_openai_client = http_client_registry.openai_client
+
 
 class SpellerAgentFactory(AbstractAgentFactory):
-    """Factory class for creating agents based on the provided agent configuration."""
+    """Factory class for creating agents based on the provided agent configuration.
+
+    ChatGPT agents share the OpenAI connection pool of http_client_registry, see
+    install_shared_openai_clients.
+    """
+
+    def __init__(self, http_client_registry: HttpClientRegistry = http_clients):
+        self.http_client_registry = http_client_registry
+        install_shared_openai_clients(http_client_registry)
 
     def create_agent(self, agent_config: AgentConfig) -> BaseAgent:
         """Creates an agent based on the provided agent configuration.
@@ -105,7 +234,7 @@ class SpellerAgentFactory(AbstractAgentFactory):
         """
         # If the agent configuration type is CHAT_GPT, create a ChatGPTAgent.
         if isinstance(agent_config, ChatGPTAgentConfig):
-            return ChatGPTAgent(
+            return HealthAppointmentChatGPTAgent(
                 agent_config=agent_config,
                 action_factory=
                     HealthAppointmentActionFactory(actions = agent_config.actions) 
@@ -0,0 +1,59 @@
+from typing import Iterator, List
+
+from health_appointment_validators import parse_date
+
+# how the prompt asks names to be spelled: Apple Pie -> A. p. p. l. e. space P. i. e.
+SPACE_WORD = 'space'
+
+# said as a word rather than read as punctuation, anything else that isn't a letter or digit is skipped
+SPOKEN_SYMBOLS = {
+    '-': 'dash',
+    "'": 'apostrophe',
+    '.': 'dot',
+    '@': 'at',
+    '_': 'underscore',
+}
+
+
+def spelled_tokens(text: str) -> List[str]:
+    """What is said for each character of text, in order, with runs of whitespace as one SPACE_WORD."""
+    tokens: List[str] = []
+    for character in text.strip():
+        if character.isspace():
+            if tokens and tokens[-1] != SPACE_WORD:
+                tokens.append(SPACE_WORD)
+        elif character.isalnum():
+            tokens.append(character + '.')
+        elif character in SPOKEN_SYMBOLS:
+            tokens.append(SPOKEN_SYMBOLS[character])
+    return tokens
+
+
+def spell_out(text: str) -> str:
+    """Spells text the way the prompt asks the agent to, so it doesn't depend on the LLM following it."""
+    return ' '.join(spelled_tokens(text))
+
+
+def spelled_chunks(text: str, tokens_per_chunk: int) -> Iterator[str]:
+    """spell_out(text) in pieces of tokens_per_chunk spoken characters, so speech can start on the first one."""
+    tokens = spelled_tokens(text)
+    for start in range(0, len(tokens), tokens_per_chunk):
+        yield ' '.join(tokens[start:start + tokens_per_chunk])
+
+
+def say_date(date_string: str) -> str:
+    """A YYYY-MM-DD date as it's said: 1985-03-03 -> March 3, 1985. Anything else is returned as is."""
+    given_date = parse_date(date_string)
+    if given_date is None:
+        return date_string
+    return f'{given_date:%B} {given_date.day}, {given_date.year}'
+
+
+def say_phone_number(phone_number: str) -> str:
+    """Digits one at a time, a US number grouped like it's written: +16502530000 -> 6 5 0, 2 5 3, 0 0 0 0."""
+    digits = [character for character in phone_number if character.isdigit()]
+    if len(digits) == 11 and digits[0] == '1':
+        digits = digits[1:]
+    if len(digits) != 10:
+        return ' '.join(digits)
+    return ', '.join(' '.join(group) for group in (digits[:3], digits[3:6], digits[6:]))
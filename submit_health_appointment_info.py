@@ -1,10 +1,16 @@
 from __future__ import annotations
-from typing import Any, Dict, Optional, Type, Tuple
+from collections import OrderedDict
+from typing import Any, ClassVar, Dict, Iterable, Mapping, NamedTuple, Optional, Set, Type, Tuple
 
 
+import functools
+import hashlib
 import json
-import phonenumbers
+import re
 import traceback
+import uuid
+
+from datetime import datetime, timedelta
 
 from loguru import logger
 from pydantic.v1 import BaseModel
@@ -12,159 +18,254 @@ from pydantic.v1 import BaseModel
 from vocode.streaming.action.base_action import BaseAction
 from vocode.streaming.models.actions import ActionConfig as VocodeActionConfig
 from vocode.streaming.models.actions import ActionInput, ActionOutput
+from vocode.streaming.models.message import BaseMessage
+from vocode.streaming.models.transcript import Message, Sender
 
-from datetime import datetime
-
-from twilio_sms import send_text_through_twilio
+from instrumentation import span
+from spelling import say_date, say_phone_number, spell_out
+from health_appointment_validators import FieldValidationResult, compile_field_validators
+from appointment_availability import format_appointment_slots, get_appointment_availability_store
+from appointment_scheduler import DEFAULT_SCHEDULER_TTL_SECONDS, SCHEDULED, AppointmentSchedulerBackend, get_appointment_scheduler_backend
 
 _SUBMIT_HEALTH_APPOINTMENT_INFO_ACTION_DESCRIPTION = """
-Inputs a key value pair to the health care appointment form.
+Inputs key value pairs to the health care appointment form, every field the caller gave in one call.
 (SubmitHealthAppointmentInfoAction)
 
 """
 
+_FIELD_NEXT_STEP = 'repeat back to the caller the value inputted, and confirm that\'s correct. To save and submit, use *validate_all_and_submit_if_valid'
+_FIELDS_NEXT_STEP = 'repeat back to the caller the values inputted, and confirm they\'re correct. To save and submit, use *validate_all_and_submit_if_valid'
+
+# read back to the caller by the action itself (the label and how the value is said), instead of asking the LLM to
+_READ_BACK_FIELDS = {
+    'patient_name': ('name', spell_out),
+    'patient_dob': ('date of birth', say_date),
+    'insurance_info_payer_name': ('insurance', str),
+    'insurance_info_payer_id': ('insurance id', spell_out),
+    'referral_to_physician': ('referral to', str),
+    'reason_for_visit': ('reason for the visit', str),
+    'patient_address': ('address', str),
+    'patient_phone_number': ('phone number', say_phone_number),
+}
+# words a caller says around the values they give ("my name is ...", "I was born on ..."). An
+# utterance with anything else in it, a question or something else they want, gets an LLM turn
+_READ_BACK_FILLER_WORDS = frozenset(
+    "a and as be born correct er for i i'm is it it's its me my number of oh ok okay on right so sure that's the this to uh um was yeah yes".split()
+    + [word for label, _ in _READ_BACK_FIELDS.values() for word in label.split()]
+)
+_READ_BACK_NEXT_STEP = 'the values were already read back to the caller, who was asked if they\'re correct. Don\'t repeat them, wait for the answer. To save and submit, use *validate_all_and_submit_if_valid'
+
+# said as is when the appointment is submitted, the same words on every call, so its audio can be cached (see phrase_audio_cache.py)
+SUBMIT_SUCCESS_MESSAGE = 'Information successfully submitted. A confirmation text will be sent after the call if the option was selected.'
+_SUBMITTED_NEXT_STEP = 'the caller was already told the information was submitted, don\'t repeat it. Ask if there is anything else, or end the call.'
+
+_AVAILABILITY_FILTERS = frozenset(['physician', 'start_date', 'end_date', 'page', 'page_size'])
+_DEFAULT_AVAILABILITY_PAGE_SIZE = 5
+_MAX_AVAILABILITY_PAGE_SIZE = 20
 
 class SubmitHealthAppointmentInfoParameters(BaseModel):
     payload: Dict[str, Any]
 
+class SubmitHealthAppointmentInfoFieldResult(BaseModel):
+    success: bool
+    info: str
+
 class SubmitHealthAppointmentInfoResponse(BaseModel):
     success: bool
     info: str
     next_step: str
+    # per key results of a payload with more than one key, also summarized in info
+    field_results: Dict[str, SubmitHealthAppointmentInfoFieldResult] = {}
 
-def years_since(date_string):
-    # Parse the date string into a datetime object
-    given_date = datetime.strptime(date_string, "%Y-%m-%d")
-    
-    # Get the current date
-    current_date = datetime.now()
-    
-    # Calculate the difference in years
-    years_difference = current_date.year - given_date.year
-    
-    # Adjust for partial years
-    if (current_date.month, current_date.day) < (given_date.month, given_date.day):
-        years_difference -= 1
+class PayloadSubmitResult(NamedTuple):
+    success: bool
+    info: str
+    next_step: str
+    field_results: Dict[str, SubmitHealthAppointmentInfoFieldResult] = {}
+    # said to the caller as is, without an LLM turn
+    read_back: Optional[str] = None
 
-    return years_difference
+def _words(text: str) -> list[str]:
+    # 5th -> 5, as dates are said
+    return [re.sub(r'^(\d+)(?:st|nd|rd|th)$', r'\1', word) for word in re.findall(r"[a-z0-9']+", text.lower())]
 
-class HealthAppointmentScheduler(BaseModel):
-    scheduled_appointments_status: Dict[HealthAppointmentInfoContainer, str]
+def _describe_field_result(key: str, result: SubmitHealthAppointmentInfoFieldResult) -> str:
+    # most validators already name the field
+    description = result.info if result.info.startswith(key) else f'{key}: {result.info or "done"}'
+    return description if result.success else 'Error: ' + description
 
-class HealthAppointmentInfoContainer(BaseModel):
-    # openapi 3.1?
-    input_schema = {
-        'type': 'object',
-        'properties': {
-            'patient_name': {
-                'type': 'string',
-                'description': 'name of the patient',
-            },
-            'patient_dob': {
-                'type': 'string',
-                'format': 'date',
-                'description': 'Date of birth for the patient.'
-            },
-            'insurance_info_payer_name': {
-                'type': 'string',
-                'description': 'insurance payer for patient. Examples include Aetna, Medicare Kaiser, etc',
-            },
-            'insurance_info_payer_id': {
-                'type': 'string',
-                'description': 'insurance payer id.',
-            },
-            'referral_to_physician': {
-                'type': 'string',
-                'description': 'The name of which doctor the patient has been referred to, if any.',
-            },
-            'reason_for_visit': {
-                'type': 'string',
-                'description': 'Why they are coming to visit.',
-            },
-            'patient_address': {
-                'type': 'string',
-                'description': 'patient address.',
-            },
-            'patient_phone_number': {
-                'type': 'string',
-                'description': 'patient phone number.',
-            },
-            'appointment_id': {
-                'type': 'string',
-                'description': 'appointment id. Before the first time asking for this information use *see_appointment_availability so that the user can know which appointment to pick.',
-            },
-            'appointment_physician_id': {
-                'type': 'string',
-                'description': 'appointment physician id.',
-            },
-            'appointment_physician_name': {
-                'type': 'string',
-                'description': 'appointment physician name.',
-            },
-            'appointment_time': {
-                'type': 'string',
-                'description': 'appointment time.',
-            },
-            'appointment_address': {
-                'type': 'string',
-                'description': 'appointment address.',
-            },
-            'send_text': {
-                'type': 'boolean',
-                'description': 'If a text should be sent.',
-            },
-            '*see_next_step': {
-                'type': 'string',
-                'description': 'Input will be ignored, but returns the next step.',
-            },
-            '*see_appointment_availability': {
-                'type': 'string',
-                'description': 'Input will be ignored, but returns a list of available physicians and times.',
-            },
-            '*validate_all_and_submit_if_valid': {
-                'type': 'string',
-                'description': 'Input will be ignored, but returns if the appointment scheduling has been finished. Validates all fields, autofills fields if necessary, and submits if valid.',
-            }
+class HealthAppointmentScheduler(BaseModel):
+    # settings only, submissions are recorded by the backend, see appointment_scheduler.py
+    backend: str = 'memory'
+    ttl_seconds: int = DEFAULT_SCHEDULER_TTL_SECONDS
+    # return the first page of availability with the result that completes stage 1,
+    # so the agent can offer slots without a *see_appointment_availability round trip
+    prefetch_availability: bool = True
+    # have the action read back fields it validated (the name spelled out) and confirm the submission,
+    # instead of an LLM turn, see _READ_BACK_FIELDS and SUBMIT_SUCCESS_MESSAGE
+    read_back: bool = True
+
+    def get_backend(self) -> AppointmentSchedulerBackend:
+        return get_appointment_scheduler_backend(self.backend, self.ttl_seconds)
+
+class _FrozenDict(dict):
+    """A dict that raises on changes. It reads, prints and json.dumps as a plain dict, so the prompt
+    and the schema version don't change with it. Being immutable, it isn't copied by deepcopy."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('the health appointment schema is shared by every form, copy it to change it')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+class _FrozenList(list):
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('the health appointment schema is shared by every form, copy it to change it')
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self), (list(self),))
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return _FrozenDict((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return _FrozenList(_freeze(item) for item in value)
+    return value
+
+# the form's schema, one frozen copy shared by every container and form in the process
+# openapi 3.1?
+_INPUT_SCHEMA = _freeze({
+    'type': 'object',
+    'properties': {
+        'patient_name': {
+            'type': 'string',
+            'description': 'name of the patient',
+        },
+        'patient_dob': {
+            'type': 'string',
+            'format': 'date',
+            'description': 'Date of birth for the patient.'
+        },
+        'insurance_info_payer_name': {
+            'type': 'string',
+            'description': 'insurance payer for patient. Examples include Aetna, Medicare Kaiser, etc',
+        },
+        'insurance_info_payer_id': {
+            'type': 'string',
+            'description': 'insurance payer id.',
+        },
+        'referral_to_physician': {
+            'type': 'string',
+            'description': 'The name of which doctor the patient has been referred to, if any.',
+        },
+        'reason_for_visit': {
+            'type': 'string',
+            'description': 'Why they are coming to visit.',
+        },
+        'patient_address': {
+            'type': 'string',
+            'description': 'patient address.',
+        },
+        'patient_phone_number': {
+            'type': 'string',
+            'description': 'patient phone number.',
+        },
+        'appointment_id': {
+            'type': 'string',
+            'description': 'appointment id. Before the first time asking for this information use *see_appointment_availability so that the user can know which appointment to pick.',
+        },
+        'appointment_physician_id': {
+            'type': 'string',
+            'description': 'appointment physician id.',
+        },
+        'appointment_physician_name': {
+            'type': 'string',
+            'description': 'appointment physician name.',
+        },
+        'appointment_time': {
+            'type': 'string',
+            'description': 'appointment time.',
+        },
+        'appointment_address': {
+            'type': 'string',
+            'description': 'appointment address.',
+        },
+        'send_text': {
+            'type': 'boolean',
+            'description': 'If a text should be sent.',
+        },
+        '*see_next_step': {
+            'type': 'string',
+            'description': 'Input will be ignored, but returns the current stage and which fields it still needs.',
+        },
+        '*see_appointment_availability': {
+            'type': 'object',
+            'description': 'Returns available physicians and times, a page at a time. Optional filters: physician (name or id), start_date and end_date (YYYY-MM-DD, inclusive), page (from 1), page_size. Use filters when the caller has a preferred doctor or day.',
+        },
+        '*validate_all_and_submit_if_valid': {
+            'type': 'string',
+            'description': 'Input will be ignored, but returns if the appointment scheduling has been finished. Validates all fields, autofills fields if necessary, and submits if valid.',
         }
     }
-    input_schema_helper_info = {
-        'stage_1_fields': [
-            'patient_name',
-            'patient_dob',
-            'insurance_info_payer_name',
-            'insurance_info_payer_id',
-            'referral_to_physician',
-            'reason_for_visit',
-            'patient_address',
-            'patient_phone_number',
-        ],
-        'stage_1_required_fields': [
-            'patient_name',
-            'patient_dob',
-            'reason_for_visit',
-            'patient_phone_number'
-        ],
-        'stage_2_fields': [
-            'appointment_number',
-            'appointment_id',
-            'appointment_physician_id',
-            'appointment_physician_name',
-            'appointment_time',
-            'appointment_address',
-        ],
-        'stage_2_required_fields': [
-            'appointment_id',
-        ],
-        'stage_3_fields': [
-            'send_text',
-        ],
-        'stage_3_required_fields': [
-            'send_text',
-        ],
-        'field_stages': ['stage_1_fields', 'stage_2_fields', 'stage_3_fields'],
-        'required_field_stages': ['stage_1_required_fields', 'stage_2_required_fields', 'stage_3_required_fields'],
-        'fields_to_not_validate_or_send': ['input_schema', 'input_schema_helper_info'],
-    }
+})
+_INPUT_SCHEMA_HELPER_INFO = _freeze({
+    'stage_1_fields': [
+        'patient_name',
+        'patient_dob',
+        'insurance_info_payer_name',
+        'insurance_info_payer_id',
+        'referral_to_physician',
+        'reason_for_visit',
+        'patient_address',
+        'patient_phone_number',
+    ],
+    'stage_1_required_fields': [
+        'patient_name',
+        'patient_dob',
+        'reason_for_visit',
+        'patient_phone_number'
+    ],
+    'stage_2_fields': [
+        'appointment_number',
+        'appointment_id',
+        'appointment_physician_id',
+        'appointment_physician_name',
+        'appointment_time',
+        'appointment_address',
+    ],
+    'stage_2_required_fields': [
+        'appointment_id',
+    ],
+    'stage_3_fields': [
+        'send_text',
+    ],
+    'stage_3_required_fields': [
+        'send_text',
+    ],
+    'field_stages': ['stage_1_fields', 'stage_2_fields', 'stage_3_fields'],
+    'required_field_stages': ['stage_1_required_fields', 'stage_2_required_fields', 'stage_3_required_fields'],
+    'fields_to_not_validate_or_send': ['input_schema', 'input_schema_helper_info'],
+})
+
+class HealthAppointmentInfoContainer(BaseModel):
+    """The form's starting values, carried in the action config. Each call fills in its own
+    HealthAppointmentForm, created from it by the form store.
+
+    The schema is class-level, not a field, so it isn't copied with every config or written
+    to Redis with it.
+    """
+    input_schema: ClassVar[Mapping[str, Any]] = _INPUT_SCHEMA
+    input_schema_helper_info: ClassVar[Mapping[str, Any]] = _INPUT_SCHEMA_HELPER_INFO
     patient_name: Optional[str]
     patient_dob: Optional[str]
     insurance_info_payer_name: Optional[str]
@@ -181,162 +282,398 @@ class HealthAppointmentInfoContainer(BaseModel):
     appointment_address: Optional[str] 
     send_text: Optional[bool]
 
+    # only want objects to be the same if they are the same instance
+    def __eq__(self, other):
+        if isinstance(other, HealthAppointmentInfoContainer):
+            # Objects are equal if they have the same memory address
+            return id(self) == id(other)
+        return False
+
+    def __hash__(self):
+        # Hash based on the memory address (id)
+        return id(self)
+
+# precomputed from the schema once, instead of on every validation
+# every value a form holds, in the container's order
+_FORM_VALUE_FIELDS = tuple(HealthAppointmentInfoContainer.__fields__)
+_FORM_FIELD_NAMES = tuple(
+    field for field in _FORM_VALUE_FIELDS
+    if field in _INPUT_SCHEMA['properties']
+    and field not in _INPUT_SCHEMA_HELPER_INFO['fields_to_not_validate_or_send']
+)
+_FORM_FIELD_NAME_SET = frozenset(_FORM_FIELD_NAMES)
+_STAGE_REQUIRED_FIELDS = tuple(frozenset(_INPUT_SCHEMA_HELPER_INFO[stage]) for stage in _INPUT_SCHEMA_HELPER_INFO['required_field_stages'])
+_REQUIRED_FIELD_NAMES = tuple(field for stage in _INPUT_SCHEMA_HELPER_INFO['required_field_stages'] for field in _INPUT_SCHEMA_HELPER_INFO[stage])
+# one compiled validator per field, from the schema's type/enum/pattern/format and health_appointment_validators
+_FIELD_VALIDATORS = compile_field_validators(_INPUT_SCHEMA)
+_REQUIRED_FIELD_STAGE_INDEX = {field: stage_index for stage_index, stage_fields in enumerate(_STAGE_REQUIRED_FIELDS) for field in stage_fields}
+
+class HealthAppointmentForm:
+    """One call's appointment form: the field values and their validation state, in slots.
+
+    The schema lives on the class (shared with HealthAppointmentInfoContainer), so a form is
+    only its values instead of a pydantic model carrying its own copy of the schema.
+    """
+
+    __slots__ = _FORM_VALUE_FIELDS + (
+        # identifies the form when reserving its appointment slot, the form store sets it to the conversation id
+        '_form_id',
+        # incremental validation state, see _validate_field_cached
+        '_dirty_fields',
+        '_field_validation_results',
+        '_missing_required_fields_by_stage',
+        # the scheduler settings of the action filling the form in, for the post-call pipeline
+        '_health_appointment_scheduler',
+    )
+    input_schema: ClassVar[Mapping[str, Any]] = _INPUT_SCHEMA
+    input_schema_helper_info: ClassVar[Mapping[str, Any]] = _INPUT_SCHEMA_HELPER_INFO
+
+    def __init__(self, form_id: Optional[str] = None, **field_values: Any):
+        unknown_fields = set(field_values) - set(_FORM_VALUE_FIELDS)
+        if unknown_fields:
+            raise TypeError(f'unknown form fields {sorted(unknown_fields)}')
+        # __setattr__'s bookkeeping needs the state, which is set up from the values
+        for field in _FORM_VALUE_FIELDS:
+            object.__setattr__(self, field, field_values.get(field))
+        object.__setattr__(self, '_form_id', form_id or uuid.uuid4().hex)
+        object.__setattr__(self, '_dirty_fields', {field for field in _FORM_FIELD_NAMES if getattr(self, field) is not None})
+        object.__setattr__(self, '_field_validation_results', {})
+        object.__setattr__(self, '_missing_required_fields_by_stage', tuple(
+            {field for field in stage_required_fields if getattr(self, field) is None}
+            for stage_required_fields in _STAGE_REQUIRED_FIELDS
+        ))
+        object.__setattr__(self, '_health_appointment_scheduler', None)
+
+    @classmethod
+    def from_container(cls, container: HealthAppointmentInfoContainer, form_id: Optional[str] = None) -> HealthAppointmentForm:
+        return cls(form_id, **{field: getattr(container, field) for field in _FORM_VALUE_FIELDS})
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in _FORM_FIELD_NAME_SET:
+            self._dirty_fields.add(name)
+            self._field_validation_results.pop(name, None)
+        stage_index = _REQUIRED_FIELD_STAGE_INDEX.get(name)
+        if stage_index is not None:
+            if value is None:
+                self._missing_required_fields_by_stage[stage_index].add(name)
+            else:
+                self._missing_required_fields_by_stage[stage_index].discard(name)
 
     def get_required_field_names(self):
-        field_names = []
-        for required_field_stage in self.input_schema_helper_info['required_field_stages']:
-            for required_field in self.input_schema_helper_info[required_field_stage]:
-                field_names.append(required_field)
-        return field_names
+        return list(_REQUIRED_FIELD_NAMES)
+
+    def missing_required_fields(self) -> list[str]:
+        return [field for field in _REQUIRED_FIELD_NAMES if field in self._missing_required_fields_by_stage[_REQUIRED_FIELD_STAGE_INDEX[field]]]
+
+    def is_stage_complete(self, stage_index: int) -> bool:
+        return not self._missing_required_fields_by_stage[stage_index]
+
+    def invalidate_validation_cache(self):
+        self._dirty_fields = {field for field in _FORM_FIELD_NAMES if getattr(self, field) is not None}
+        self._field_validation_results.clear()
     
+    def stage_progress(self, include_descriptions: bool = False) -> str:
+        """Describes the first stage with missing required fields, so the agent doesn't need the stages in its prompt."""
+        properties = self.input_schema['properties']
+        for stage_number, (field_stage, required_field_stage) in enumerate(zip(self.input_schema_helper_info['field_stages'], self.input_schema_helper_info['required_field_stages']), start=1):
+            if self.is_stage_complete(stage_number - 1):
+                continue
+            required_fields = self.input_schema_helper_info[required_field_stage]
+            missing_fields = [field for field in required_fields if field in self._missing_required_fields_by_stage[stage_number - 1]]
+            if include_descriptions:
+                missing_fields = [f'{field} ({properties[field]["description"]})' for field in missing_fields]
+            optional_fields = [field for field in self.input_schema_helper_info[field_stage] if field in properties and field not in required_fields and getattr(self, field) is None]
+            progress = f'stage {stage_number}, still needed: {", ".join(missing_fields)}.'
+            if optional_fields:
+                progress += f' Optional, ask but don\'t require: {", ".join(optional_fields)}.'
+            return progress
+        return 'all required fields are filled in, use *validate_all_and_submit_if_valid to submit.'
+
     def field_info_str(self):
         out = []
         for field_stage in self.input_schema_helper_info['field_stages']:
             out.append({field: getattr(self, field) for field in self.input_schema_helper_info[field_stage]})
         return json.dumps({'appointment_info': out}, indent=2)
 
-    def validate_key_and_submit_if_valid(self, payload: Dict, health_appointment_scheduler: HealthAppointmentScheduler) -> tuple[bool, str, str]:
-        keys = list(payload.keys())
-        key = keys[0] if keys else ''
-        value = payload[key]
-        next_step = ''
-
-        if len(key) > 0 and key[0] == '*':
-            return self.special_fields(key, health_appointment_scheduler)
-        
-        if len(keys) > 1:
-            return (False, f'multiple keys found: {keys}', 'please input only one key at a time')
-        
-        next_step += 'repeat back to the caller the value inputted, and confirm that\'s correct. To save and submit, use *validate_all_and_submit_if_valid'
-
-        if key == 'patient_name':
-            if ' ' not in value:
-                # how does this work for chinese?
-                return (False, 'patient should give first and last name', next_step)
-            setattr(self, key, value)
-            return (True, key + ' is valid', next_step + ' note: Spell back the name inputted.')
-        if key == 'patient_dob':
-            try:
-                datetime.strptime(value, "%Y-%m-%d")
-            except ValueError:
-                return (False, 'error parsing date: patient should give their full date of birth, month, day and year in the format YYYY-MM-DD .', next_step + ' If the month, day, year are present, but the format is wrong, try reinputting ')
-            try:
-                age = years_since(value)
-                if age < -1 or age > 150:
-                    return (False, 'calculated age was {} which is invalid'.format(age), next_step)
-            except ValueError:
-                return (False, 'error calculating years of age. ', next_step)
-            setattr(self, key, value)
-            return (True, key + ' is valid', next_step)
-        if key == 'patient_phone_number':
-            parsed_number = None
-            try:
-                parsed_number = phonenumbers.parse(value, "US")
-            except phonenumbers.phonenumberutil.NumberParseException:
-                return (False, 'could not parse provided number: {}'.format(value), next_step + ' please retry.')
-            
-            if not phonenumbers.is_valid_number(parsed_number):
-                return (False, 'number provided is not valid: {}'.format(value), next_step + ' please retry.')
-            
-            formatted_number = phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
-
-            setattr(self, key, formatted_number)
-            return (True, 'The parsed number that will be used is {}'.format(formatted_number), next_step + ' If the user doesn\t say the number is correct, tell the user for international numbers a plus sign should be added in front (E.164 format).')
-        if key in self.input_schema['properties']:
-            # no validation
-            setattr(self, key, value)
-            return (True, key + ' is valid', next_step)
-        # not found
-        return (False, key + ' not found', next_step)
+    def field_info_dict(self) -> Dict[str, str]:
+        """The filled in fields as strings, for the scheduler backend."""
+        return {field: str(getattr(self, field)) for field in _FORM_FIELD_NAMES if getattr(self, field) is not None}
+
+    async def validate_key_and_submit_if_valid(self, payload: Dict, health_appointment_scheduler: HealthAppointmentScheduler) -> tuple[bool, str, str]:
+        result = await self.validate_payload_and_submit_if_valid(payload, health_appointment_scheduler)
+        return (result.success, result.info, result.next_step)
+
+    async def validate_payload_and_submit_if_valid(self, payload: Dict, health_appointment_scheduler: HealthAppointmentScheduler, caller_utterance: Optional[str] = None) -> PayloadSubmitResult:
+        """Applies a payload of one or more keys.
+
+        The caller's fields in it are validated together and only saved if all of them are valid,
+        then the special (*) keys run in order, e.g. {'send_text': True, '*validate_all_and_submit_if_valid': ''}
+        in a single call. With more than one key, field_results has each key's result.
+
+        read_back has what to say to the caller instead of an LLM turn, given what they said
+        (caller_utterance): when the payload only has fields from _READ_BACK_FIELDS, they were saved
+        and the caller said nothing else, the fields to confirm, and when it submitted the form and
+        the caller didn't ask anything, SUBMIT_SUCCESS_MESSAGE. A result with the availability
+        prefetched is left to the LLM, which offers the slots.
+        """
+        with span('form.validate_key_and_submit'):
+            stage_1_was_complete = self.is_stage_complete(0)
+            result = await self._apply_payload(payload, health_appointment_scheduler)
+            if (result.success and health_appointment_scheduler.prefetch_availability and not stage_1_was_complete
+                    and self.is_stage_complete(0) and self.appointment_id is None and '*see_appointment_availability' not in payload):
+                return self._with_prefetched_availability(result)
+            if not (result.success and health_appointment_scheduler.read_back and caller_utterance is not None):
+                return result
+            if payload and all(key in _READ_BACK_FIELDS for key in payload) and self.only_gives_fields(caller_utterance, payload):
+                result = result._replace(next_step=_READ_BACK_NEXT_STEP, read_back=self.read_back_utterance(list(payload)))
+            elif '*validate_all_and_submit_if_valid' in payload and '?' not in caller_utterance:
+                result = result._replace(next_step=_SUBMITTED_NEXT_STEP, read_back=SUBMIT_SUCCESS_MESSAGE)
+            return result
+
+    def only_gives_fields(self, utterance: str, keys: Iterable[str]) -> bool:
+        """Whether utterance has nothing in it but the values of keys (as saved or as read back) and filler words."""
+        if '?' in utterance:
+            return False
+        value_words = set()
+        for key in keys:
+            value = str(getattr(self, key))
+            value_words.update(_words(value))
+            value_words.update(_words(_READ_BACK_FIELDS[key][1](value)))
+        return all(word in value_words or word in _READ_BACK_FILLER_WORDS for word in _words(utterance))
+
+    def read_back_utterance(self, keys: list[str]) -> str:
+        read_backs = []
+        for key in keys:
+            label, say = _READ_BACK_FIELDS[key]
+            read_backs.append(f'the {label} as {say(getattr(self, key))}')
+        if len(read_backs) > 1:
+            read_backs[-1] = 'and ' + read_backs[-1]
+        # a spelled out value already ends in a period
+        return f'I have {", ".join(read_backs).rstrip(".")}. Is that correct?'
+
+    def _with_prefetched_availability(self, result: PayloadSubmitResult) -> PayloadSubmitResult:
+        # stage 2 always starts with a look at the availability, so it comes with the result that
+        # finished stage 1, narrowed to the referred physician when we know them
+        referral = self.referral_to_physician
+        filters = {'physician': referral} if referral and get_appointment_availability_store().match_physician_ids(referral) else {}
+        _, availability_info, availability_next_step = self.see_appointment_availability(filters)
+        return result._replace(
+            info=f'{result.info} Stage 1 is complete, {availability_info}',
+            next_step=f'{result.next_step.rstrip(".")}. Then {availability_next_step}',
+        )
+
+    async def _apply_payload(self, payload: Dict, health_appointment_scheduler: HealthAppointmentScheduler) -> PayloadSubmitResult:
+        if not payload:
+            return PayloadSubmitResult(False, 'empty payload', 'input at least one key')
+        if len(payload) == 1:
+            key, value = next(iter(payload.items()))
+            if key.startswith('*'):
+                return PayloadSubmitResult(*await self.special_fields(key, health_appointment_scheduler, value))
+            success, next_step, results = self._apply_fields({key: value})
+            return PayloadSubmitResult(success, results[key].info, next_step)
+
+        success, next_step, results = self._apply_fields({key: value for key, value in payload.items() if not key.startswith('*')})
+        field_results = {key: SubmitHealthAppointmentInfoFieldResult(success=result.success, info=result.info) for key, result in results.items()}
+        for key, value in payload.items():
+            if not key.startswith('*'):
+                continue
+            if not success:
+                field_results[key] = SubmitHealthAppointmentInfoFieldResult(success=False, info='skipped because of the errors above')
+                continue
+            special_success, special_info, next_step = await self.special_fields(key, health_appointment_scheduler, value)
+            field_results[key] = SubmitHealthAppointmentInfoFieldResult(success=special_success, info=special_info)
+            success = special_success
+        info_string = '; '.join(_describe_field_result(key, result) for key, result in field_results.items())
+        return PayloadSubmitResult(success, info_string, next_step, field_results)
+
+    def _apply_fields(self, fields: Dict[str, Any]) -> Tuple[bool, str, Dict[str, FieldValidationResult]]:
+        # validate everything first, so the fields are saved together or not at all
+        results = {key: self._check_field(key, value) for key, value in fields.items()}
+        success = all(result.success for result in results.values())
+        if len(results) == 1:
+            next_step = _FIELD_NEXT_STEP + next(iter(results.values())).next_step
+        elif success:
+            next_step = _FIELDS_NEXT_STEP + ''.join(result.next_step for result in results.values())
+        else:
+            next_step = 'None of the fields were saved. Fix the errors with the caller, then input the fields again.' + ''.join(result.next_step for result in results.values() if not result.success)
+        if success:
+            for key, result in results.items():
+                setattr(self, key, result.value)
+                # the value was just validated, a submit doesn't need to check it again
+                self._dirty_fields.discard(key)
+                self._field_validation_results[key] = (True, result.info)
+        return (success, next_step, results)
+
+    def _validate_field_cached(self, key: str, value: Any) -> Tuple[bool, str]:
+        if key not in self._dirty_fields and key in self._field_validation_results:
+            return self._field_validation_results[key]
+        success, info_string, _ = self._validate_field(key, value)
+        self._dirty_fields.discard(key)
+        self._field_validation_results[key] = (success, info_string)
+        return (success, info_string)
+
+    def _validate_field(self, key: str, value: Any) -> tuple[bool, str, str]:
+        result = self._check_field(key, value)
+        if result.success:
+            setattr(self, key, result.value)
+        return (result.success, result.info, _FIELD_NEXT_STEP + result.next_step)
+
+    def _check_field(self, key: str, value: Any) -> FieldValidationResult:
+        field_validator = _FIELD_VALIDATORS.get(key)
+        if field_validator is None:
+            # not found
+            return FieldValidationResult(False, key + ' not found')
+        return field_validator(key, value)
     
     def available_appointments_list(self) -> list[Dict[str, str]]:
-        return [
-            {
-                'appointment_number': '1',
-                'appointment_id': 'appt_id_155121',
-                'appointment_physician_id': 'phys_id_124512',
-                'appointment_physician_name': 'Dr. Nickel Baker',
-                'appointment_time': '2:00 PM Saturday July 20',
-                'appointment_address': '123 St Clinic, 123 123 St',
-            },
-            {
-                'appointment_number': '2',
-                'appointment_id': 'appt_id_128841',
-                'appointment_physician_id': 'phys_id_124512',
-                'appointment_physician_name': 'Dr. Nickel Baker',
-                'appointment_time': '3:00 PM Saturday July 20',
-                'appointment_address': '123 St Clinic, 123 123 St',
-            },
-            {
-                'appointment_number': '3',
-                'appointment_id': 'appt_id_166341',
-                'appointment_physician_id': 'phys_id_124512',
-                'appointment_physician_name': 'Dr. Nickel Baker',
-                'appointment_time': '4:00 PM Saturday July 20',
-                'appointment_address': '123 St Clinic, 123 123 St',
-            },
-        ]
+        return [slot.to_form_fields() for slot in get_appointment_availability_store().search()]
+
+    def see_appointment_availability(self, filters: Any) -> tuple[bool, str, str]:
+        """One page of available appointments, rendered compactly, since the result stays in the LLM context for the rest of the call."""
+        if not isinstance(filters, dict):
+            # older prompts send an ignored string
+            filters = {}
+        unknown_filters = set(filters) - _AVAILABILITY_FILTERS
+        if unknown_filters:
+            return (False, f'unknown filters {sorted(unknown_filters)}', f'only use {sorted(_AVAILABILITY_FILTERS)}.')
+        try:
+            start = datetime.strptime(filters['start_date'], '%Y-%m-%d') if filters.get('start_date') else None
+            end = datetime.strptime(filters['end_date'], '%Y-%m-%d') + timedelta(days=1) if filters.get('end_date') else None
+            page = max(int(filters.get('page') or 1), 1)
+            page_size = min(max(int(filters.get('page_size') or _DEFAULT_AVAILABILITY_PAGE_SIZE), 1), _MAX_AVAILABILITY_PAGE_SIZE)
+        except (TypeError, ValueError):
+            return (False, f'could not parse filters {filters}', 'dates are YYYY-MM-DD, page and page_size are numbers. please retry.')
+        physician = filters.get('physician') or None
+
+        # one extra slot tells us if there is another page
+        slots = get_appointment_availability_store().search(physician=physician, start=start, end=end, limit=page_size + 1, offset=(page - 1) * page_size)
+        if not slots:
+            if page > 1:
+                return (True, 'no more available appointments', 'let the user know those were all the appointments, and help them pick one.')
+            return (True, 'no available appointments match the filters', 'ask the user if another physician or day works, or search without filters.')
+        info = 'available appointments: ' + format_appointment_slots(slots[:page_size])
+        next_step = 'help the user pick out an appointment. Don\'t repeat verbatim, give important details like name and time.'
+        if len(slots) > page_size:
+            next_step += f' If none of these work, ask for a preferred physician or day, or use page {page + 1} for more.'
+        return (True, info, next_step)
     
-    def special_fields(self, key: str, health_appointment_scheduler: HealthAppointmentScheduler)  -> tuple[bool, str, str]:
+    async def special_fields(self, key: str, health_appointment_scheduler: HealthAppointmentScheduler, value: Any = None)  -> tuple[bool, str, str]:
         if key == '*see_next_step':
-            return (True, 'seeing next step', 'if any required fields are missing, ask the user for information.')
+            return (True, self.stage_progress(include_descriptions=True), 'if any required fields are missing, ask the user for information. Finish a stage before moving to the next one.')
         if key == '*see_appointment_availability':
-            return (True, f"""available appointments list: {self.available_appointments_list()}""", 'help the user pick out an appointment. Don\'t repeat verbatim, give important details like name and time.')
+            return self.see_appointment_availability(value)
         if key == '*validate_all_and_submit_if_valid':
-
-            if self in health_appointment_scheduler.scheduled_appointments_status and health_appointment_scheduler.scheduled_appointments_status[self] == 'scheduled':
-                return (False, 'This appointment has already been successfully submitted, ')
-
-            errors = []
-            for required_field_stage in self.input_schema_helper_info['required_field_stages']:
-                for required_field in self.input_schema_helper_info[required_field_stage]:
-                    if getattr(self, required_field) is None:
-                        errors.append(f'required field {required_field} is None')
-            
-            for field_name, field_value in vars(self).items():
-                if field_name in self.input_schema_helper_info['fields_to_not_validate_or_send']:
-                    continue
-                if field_name not in self.get_required_field_names() and field_value is None:
-                    continue
-                if field_value is None:
-                    errors.append(f'field {field_name} is required, ask the user for info. ')
-                success, info_string, next_step = self.validate_key_and_submit_if_valid({field_name: field_value}, health_appointment_scheduler)
-                if not success:
-                    errors.append(f'field {field_name} with value {field_value} did not validate: {info_string}')
-            
-            if errors:
-                return (False, f'errors found: {errors}', 'Ask the user for information to fix the errors, don\'t end the call')
-            else:
-                # autofill:
-                if self.appointment_id:
-                    filtered_appointments = [appt for appt in self.available_appointments_list() if appt['appointment_id'] == self.appointment_id]
-                    if len(filtered_appointments) > 0:
-                        for field, value in filtered_appointments[0].items():
-                            if not getattr(self, field):
-                                setattr(self, field, value)
-
-                if self.send_text:
-                    try:
-                        send_text_through_twilio(self.patient_phone_number, f'Your appointment details:\n{self.field_info_str()}')
-                    except Exception:
-                        logger.error(traceback.format_exc())
-                        return (False, 'Could not send confirmation text', 'please retry')
-                health_appointment_scheduler.scheduled_appointments_status[self] = 'scheduled'
-                return (True, '', 'Tell the user "Information successfully submitted. A confirmation text has been sent if the option was selected.".')
+            return await self.submit_if_valid(health_appointment_scheduler.get_backend())
         return (False, f'special field: {key} not found', 'please retry')
-    
-    # only want objects to be the same if they are the same instance
-    def __eq__(self, other):
-        if isinstance(other, HealthAppointmentInfoContainer):
-            # Objects are equal if they have the same memory address
-            return id(self) == id(other)
-        return False
-
-    def __hash__(self):
-        # Hash based on the memory address (id)
-        return id(self)
 
-HealthAppointmentScheduler.update_forward_refs()
+    def validation_errors(self) -> list[str]:
+        errors = [f'required field {required_field} is None, ask the user for info.' for required_field in self.missing_required_fields()]
+
+        # only fields changed since they were last validated are checked again
+        for field_name in _FORM_FIELD_NAMES:
+            field_value = getattr(self, field_name)
+            if field_value is None:
+                continue
+            success, info_string = self._validate_field_cached(field_name, field_value)
+            if not success:
+                errors.append(f'field {field_name} with value {field_value} did not validate: {info_string}')
+
+        if self.appointment_id is not None and get_appointment_availability_store().get(self.appointment_id) is None:
+            errors.append(f'appointment_id {self.appointment_id} is not a known appointment, use *see_appointment_availability to find one.')
+        return errors
+
+    async def submit_if_valid(self, scheduler_backend: AppointmentSchedulerBackend) -> tuple[bool, str, str]:
+        errors = self.validation_errors()
+        if errors:
+            if await scheduler_backend.get_status(self._form_id) == SCHEDULED:
+                return (False, 'This appointment has already been successfully submitted', 'let the user know the appointment is already scheduled')
+            return (False, f'errors found: {errors}', 'Ask the user for information to fix the errors, don\'t end the call')
+
+        # claims the form id, so a retried or duplicated submit can't book or text twice
+        if not await scheduler_backend.begin_submission(self._form_id):
+            if await scheduler_backend.get_status(self._form_id) == SCHEDULED:
+                return (False, 'This appointment has already been successfully submitted', 'let the user know the appointment is already scheduled')
+            return (False, 'This appointment is already being submitted', 'wait a moment, then use *validate_all_and_submit_if_valid again')
+        try:
+            if not await scheduler_backend.claim_slot(self.appointment_id, self._form_id):
+                await scheduler_backend.abort_submission(self._form_id)
+                return (False, f'appointment {self.appointment_id} was just booked by someone else', 'use *see_appointment_availability and help the user pick another appointment.')
+
+            # autofill:
+            slot = get_appointment_availability_store().get(self.appointment_id)
+            for field, value in slot.to_form_fields().items():
+                if not getattr(self, field):
+                    setattr(self, field, value)
+
+            # the confirmation text is sent after the call, see post_call.py
+            await scheduler_backend.complete_submission(self._form_id, self.appointment_id, self.field_info_dict())
+        except Exception:
+            # both only undo this form's own claims
+            await scheduler_backend.release_slot(self.appointment_id, self._form_id)
+            await scheduler_backend.abort_submission(self._form_id)
+            raise
+        return (True, '', f'Tell the user "{SUBMIT_SUCCESS_MESSAGE}".')
+
+
+class CompiledHealthAppointmentSchema(NamedTuple):
+    version: str
+    parameters_schema: Dict[str, Any]
+    parameters_schema_json: bytes
+
+@functools.lru_cache(maxsize=None)
+def compile_health_appointment_schema() -> CompiledHealthAppointmentSchema:
+    """Renders the action's parameters schema once per process.
+
+    The version is a hash of the schema and the stage helper info, and is used as the cache key
+    for everything derived from them (the prompt preamble, the openai function, ...).
+    The returned dicts are shared, don't mutate them.
+    """
+    parameters_schema_json = json.dumps({
+        'type': 'object',
+        'properties': {
+            'payload': _INPUT_SCHEMA,
+        },
+    }).encode()
+    helper_info_json = json.dumps(_INPUT_SCHEMA_HELPER_INFO, sort_keys=True).encode()
+    version = hashlib.sha256(parameters_schema_json + helper_info_json).hexdigest()[:16]
+    return CompiledHealthAppointmentSchema(version, json.loads(parameters_schema_json), parameters_schema_json)
+
+class HealthAppointmentFormStore:
+    """Per-conversation form storage, keyed by conversation_id.
+
+    Each conversation gets its own HealthAppointmentForm, filled in from the action
+    config's container, so concurrent calls never write into the same form.
+    The oldest forms are evicted once max_forms is reached.
+    """
+
+    def __init__(self, max_forms: int = 10000):
+        self.max_forms = max_forms
+        self._forms: OrderedDict[str, HealthAppointmentForm] = OrderedDict()
+
+    def get_or_create(self, conversation_id: str, template: Optional[HealthAppointmentInfoContainer] = None) -> HealthAppointmentForm:
+        form = self._forms.get(conversation_id)
+        if form is not None:
+            self._forms.move_to_end(conversation_id)
+            return form
+        form = HealthAppointmentForm.from_container(template, conversation_id) if template is not None else HealthAppointmentForm(conversation_id)
+        self._forms[conversation_id] = form
+        while len(self._forms) > self.max_forms:
+            evicted_conversation_id, _ = self._forms.popitem(last=False)
+            logger.warning(f'evicted health appointment form for conversation {evicted_conversation_id}')
+        return form
+
+    def get(self, conversation_id: str) -> Optional[HealthAppointmentForm]:
+        return self._forms.get(conversation_id)
+
+    def pop(self, conversation_id: str) -> Optional[HealthAppointmentForm]:
+        return self._forms.pop(conversation_id, None)
+
+    def __len__(self) -> int:
+        return len(self._forms)
+
+# shared by every SubmitHealthAppointmentInfo action in this process
+health_appointment_form_store = HealthAppointmentFormStore()
 
 class SubmitHealthAppointmentInfoActionConfig(
     VocodeActionConfig,
@@ -353,7 +690,7 @@ class SubmitHealthAppointmentInfoActionConfig(
     def action_attempt_to_string(self, input: ActionInput) -> str:
         assert isinstance(input.params, SubmitHealthAppointmentInfoParameters)
         # use repr to escape strings if necessary
-        return f"Attempting to set key: {repr(input.params.key)} to val: {repr(input.params.val)}"
+        return f"Attempting to submit: {repr(input.params.payload)}"
 
     def action_result_to_string(self, input: ActionInput, output: ActionOutput) -> str:
         assert isinstance(output.response, SubmitHealthAppointmentInfoResponse)
@@ -363,6 +700,8 @@ class SubmitHealthAppointmentInfoActionConfig(
             action_description = f"Error: {repr(output.response.info)} Next step: {repr(output.response.next_step)}"
         return action_description
 
+_openai_function_cache: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
 class SubmitHealthAppointmentInfo(
     BaseAction[
         SubmitHealthAppointmentInfoActionConfig,
@@ -380,6 +719,7 @@ class SubmitHealthAppointmentInfo(
     def __init__(
         self,
         action_config: SubmitHealthAppointmentInfoActionConfig,
+        form_store: HealthAppointmentFormStore = health_appointment_form_store,
     ):
         super().__init__(
             action_config,
@@ -387,14 +727,38 @@ class SubmitHealthAppointmentInfo(
             should_respond="always" if self.speak_on_send else "never",
             is_interruptible=False,
         )
+        self.form_store = form_store
+
+    def get_form(self, conversation_id: str) -> HealthAppointmentForm:
+        # the container in the action config is only a template, each conversation fills in its own form
+        form = self.form_store.get_or_create(conversation_id, self.action_config.health_appointment_info_container)
+        form._health_appointment_scheduler = self.action_config.health_appointment_scheduler
+        return form
 
     def get_parameters_schema(self) -> Dict[str, Any]:
-        return {
-            'type': 'object',
-            'properties': {
-                'payload': self.action_config.health_appointment_info_container.input_schema
-            },
-        }
+        return compile_health_appointment_schema().parameters_schema
+
+    def get_openai_function(self):
+        # building and validating the function schema is slow, and it's the same for every agent
+        cache_key = (self.action_config.type, self.should_respond, compile_health_appointment_schema().version)
+        openai_function = _openai_function_cache.get(cache_key)
+        if openai_function is None:
+            openai_function = _openai_function_cache[cache_key] = super().get_openai_function()
+        return openai_function
+
+    def caller_utterance(self) -> Optional[str]:
+        """What the caller said since the agent last spoke, None without a transcript to look at."""
+        conversation_state_manager = getattr(self, 'conversation_state_manager', None)
+        if conversation_state_manager is None:
+            return None
+        said = []
+        for event_log in reversed(conversation_state_manager.transcript.event_logs):
+            if isinstance(event_log, Message):
+                if event_log.sender == Sender.BOT:
+                    break
+                if event_log.sender == Sender.HUMAN:
+                    said.append(event_log.text)
+        return ' '.join(reversed(said)) if said else None
 
     async def _end_of_run_hook(self) -> None:
         """This method is called at the end of the run method. It is optional but intended to be
@@ -416,8 +780,12 @@ class SubmitHealthAppointmentInfo(
         #     )
 
         try:
-            success_bool, info_string, next_step = self.action_config.health_appointment_info_container \
-                .validate_key_and_submit_if_valid(action_input.params.payload, self.action_config.health_appointment_scheduler)
+            with span('action.run', action_input.conversation_id):
+                form = self.get_form(action_input.conversation_id)
+                success_bool, info_string, next_step, field_results, read_back = await form.validate_payload_and_submit_if_valid(
+                    action_input.params.payload, self.action_config.health_appointment_scheduler, self.caller_utterance())
+                if success_bool and not any(key.startswith('*') for key in action_input.params.payload):
+                    next_step += ' Form progress: ' + form.stage_progress()
         except Exception as e:
             logger.error(traceback.format_exc())
             return ActionOutput(
@@ -428,5 +796,7 @@ class SubmitHealthAppointmentInfo(
         await self._end_of_run_hook()
         return ActionOutput(
             action_type=action_input.action_config.type,
-            response=SubmitHealthAppointmentInfoResponse(success=success_bool, info = info_string, next_step = next_step),
+            # vocode says a canned response instead of asking the agent for one
+            canned_response=BaseMessage(text=read_back) if read_back else None,
+            response=SubmitHealthAppointmentInfoResponse(success=success_bool, info = info_string, next_step = next_step, field_results = field_results),
         )
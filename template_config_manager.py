@@ -0,0 +1,129 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import hashlib
+import json
+import time
+
+from loguru import logger
+
+from vocode.streaming.models.model import TypedModel
+from vocode.streaming.models.telephony import BaseCallConfig
+from vocode.streaming.telephony.config_manager.base_config_manager import BaseConfigManager
+
+# as long as RedisConfigManager keeps a call's config
+DEFAULT_CALL_CONFIG_TTL_SECONDS = 60 * 60 * 24
+# the parts of a call config every call with the same agent shares, stored once each
+TEMPLATE_FIELDS = ('agent_config', 'transcriber_config', 'synthesizer_config')
+
+
+def template_digest(template_json: str) -> str:
+    return hashlib.sha256(template_json.encode()).hexdigest()
+
+
+class TemplateConfigManager(BaseConfigManager):
+    """Keeps call configs in Redis as a small record per call pointing at shared templates.
+
+    The agent, transcriber and synthesizer configs (the agent's with its preamble and actions is
+    most of a call config) are stored once each, under the sha256 of their JSON, and each worker
+    keeps the ones it has parsed, up to max_templates. A call's record is its own fields (its
+    numbers, its Twilio sid, ...) and the digests of its templates, so saving and reading a config
+    moves a few hundred bytes of JSON and parses only those. The agent's initial message is in the
+    call's record too, an outbound campaign greets each patient by name with the same agent.
+
+    Templates are rewritten with twice ttl_seconds at least every ttl_seconds, so they outlive the
+    records pointing at them. Configs saved by vocode's RedisConfigManager are still read.
+    """
+
+    def __init__(
+        self,
+        redis: Optional[Any] = None,
+        ttl_seconds: int = DEFAULT_CALL_CONFIG_TTL_SECONDS,
+        key_prefix: str = 'health_appointment',
+        max_templates: int = 256,
+    ):
+        if redis is None:
+            from vocode.streaming.utils.redis import initialize_redis
+            redis = initialize_redis()
+        self.redis = redis
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+        self.max_templates = max_templates
+        self.template_hits = 0
+        self.template_misses = 0
+        # digest -> (parsed template, when this worker last wrote it to Redis), least recently used first
+        self._templates: OrderedDict[str, Tuple[TypedModel, Optional[float]]] = OrderedDict()
+
+    def _call_key(self, conversation_id: str) -> str:
+        return f'{self.key_prefix}:call_config:{conversation_id}'
+
+    def _template_key(self, digest: str) -> str:
+        return f'{self.key_prefix}:config_template:{digest}'
+
+    def _cache_template(self, digest: str, template: TypedModel, written_at: Optional[float]):
+        self._templates[digest] = (template, written_at)
+        self._templates.move_to_end(digest)
+        while len(self._templates) > self.max_templates:
+            self._templates.popitem(last=False)
+
+    async def save_config(self, conversation_id: str, config: BaseCallConfig):
+        logger.debug(f"Saving config for {conversation_id}")
+        now = time.monotonic()
+        digests: Dict[str, str] = {}
+        written: List[Tuple[str, str]] = []
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            for field in TEMPLATE_FIELDS:
+                # the initial message is per call (an outbound campaign greets each patient by name)
+                exclude = {'initial_message'} if field == 'agent_config' else None
+                template_json = getattr(config, field).json(exclude=exclude)
+                digest = digests[field] = template_digest(template_json)
+                _, written_at = self._templates.get(digest, (None, None))
+                if written_at is None or now - written_at >= self.ttl_seconds:
+                    pipeline.set(self._template_key(digest), template_json, ex=2 * self.ttl_seconds)
+                    written.append((digest, template_json))
+            initial_message = config.agent_config.initial_message
+            record = {
+                'templates': digests,
+                'call': json.loads(config.json(exclude=set(TEMPLATE_FIELDS))),
+                'initial_message': json.loads(initial_message.json()) if initial_message else None,
+            }
+            pipeline.set(self._call_key(conversation_id), json.dumps(record), ex=self.ttl_seconds)
+            await pipeline.execute()
+        for digest, template_json in written:
+            # parsed from the JSON, the caller's config objects stay theirs
+            cached = self._templates.get(digest)
+            self._cache_template(digest, cached[0] if cached else TypedModel.parse_raw(template_json), now)
+
+    async def get_config(self, conversation_id) -> Optional[BaseCallConfig]:
+        logger.debug(f"Getting config for {conversation_id}")
+        raw_record = await self.redis.get(self._call_key(conversation_id))
+        if not raw_record:
+            # saved by RedisConfigManager, under the bare conversation id
+            raw_config = await self.redis.get(conversation_id)
+            return BaseCallConfig.parse_raw(raw_config) if raw_config else None
+        record = json.loads(raw_record)
+        digests: Dict[str, str] = record['templates']
+        missing = [digest for digest in dict.fromkeys(digests.values()) if digest not in self._templates]
+        self.template_misses += len(missing)
+        self.template_hits += len(digests) - len(missing)
+        if missing:
+            for digest, template_json in zip(missing, await self.redis.mget([self._template_key(digest) for digest in missing])):
+                if template_json is None:
+                    logger.error(f"config template {digest} of conversation {conversation_id} is gone from Redis")
+                    return None
+                self._cache_template(digest, TypedModel.parse_raw(template_json), None)
+        templates: Dict[str, TypedModel] = {}
+        for field, digest in digests.items():
+            self._templates.move_to_end(digest)
+            # a deep copy, the call can change its config (the agent's fallback sets model_name and
+            # azure_params, actions keep state) without changing the other calls'
+            templates[field] = self._templates[digest][0].copy(deep=True)
+        if record.get('initial_message'):
+            templates['agent_config'].initial_message = TypedModel.parse_obj(record['initial_message'])
+        return BaseCallConfig.parse_obj({**record['call'], **templates})
+
+    async def delete_config(self, conversation_id):
+        logger.debug(f"Deleting config for {conversation_id}")
+        # the templates are shared with other calls, they expire on their own
+        await self.redis.delete(self._call_key(conversation_id), conversation_id)
@@ -0,0 +1,63 @@
+from typing import Any, Callable
+
+import fakeredis
+import pytest
+
+import appointment_availability
+import appointment_scheduler
+from appointment_availability import DEFAULT_APPOINTMENT_SLOTS, AppointmentAvailabilityStore
+from appointment_scheduler import RedisAppointmentScheduler, set_appointment_scheduler_backend
+from submit_health_appointment_info import HealthAppointmentForm, HealthAppointmentScheduler
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture(autouse=True)
+def availability_store(monkeypatch) -> AppointmentAvailabilityStore:
+    # the process-wide store keeps the slots' reservations, every test starts with none
+    store = AppointmentAvailabilityStore(DEFAULT_APPOINTMENT_SLOTS)
+    monkeypatch.setattr(appointment_availability, '_appointment_availability_store', store)
+    return store
+
+
+@pytest.fixture(autouse=True)
+def scheduler_backends(monkeypatch):
+    # backends are created on first use and kept for the process, every test gets its own
+    monkeypatch.setattr(appointment_scheduler, '_appointment_scheduler_backends', {})
+
+
+@pytest.fixture
+def fake_redis():
+    # decoded like vocode's initialize_redis
+    return fakeredis.FakeAsyncRedis(decode_responses=True)
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def scheduler(request, scheduler_backends, fake_redis) -> HealthAppointmentScheduler:
+    """The action's scheduler settings, for each backend."""
+    if request.param == 'redis':
+        set_appointment_scheduler_backend(RedisAppointmentScheduler(fake_redis, key_prefix='test'), 'redis')
+    return HealthAppointmentScheduler(backend=request.param)
+
+
+@pytest.fixture
+def fill_in() -> Callable[..., HealthAppointmentForm]:
+    """Fills in every required field of a form, so it's ready to submit."""
+    return _fill_in
+
+
+def _fill_in(form: HealthAppointmentForm, **field_values: Any) -> HealthAppointmentForm:
+    for field, value in {
+        'patient_name': 'Jane Doe',
+        'patient_dob': '1985-03-03',
+        'reason_for_visit': 'knee pain',
+        'patient_phone_number': '650 253 0000',
+        'appointment_id': DEFAULT_APPOINTMENT_SLOTS[0].appointment_id,
+        'send_text': True,
+        **field_values,
+    }.items():
+        setattr(form, field, value)
+    return form
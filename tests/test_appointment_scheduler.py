@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from appointment_availability import DEFAULT_APPOINTMENT_SLOTS
+
+pytestmark = pytest.mark.anyio
+
+APPOINTMENT_ID = DEFAULT_APPOINTMENT_SLOTS[0].appointment_id
+
+
+async def test_one_form_claims_a_slot(scheduler, availability_store):
+    backend = scheduler.get_backend()
+
+    claims = await asyncio.gather(*(backend.claim_slot(APPOINTMENT_ID, f'form_{i}') for i in range(8)))
+
+    assert claims.count(True) == 1
+    holder = f'form_{claims.index(True)}'
+    # claiming the slot it has again succeeds
+    assert await backend.claim_slot(APPOINTMENT_ID, holder)
+    # and the slot isn't offered anymore
+    assert APPOINTMENT_ID not in [slot.appointment_id for slot in availability_store.search()]
+
+
+async def test_only_the_holder_releases_a_slot(scheduler, availability_store):
+    backend = scheduler.get_backend()
+    assert await backend.claim_slot(APPOINTMENT_ID, 'holder')
+
+    await backend.release_slot(APPOINTMENT_ID, 'other')
+    assert not await backend.claim_slot(APPOINTMENT_ID, 'other')
+
+    await backend.release_slot(APPOINTMENT_ID, 'holder')
+    assert availability_store.is_available(APPOINTMENT_ID)
+    assert await backend.claim_slot(APPOINTMENT_ID, 'other')
+
+
+async def test_a_form_is_submitted_once(scheduler):
+    backend = scheduler.get_backend()
+
+    assert await backend.begin_submission('form')
+    assert not await backend.begin_submission('form')
+    await backend.abort_submission('form')
+    assert await backend.begin_submission('form')
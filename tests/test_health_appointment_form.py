@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from appointment_availability import DEFAULT_APPOINTMENT_SLOTS
+from appointment_scheduler import SCHEDULED
+from submit_health_appointment_info import SUBMIT_SUCCESS_MESSAGE, HealthAppointmentForm, HealthAppointmentScheduler
+
+pytestmark = pytest.mark.anyio
+
+SUBMIT = {'*validate_all_and_submit_if_valid': ''}
+
+
+@pytest.fixture
+def memory_scheduler() -> HealthAppointmentScheduler:
+    return HealthAppointmentScheduler()
+
+
+async def test_fields_are_saved_together_or_not_at_all(memory_scheduler):
+    form = HealthAppointmentForm()
+
+    result = await form.validate_payload_and_submit_if_valid({'patient_name': 'Jane Doe', 'patient_dob': '1985-13-03'}, memory_scheduler)
+
+    assert not result.success
+    assert result.field_results['patient_name'].success
+    assert not result.field_results['patient_dob'].success
+    assert 'None of the fields were saved' in result.next_step
+    assert form.patient_name is None and form.patient_dob is None
+
+    result = await form.validate_payload_and_submit_if_valid(
+        {'patient_name': 'Jane Doe', 'patient_dob': '1985-03-03', 'patient_phone_number': '650 253 0000'}, memory_scheduler)
+
+    assert result.success
+    assert (form.patient_name, form.patient_dob) == ('Jane Doe', '1985-03-03')
+    # saved as normalized
+    assert form.patient_phone_number == '+16502530000'
+
+
+async def test_special_keys_are_skipped_when_a_field_fails(memory_scheduler, fill_in):
+    form = fill_in(HealthAppointmentForm('form'))
+
+    result = await form.validate_payload_and_submit_if_valid({'patient_name': 'Jane', **SUBMIT}, memory_scheduler)
+
+    assert not result.success
+    assert result.field_results['*validate_all_and_submit_if_valid'].info == 'skipped because of the errors above'
+    assert await memory_scheduler.get_backend().get_status('form') is None
+
+
+async def test_read_back_spells_the_name(memory_scheduler):
+    form = HealthAppointmentForm()
+
+    result = await form.validate_payload_and_submit_if_valid({'patient_name': 'Jane Doe'}, memory_scheduler, 'my name is Jane Doe')
+
+    assert result.read_back == 'I have the name as J. a. n. e. space D. o. e. Is that correct?'
+
+
+async def test_read_back_of_several_fields(memory_scheduler):
+    form = HealthAppointmentForm()
+
+    result = await form.validate_payload_and_submit_if_valid(
+        {'patient_name': 'Jane Doe', 'patient_dob': '1985-03-03'}, memory_scheduler, 'Jane Doe, born March 3rd 1985')
+
+    assert result.read_back == 'I have the name as J. a. n. e. space D. o. e., and the date of birth as March 3, 1985. Is that correct?'
+    assert '..' not in result.read_back
+
+
+@pytest.mark.parametrize('caller_utterance', [
+    # a question is left to the LLM
+    'Jane Doe, is that enough?',
+    # so is anything else the caller said
+    'Jane Doe, and I also need to move my other appointment',
+    # no transcript
+    None,
+])
+async def test_no_read_back_when_the_caller_said_more(memory_scheduler, caller_utterance):
+    form = HealthAppointmentForm()
+
+    result = await form.validate_payload_and_submit_if_valid({'patient_name': 'Jane Doe'}, memory_scheduler, caller_utterance)
+
+    assert result.success
+    assert result.read_back is None
+
+
+async def test_no_read_back_when_disabled():
+    form = HealthAppointmentForm()
+
+    result = await form.validate_payload_and_submit_if_valid(
+        {'patient_name': 'Jane Doe'}, HealthAppointmentScheduler(read_back=False), 'my name is Jane Doe')
+
+    assert result.read_back is None
+
+
+async def test_submit_confirms_with_the_fixed_message(scheduler, fill_in):
+    form = fill_in(HealthAppointmentForm('form'))
+
+    result = await form.validate_payload_and_submit_if_valid(SUBMIT, scheduler, 'yes, that is all correct')
+
+    assert result.success
+    assert result.read_back == SUBMIT_SUCCESS_MESSAGE
+    assert await scheduler.get_backend().get_status('form') == SCHEDULED
+    # autofilled from the slot
+    assert form.appointment_time == DEFAULT_APPOINTMENT_SLOTS[0].appointment_time
+
+
+async def test_submit_again_is_already_submitted(scheduler, fill_in):
+    form = fill_in(HealthAppointmentForm('form'))
+    assert (await form.validate_payload_and_submit_if_valid(SUBMIT, scheduler)).success
+
+    result = await form.validate_payload_and_submit_if_valid(SUBMIT, scheduler)
+
+    assert not result.success
+    assert result.info == 'This appointment has already been successfully submitted'
+
+
+async def test_concurrent_submits_of_a_form_book_once(scheduler, fill_in):
+    form = fill_in(HealthAppointmentForm('form'))
+
+    results = await asyncio.gather(*(form.validate_payload_and_submit_if_valid(SUBMIT, scheduler) for _ in range(3)))
+
+    assert [result.success for result in results].count(True) == 1
+    for result in results:
+        if not result.success:
+            assert 'already' in result.info
+    assert await scheduler.get_backend().get_status('form') == SCHEDULED
+
+
+async def test_concurrent_submits_for_one_slot_book_it_once(scheduler, availability_store, fill_in):
+    appointment_id = DEFAULT_APPOINTMENT_SLOTS[0].appointment_id
+    forms = [fill_in(HealthAppointmentForm(f'form_{i}'), patient_name=f'Jane Doe{i}') for i in range(4)]
+
+    results = await asyncio.gather(*(form.validate_payload_and_submit_if_valid(SUBMIT, scheduler) for form in forms))
+
+    winners = [form for form, result in zip(forms, results) if result.success]
+    assert len(winners) == 1
+    for result in results:
+        if not result.success:
+            assert result.info == f'appointment {appointment_id} was just booked by someone else'
+    assert not availability_store.is_available(appointment_id)
+    backend = scheduler.get_backend()
+    for form in forms:
+        assert await backend.get_status(form._form_id) == (SCHEDULED if form in winners else None)
+
+
+async def test_a_form_that_lost_its_slot_can_book_another(scheduler, fill_in):
+    first, second = fill_in(HealthAppointmentForm('first')), fill_in(HealthAppointmentForm('second'))
+    assert (await first.validate_payload_and_submit_if_valid(SUBMIT, scheduler)).success
+    assert not (await second.validate_payload_and_submit_if_valid(SUBMIT, scheduler)).success
+
+    result = await second.validate_payload_and_submit_if_valid(
+        {'appointment_id': DEFAULT_APPOINTMENT_SLOTS[1].appointment_id, **SUBMIT}, scheduler)
+
+    assert result.success
+    assert second.appointment_time == DEFAULT_APPOINTMENT_SLOTS[1].appointment_time
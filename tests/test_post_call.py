@@ -0,0 +1,47 @@
+from typing import List, Tuple
+
+import pytest
+
+from post_call import PostCallPipeline
+from submit_health_appointment_info import HealthAppointmentFormStore
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingSms:
+    """Takes the place of the TwilioSmsDispatcher, keeps the texts instead of sending them."""
+
+    def __init__(self):
+        self.texts: List[Tuple[str, str]] = []
+
+    def enqueue(self, phone_number: str, text_message: str) -> bool:
+        self.texts.append((phone_number, text_message))
+        return True
+
+
+@pytest.mark.parametrize('submitted, send_text, texted', [
+    (True, True, True),
+    # the caller didn't ask for a text
+    (True, False, False),
+    # nothing was booked, even though the caller wanted a text
+    (False, True, False),
+])
+async def test_confirmation_text_only_for_a_scheduled_appointment(scheduler, fill_in, submitted, send_text, texted):
+    form_store = HealthAppointmentFormStore()
+    sms = RecordingSms()
+    pipeline = PostCallPipeline(form_store=form_store, sms=sms)
+    form = fill_in(form_store.get_or_create('conversation'), send_text=send_text)
+    form._health_appointment_scheduler = scheduler
+    if submitted:
+        assert (await form.validate_payload_and_submit_if_valid({'*validate_all_and_submit_if_valid': ''}, scheduler)).success
+
+    await pipeline.finish_form('conversation')
+
+    if texted:
+        [(phone_number, text_message)] = sms.texts
+        assert phone_number == '+16502530000'
+        assert 'Dr. Nickel Baker' in text_message
+    else:
+        assert sms.texts == []
+    # the form is freed either way
+    assert form_store.get('conversation') is None
@@ -1,18 +1,203 @@
-
 from dotenv import load_dotenv
 
 load_dotenv()
 
+import asyncio
 import os
+import time
+from typing import Dict, List, NamedTuple, Optional
 
-account_sid = os.environ["TWILIO_ACCOUNT_SID"]
-auth_token = os.environ["TWILIO_AUTH_TOKEN"]
-twilio_phone_address = os.environ["TWILIO_ADDRESS"]
-
+import httpx
 import requests
+from loguru import logger
 from requests.auth import HTTPBasicAuth
 
+from http_clients import HttpClientRegistry, http_clients
+from instrumentation import span
+
+
+class TwilioSettings(NamedTuple):
+    account_sid: str
+    auth_token: str
+    phone_address: str
+    # can be pointed at a local fake of the Messages endpoint for testing
+    api_base_url: str
+
+    @property
+    def messages_url(self) -> str:
+        return f'{self.api_base_url}/2010-04-01/Accounts/{self.account_sid}/Messages.json'
+
+
+def get_twilio_settings() -> TwilioSettings:
+    # read when a text is sent, not on import, so importing the app doesn't need the twilio env
+    return TwilioSettings(
+        account_sid=os.environ["TWILIO_ACCOUNT_SID"],
+        auth_token=os.environ["TWILIO_AUTH_TOKEN"],
+        phone_address=os.environ["TWILIO_ADDRESS"],
+        api_base_url=os.environ.get("TWILIO_API_BASE_URL", "https://api.twilio.com"),
+    )
+
+
+def twilio_messages_url() -> str:
+    return get_twilio_settings().messages_url
+
+# keeps the connection to twilio open between texts
+_blocking_session: Optional[requests.Session] = None
+
 # sends a text!
-def send_text_through_twilio(phone_number=twilio_phone_address,text_message='Hello world'):
-    requests.post(f'https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json', auth=HTTPBasicAuth(account_sid, auth_token), data={'To': phone_number, 'From': twilio_phone_address, 'Body': text_message})
+# blocking, don't call this from the event loop, use sms_dispatcher.enqueue instead
+def send_text_through_twilio(phone_number=None,text_message='Hello world'):
+    global _blocking_session
+    if _blocking_session is None:
+        _blocking_session = requests.Session()
+    settings = get_twilio_settings()
+    _blocking_session.post(settings.messages_url, auth=HTTPBasicAuth(settings.account_sid, settings.auth_token), data={'To': phone_number or settings.phone_address, 'From': settings.phone_address, 'Body': text_message})
+
+
+class OutboundText(NamedTuple):
+    phone_number: str
+    text_message: str
+
+
+class TwilioSmsDispatcher:
+    """Sends texts from a bounded queue with background workers, so callers on the
+    event loop only pay for an enqueue.
+
+    Failed sends (transport errors, 429s and 5xxs) are retried with exponential backoff,
+    and texts to the same number are spaced at least min_seconds_between_texts_per_number apart.
+    Workers are started lazily on the first enqueue from a running event loop. Texts are sent
+    on the shared 'twilio' client of http_client_registry, which owns (and closes) it.
+    """
+
+    RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        max_queue_size: int = 1000,
+        num_workers: int = 4,
+        max_retries: int = 3,
+        backoff_base_seconds: float = 0.5,
+        min_seconds_between_texts_per_number: float = 1.0,
+        request_timeout_seconds: float = 10.0,
+        http_client_registry: HttpClientRegistry = http_clients,
+    ):
+        self.max_queue_size = max_queue_size
+        self.num_workers = num_workers
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.min_seconds_between_texts_per_number = min_seconds_between_texts_per_number
+        self.request_timeout_seconds = request_timeout_seconds
+        self.http_client_registry = http_client_registry
+        self.sent_count = 0
+        self.failed_count = 0
+        self._queue: Optional[asyncio.Queue[OutboundText]] = None
+        self._workers: List[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+        # read when the workers start
+        self._settings: Optional[TwilioSettings] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # when each number can be texted next, least recently texted first
+        self._next_send_time_by_number: Dict[str, float] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers) and self._loop is asyncio.get_running_loop()
+
+    async def start(self):
+        if not self.is_running:
+            self._start_nowait()
+
+    async def stop(self, drain: bool = True):
+        if not self.is_running:
+            return
+        assert self._queue is not None and self._client is not None
+        if drain:
+            await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._client = None
+
+    async def join(self):
+        if self._queue is not None:
+            await self._queue.join()
+
+    def enqueue(self, phone_number: str, text_message: str) -> bool:
+        """Queues a text without blocking. Returns False if the queue is full."""
+        if not self.is_running:
+            self._start_nowait()
+        assert self._queue is not None
+        try:
+            self._queue.put_nowait(OutboundText(phone_number, text_message))
+        except asyncio.QueueFull:
+            logger.error(f'sms queue is full, dropping text to {phone_number}')
+            return False
+        return True
+
+    def _start_nowait(self):
+        # enqueue is called from sync code running on the event loop
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._settings = get_twilio_settings()
+        self._client = self.http_client_registry.get('twilio', timeout=self.request_timeout_seconds)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+    async def _worker(self):
+        assert self._queue is not None
+        while True:
+            outbound_text = await self._queue.get()
+            try:
+                await self._wait_for_rate_limit(outbound_text.phone_number)
+                with span('sms.send'):
+                    sent = await self._send_with_retries(outbound_text)
+                if sent:
+                    self.sent_count += 1
+                else:
+                    self.failed_count += 1
+            except Exception:
+                self.failed_count += 1
+                logger.exception(f'unexpected error sending text to {outbound_text.phone_number}')
+            finally:
+                self._queue.task_done()
+
+    async def _wait_for_rate_limit(self, phone_number: str):
+        now = time.monotonic()
+        next_send_times = self._next_send_time_by_number
+        # numbers that can be texted again right away need no entry, so the map only holds the
+        # numbers texted in the last min_seconds_between_texts_per_number (plus any backlog)
+        while next_send_times:
+            oldest_number = next(iter(next_send_times))
+            if next_send_times[oldest_number] > now:
+                break
+            del next_send_times[oldest_number]
+        # popped, so the number moves to the end
+        send_time = max(now, next_send_times.pop(phone_number, now))
+        next_send_times[phone_number] = send_time + self.min_seconds_between_texts_per_number
+        if send_time > now:
+            await asyncio.sleep(send_time - now)
+
+    async def _send_with_retries(self, outbound_text: OutboundText) -> bool:
+        assert self._client is not None and self._settings is not None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._client.post(
+                    self._settings.messages_url,
+                    auth=(self._settings.account_sid, self._settings.auth_token),
+                    data={'To': outbound_text.phone_number, 'From': self._settings.phone_address, 'Body': outbound_text.text_message},
+                )
+                if response.status_code < 400:
+                    return True
+                if response.status_code not in self.RETRYABLE_STATUS_CODES:
+                    logger.error(f'twilio rejected text to {outbound_text.phone_number}: {response.status_code} {response.text}')
+                    return False
+                logger.warning(f'twilio returned {response.status_code} sending text to {outbound_text.phone_number}, attempt {attempt + 1}')
+            except httpx.TransportError as e:
+                logger.warning(f'error sending text to {outbound_text.phone_number}, attempt {attempt + 1}: {e!r}')
+            if attempt < self.max_retries:
+                await asyncio.sleep(self.backoff_base_seconds * 2 ** attempt)
+        logger.error(f'giving up sending text to {outbound_text.phone_number} after {self.max_retries + 1} attempts')
+        return False
+
 
+sms_dispatcher = TwilioSmsDispatcher()